@@ -0,0 +1,206 @@
+"""
+End-to-end load benchmark of the controller with a simulated fleet.
+
+For each fleet size, starts an ingest engine and the web app (served by
+waitress on localhost), lets benchmarks.fleet_simulator send the fleet's
+traffic, and reports:
+
+- offered and ingested status packets/s and the drop rate,
+- packet-to-visibility latency: time from sending a probe packet until
+  get_miner() returns the probed value from the published snapshot,
+- /web_monitor latency over HTTP while the fleet is reporting.
+
+Usage:
+    python -m benchmarks.bench_end_to_end [--miners 100 1000 10000] [--seconds 10] [--interval 5]
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import socket
+import threading
+import time
+
+import waitress
+
+import nmcontroller
+from benchmarks.fleet_simulator import FleetSimulator
+from threads.async_udp_thread import AsyncUdpThread
+from threads.multiprocess_udp_thread import MultiprocessUdpThread
+from threads.udp_thread import UdpThread
+from utils.latency_histogram import LatencyHistogram
+
+ENGINES = {"thread": UdpThread, "asyncio": AsyncUdpThread, "multiprocess": MultiprocessUdpThread}
+
+
+class StaticBtcInfo:
+    """Stands in for BtcInfoThread so the benchmark makes no network requests."""
+    btc_price_source = "Benchmark"
+    btc_price = 100000.0
+    block_reward = 3.125
+    block_reward_value = 312500.0
+    fetch_stats = {}
+
+
+def measure_visibility(engine, fleet, histogram, stop_event, interval=0.02, timeout=1.0):
+    """
+    Sends probe packets and records how long they take to become visible.
+
+    :param engine: Running ingest engine.
+    :param fleet: FleetSimulator whose miners are probed, one after another.
+    :param histogram: LatencyHistogram receiving the latencies in nanoseconds.
+    :param stop_event: Event ending the measurement.
+    :param interval: Seconds between probes.
+    :param timeout: Seconds after which a probe counts as lost.
+    :return: Number of probes that never became visible.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    lost = 0
+    probe = 0
+    while not stop_event.is_set():
+        probe += 1
+        miner = fleet.miners[probe % len(fleet.miners)]
+        payload = json.dumps({**miner.status(time.time()), "Probe": probe}).encode()
+        start = time.perf_counter_ns()
+        sock.sendto(payload, fleet.status_address)
+        deadline = start + timeout * 1e9
+        while True:
+            record = engine.get_miner(miner.ip)
+            if record is not None and record.get("Probe") == probe:
+                histogram.record(time.perf_counter_ns() - start)
+                break
+            if time.perf_counter_ns() > deadline:
+                lost += 1
+                break
+            time.sleep(0.00005)
+        stop_event.wait(interval)
+    sock.close()
+    return lost
+
+
+def measure_web(port, histogram, stop_event, path="/web_monitor", think_time=0.05):
+    """
+    Requests a page over a keep-alive HTTP connection and records the latencies.
+
+    :param port: Web server port on localhost.
+    :param histogram: LatencyHistogram receiving the latencies in nanoseconds.
+    :param stop_event: Event ending the measurement.
+    :param path: Requested path.
+    :param think_time: Seconds between requests.
+    """
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    while not stop_event.is_set():
+        start = time.perf_counter_ns()
+        connection.request("GET", path)
+        response = connection.getresponse()
+        response.read()
+        histogram.record(time.perf_counter_ns() - start)
+        stop_event.wait(think_time)
+    connection.close()
+
+
+def run_once(args, miners, web_port):
+    """
+    Runs the benchmark for one fleet size.
+
+    :return: Dictionary of results.
+    """
+    engine_class = ENGINES[args.ingest]
+    engine_class._instance = None  # Allow a fresh engine per run
+    engine = engine_class(name=f"Bench-{miners}", port=args.port)
+    nmcontroller.udp_thread = engine
+    time.sleep(0.5)
+
+    fleet = FleetSimulator(miners, status_port=args.port, command_port=args.port + 2, interval=args.interval,
+                           oversized_rate=args.oversized, truncated_rate=args.truncated,
+                           answer_commands=False)
+    fleet.start()
+
+    # Warm up until every miner has reported once
+    deadline = time.monotonic() + args.interval * 3 + 5
+    while len(engine.get_miner_map()) < miners and time.monotonic() < deadline:
+        time.sleep(0.1)
+    visible = len(engine.get_miner_map())
+
+    visibility = LatencyHistogram()
+    web = LatencyHistogram()
+    stop_event = threading.Event()
+    lost = []
+    threads = [threading.Thread(target=lambda: lost.append(measure_visibility(engine, fleet, visibility, stop_event))),
+               threading.Thread(target=measure_web, args=(web_port, web, stop_event))]
+
+    sent_before = sum(fleet.sent.values())
+    received_before = sum(engine.packets_received.values())
+    drops_before = sum(engine.get_kernel_drops().values())
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop_event.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    sent = sum(fleet.sent.values()) - sent_before
+    received = sum(engine.packets_received.values()) - received_before
+    kernel_drops = sum(engine.get_kernel_drops().values()) - drops_before
+
+    fleet.stop()
+    engine.stop()
+    engine_class._instance = None
+
+    probes = visibility.count
+    sent += probes + sum(lost)  # Probe packets are received as well
+    visibility_ms = {p: v / 1e6 for p, v in visibility.percentiles((50, 99)).items()}
+    web_ms = {p: v / 1e6 for p, v in web.percentiles((50, 99)).items()}
+    return {
+        "miners": miners,
+        "visible": visible,
+        "sent": sent / elapsed,
+        "received": received / elapsed,
+        "drop": max(0.0, 1 - received / sent) if sent else 0.0,
+        "kernel_drops": kernel_drops,
+        "visibility": visibility_ms,
+        "lost": sum(lost),
+        "web": web_ms,
+        "web_requests": web.count / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end controller benchmark with a simulated fleet")
+    parser.add_argument("--miners", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--seconds", type=float, default=10.0, help="Measurement time per fleet size")
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between status packets of a miner")
+    parser.add_argument("--ingest", choices=sorted(ENGINES), default="thread")
+    parser.add_argument("--oversized", type=float, default=0.0, help="Fraction of oversized status packets")
+    parser.add_argument("--truncated", type=float, default=0.0, help="Fraction of truncated status packets")
+    parser.add_argument("--port", type=int, default=24345, help="Status port; config is port + 1, commands port + 2")
+    parser.add_argument("--web-port", type=int, default=24377)
+    parser.add_argument("--page-cache-seconds", type=float, default=1.0)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)  # Per-packet logging would dominate the measurement
+    nmcontroller.btcinfo_thread = StaticBtcInfo()
+    nmcontroller.latest_version = "v1.0.0"
+    nmcontroller.page_cache.max_age = args.page_cache_seconds
+    server = waitress.create_server(nmcontroller.app, host="127.0.0.1", port=args.web_port, threads=8)
+    threading.Thread(target=server.run, name="BenchWeb", daemon=True).start()
+
+    print(f"ingest engine: {args.ingest}, status interval {args.interval} s, {args.seconds} s per fleet size")
+    print(f"{'miners':>7} {'sent/s':>9} {'ingest/s':>9} {'drop':>7} {'k.drops':>8} "
+          f"{'visible p50':>12} {'p99':>8} {'lost':>5} {'web p50':>9} {'p99':>9} {'req/s':>6}")
+    for miners in args.miners:
+        result = run_once(args, miners, args.web_port)
+        print(f"{result['miners']:>7} {result['sent']:>9,.0f} {result['received']:>9,.0f} "
+              f"{result['drop'] * 100:>6.2f}% {result['kernel_drops']:>8,} "
+              f"{result['visibility'].get(50, 0):>10.2f}ms {result['visibility'].get(99, 0):>6.2f}ms "
+              f"{result['lost']:>5} {result['web'].get(50, 0):>7.1f}ms {result['web'].get(99, 0):>7.1f}ms "
+              f"{result['web_requests']:>6.1f}")
+        if result["visible"] < miners:
+            print(f"        only {result['visible']} of {miners} miners were visible after the warm-up")
+    server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+Micro-benchmarks of the per-miner hot functions, with stored baselines.
+
+Each case runs one function over a corpus of status packets generated by
+benchmarks.fleet_simulator for a given fleet size: hashrate parsing and
+formatting, uptime string handling, share parsing, the web monitor row
+builder and UdpThread.process_data. Results are items per second, the best
+of several timed rounds.
+
+--save stores the results as a baseline; --compare runs the cases again
+and exits with status 1 when any case is slower than its baseline by more
+than --max-regression percent. Baselines are only comparable on the machine
+and Python version that recorded them: they are not committed (record one
+before changing code), and --compare exits with status 2 without running
+the cases when the baseline comes from another Python version or machine.
+
+Usage:
+    python -m benchmarks.bench_hot_functions [--miners 100 1000 10000] [--cases parse_share ...]
+    python -m benchmarks.bench_hot_functions --save [PATH]
+    python -m benchmarks.bench_hot_functions --compare [PATH] [--max-regression 10]
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import threading
+import time
+
+import nmcontroller
+from benchmarks.fleet_simulator import SimulatedMiner, miner_ip
+from threads.replay_udp_thread import ReplayUdpThread
+from utils.hashrate_formatter import HashrateFormatter
+from utils.miner_record import MinerRecord, parse_share
+from utils.time_format_utils import compact_uptime, split_time_string, time_difference, uptime_to_seconds
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "hot_functions.json")
+
+
+def build_corpus(miners, seed=1):
+    """
+    Generates the inputs of every case for a fleet.
+
+    :param miners: Number of miners.
+    :param seed: Random seed, so the corpus is identical between runs.
+    :return: Dictionary of input lists.
+    """
+    rng = random.Random(seed)
+    now = 1700000000.0
+    fleet = [SimulatedMiner(index, miner_ip(index), rng, now) for index in range(miners)]
+    statuses = [miner.status(now) for miner in fleet]
+    records = [MinerRecord(status["ip"], dict(status)) for status in statuses]
+    return {
+        "statuses": statuses,
+        "records": records,
+        "packets": [(json.dumps(status).encode(), (status["ip"], 12345)) for status in statuses],
+        "hashrate_strings": [status["HashRate"] for status in statuses],
+        "hashrates": [record.hashrate for record in records],
+        "uptimes": [status["Uptime"] for status in statuses],
+        "compact_inputs": [split_time_string(status["Uptime"])[0] for status in statuses],
+        "shares": [status["Share"] for status in statuses],
+        "update_times": [time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now - rng.uniform(0, 86400)))
+                         for _ in statuses],
+    }
+
+
+def case_convert_hashrate(corpus):
+    hasher = HashrateFormatter()
+    convert, items = hasher.convert_hashrate, corpus["hashrate_strings"]
+    return lambda: [convert(item) for item in items], len(items)
+
+
+def case_format_hashrate(corpus):
+    hasher = HashrateFormatter()
+    format_hashrate, items = hasher.format_hashrate, corpus["hashrates"]
+    return lambda: [format_hashrate(item) for item in items], len(items)
+
+
+def case_split_time_string(corpus):
+    items = corpus["uptimes"]
+    return lambda: [split_time_string(item) for item in items], len(items)
+
+
+def case_compact_uptime(corpus):
+    items = corpus["compact_inputs"]
+    return lambda: [compact_uptime(item) for item in items], len(items)
+
+
+def case_uptime_to_seconds(corpus):
+    items = corpus["uptimes"]
+    return lambda: [uptime_to_seconds(item) for item in items], len(items)
+
+
+def case_time_difference(corpus):
+    items = corpus["update_times"]
+    return lambda: [time_difference(item) for item in items], len(items)
+
+
+def case_parse_share(corpus):
+    items = corpus["shares"]
+    return lambda: [parse_share(item) for item in items], len(items)
+
+
+def case_build_miner_row(corpus):
+    items = corpus["records"]
+    build_miner_row = nmcontroller.build_miner_row
+    return lambda: [build_miner_row(record, time.monotonic()) for record in items], len(items)
+
+
+def case_process_data(corpus):
+    ReplayUdpThread._instance = None  # Fresh miner map without sockets
+    engine = ReplayUdpThread([], name="BenchProcessData")
+    ReplayUdpThread._instance = None
+    engine.wait()
+    engine.thread = threading.current_thread()  # Its replay has ended; batch_updates() only batches on this thread
+    process_data, items = engine.process_data, corpus["packets"]
+    batch_size = engine.recv_batch_size
+
+    def run():
+        # One snapshot per batch, as published after each receive wakeup
+        for offset in range(0, len(items), batch_size):
+            with engine.batch_updates():
+                for data, addr in items[offset:offset + batch_size]:
+                    process_data(data, addr)
+
+    return run, len(items)
+
+
+CASES = {
+    "convert_hashrate": case_convert_hashrate,
+    "format_hashrate": case_format_hashrate,
+    "split_time_string": case_split_time_string,
+    "compact_uptime": case_compact_uptime,
+    "uptime_to_seconds": case_uptime_to_seconds,
+    "time_difference": case_time_difference,
+    "parse_share": case_parse_share,
+    "build_miner_row": case_build_miner_row,
+    "process_data": case_process_data,
+}
+
+
+def measure(run, items, rounds, min_time):
+    """
+    Times a case.
+
+    :param run: Callable processing the whole corpus once.
+    :param items: Number of items processed per call.
+    :param rounds: Timed rounds; the fastest one is reported.
+    :param min_time: Minimum seconds per round; the corpus is processed as often as needed.
+    :return: Items per second of the fastest round.
+    """
+    run()  # Warm up caches and first-time inserts
+    best = 0.0
+    for _ in range(rounds):
+        calls = 0
+        start = time.perf_counter()
+        while True:
+            run()
+            calls += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        best = max(best, calls * items / elapsed)
+    return best
+
+
+def run_cases(cases, fleet_sizes, rounds, min_time):
+    """
+    Runs the selected cases for every fleet size.
+
+    :return: Dictionary mapping "case[miners]" to items per second.
+    """
+    results = {}
+    for miners in fleet_sizes:
+        corpus = build_corpus(miners)
+        for name in cases:
+            run, items = CASES[name](corpus)
+            results[f"{name}[{miners}]"] = measure(run, items, rounds, min_time)
+            print(f"{name + f'[{miners}]':<28} {results[f'{name}[{miners}]']:>14,.0f} items/s", flush=True)
+    return results
+
+
+def save_baseline(path, results):
+    """Writes results with the environment that produced them."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"python": platform.python_version(), "machine": platform.machine(),
+                   "platform": platform.platform(),
+                   "results": {key: round(value) for key, value in results.items()}}, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def baseline_mismatch(baseline):
+    """
+    Checks that a baseline was recorded in the current environment.
+
+    :param baseline: Parsed baseline file.
+    :return: Description of the difference, or None when the baseline is comparable.
+    """
+    recorded = (baseline.get("python"), baseline.get("machine"))
+    current = (platform.python_version(), platform.machine())
+    if recorded != current:
+        return f"baseline was recorded with Python {recorded[0]} on {recorded[1]}, " \
+               f"this is Python {current[0]} on {current[1]}"
+    return None
+
+
+def compare(results, baseline, max_regression):
+    """
+    Prints the change of every case against the baseline.
+
+    :param results: Current results.
+    :param baseline: Parsed baseline file.
+    :param max_regression: Allowed slowdown in percent.
+    :return: List of cases that regressed beyond the limit.
+    """
+    regressions = []
+    print(f"\n{'case':<28} {'baseline':>14} {'current':>14} {'change':>8}")
+    for key, current in results.items():
+        previous = baseline["results"].get(key)
+        if not previous:
+            print(f"{key:<28} {'-':>14} {current:>14,.0f} {'new':>8}")
+            continue
+        change = (current - previous) / previous * 100
+        flag = ""
+        if change < -max_regression:
+            regressions.append(key)
+            flag = "  REGRESSION"
+        print(f"{key:<28} {previous:>14,.0f} {current:>14,.0f} {change:>+7.1f}%{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the per-miner hot functions")
+    parser.add_argument("--miners", type=int, nargs="+", default=[100, 1000, 10000], help="Fleet sizes")
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), default=list(CASES))
+    parser.add_argument("--rounds", type=int, default=5, help="Timed rounds per case; the fastest is reported")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds per round")
+    parser.add_argument("--save", nargs="?", const=DEFAULT_BASELINE, metavar="PATH",
+                        help=f"Store the results as baseline (default: {os.path.relpath(DEFAULT_BASELINE)})")
+    parser.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, metavar="PATH",
+                        help="Compare with a stored baseline and fail on regressions")
+    parser.add_argument("--max-regression", type=float, default=10.0,
+                        help="Slowdown in percent that fails --compare (default: 10)")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        try:
+            with open(args.compare) as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            parser.error(f"cannot read baseline {args.compare}: {e}")
+        mismatch = baseline_mismatch(baseline)
+        if mismatch:
+            print(f"error: {mismatch}; record a baseline here with --save", file=sys.stderr)
+            sys.exit(2)
+
+    logging.disable(logging.WARNING)  # Per-packet logging would dominate the measurement
+    nmcontroller.latest_version = "v1.0.0"
+    print(f"Python {platform.python_version()}, best of {args.rounds} rounds of at least {args.min_time} s")
+    results = run_cases(args.cases, args.miners, args.rounds, args.min_time)
+
+    if args.save:
+        save_baseline(args.save, results)
+        print(f"\nbaseline written to {args.save}")
+    if baseline is not None:
+        regressions = compare(results, baseline, args.max_regression)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) regressed by more than {args.max_regression:g}%: "
+                  f"{', '.join(regressions)}")
+            sys.exit(1)
+        print(f"\nno regression beyond {args.max_regression:g}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Micro-benchmark for the NMMiner packet parser.
+
+Compares the original receive path (recvfrom + decode + rstrip + strip +
+endswith + json.loads) with the fast path in utils.packet_parser
+(recvfrom_into a preallocated buffer + memoryview + JSON backend), both for
+parsing alone and for receive + parse over a loopback UDP socket.
+
+Usage:
+    python -m benchmarks.bench_packet_parser [--packets 200000]
+"""
+
+import argparse
+import json
+import socket
+import time
+
+from utils.packet_parser import JSON_BACKEND, PacketReceiver, decode_packet
+
+STATUS_PACKET = json.dumps({
+    "ip": "192.168.1.101",
+    "BoardType": "NMMiner",
+    "HashRate": "1.05MH/s",
+    "Share": "1/1380 (99.93%)",
+    "NetDiff": "89.47T",
+    "PoolDiff": "0.001",
+    "LastDiff": "0.001",
+    "BestDiff": "4.021M",
+    "Valid": 0,
+    "Progress": 0.167,
+    "Temp": 48.5,
+    "RSSI": -62,
+    "FreeHeap": 120.5,
+    "Uptime": "001d 01:23:46",
+    "Version": "v1.0.0",
+    "PoolInUse": "stratum+tcp://public-pool.io:21496",
+}).encode()
+
+
+def legacy_decode(data):
+    """The decode steps previously done inline in UdpThread.process_data."""
+    decoded_data = data.decode('utf-8').rstrip('\x00').strip()
+    if not decoded_data.endswith('}'):
+        return None
+    return json.loads(decoded_data)
+
+
+def bench_parse(packets):
+    """Returns (legacy, fast) packets/s for parsing an in-memory payload."""
+    payload = STATUS_PACKET
+    start = time.perf_counter()
+    for _ in range(packets):
+        legacy_decode(payload)
+    legacy = packets / (time.perf_counter() - start)
+
+    buffer = bytearray(4096)
+    buffer[:len(payload)] = payload
+    view = memoryview(buffer)[:len(payload)]
+    start = time.perf_counter()
+    for _ in range(packets):
+        decode_packet(view)
+    fast = packets / (time.perf_counter() - start)
+    return legacy, fast
+
+
+def _receive_run(packets, fast):
+    """Sends `packets` datagrams over loopback in bursts and times receiving + parsing them."""
+    receiver_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver_sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    receiver_sock.bind(("127.0.0.1", 0))
+    receiver_sock.setblocking(False)
+    address = receiver_sock.getsockname()
+    sender_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver = PacketReceiver()
+
+    burst = 1000
+    elapsed = 0.0
+    received = 0
+    for _ in range(packets // burst):
+        for _ in range(burst):
+            sender_sock.sendto(STATUS_PACKET, address)
+        start = time.perf_counter()
+        while True:
+            try:
+                if fast:
+                    data, _ = receiver.receive(receiver_sock)
+                    decode_packet(data)
+                else:
+                    data, _ = receiver_sock.recvfrom(4096)
+                    legacy_decode(data)
+            except BlockingIOError:
+                break
+            received += 1
+        elapsed += time.perf_counter() - start
+
+    sender_sock.close()
+    receiver_sock.close()
+    return received / elapsed if elapsed else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NMMiner packet parser micro-benchmark")
+    parser.add_argument("--packets", type=int, default=200000)
+    args = parser.parse_args()
+
+    legacy, fast = bench_parse(args.packets)
+    print(f"JSON backend: {JSON_BACKEND}, packet size: {len(STATUS_PACKET)} bytes")
+    print(f"{'path':<24} {'legacy pkt/s':>14} {'fast pkt/s':>14} {'speedup':>8}")
+    print(f"{'parse':<24} {legacy:>14,.0f} {fast:>14,.0f} {fast / legacy:>7.2f}x")
+
+    legacy = _receive_run(args.packets, fast=False)
+    fast = _receive_run(args.packets, fast=True)
+    print(f"{'receive + parse':<24} {legacy:>14,.0f} {fast:>14,.0f} {fast / legacy:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Benchmark for the compressed history chunks (utils.series_codec).
+
+Generates realistic per-miner packet streams (status packets every 5 s with
+network jitter, firmware-formatted hashrate strings, 0.1 degree temperature
+steps, integer RSSI, slowly drifting free heap and growing share counters),
+parses them into MinerRecords like the ingest path does, and compares the
+compressed chunks with plain array('d') columns for bytes per sample, encode
+throughput and decode throughput.
+
+Usage:
+    python -m benchmarks.bench_series_codec [--miners 50] [--samples 17280] [--chunk-size 120]
+"""
+
+import argparse
+import random
+import time
+from array import array
+
+from utils.miner_history import METRICS, CompressedRing, MetricRing
+from utils.miner_record import MinerRecord
+from utils.series_codec import ChunkEncoder, iter_chunks
+
+
+def miner_stream(seed, samples, start):
+    """
+    Yields (timestamp, MinerRecord) for one simulated miner.
+
+    :param seed: Random seed of the miner.
+    :param samples: Number of status packets.
+    :param start: Epoch time of the first packet.
+    """
+    rng = random.Random(seed)
+    base_hashrate = rng.choice([55.0, 78.0, 320.0, 1050.0])  # KH/s of common NMMiner boards
+    temp = rng.uniform(40, 55)
+    rssi = rng.randint(-75, -45)
+    heap = rng.uniform(100, 140)
+    rejected, accepted = 0, rng.randint(0, 5000)
+    timestamp = start
+    for _ in range(samples):
+        timestamp += 5 + rng.gauss(0, 0.02)  # Firmware reports every 5 s, jitter from the network
+        hashrate = base_hashrate * rng.uniform(0.97, 1.03)
+        hashrate_text = f"{hashrate / 1000:.2f}MH/s" if hashrate >= 1000 else f"{hashrate:.2f}KH/s"
+        temp = min(75.0, max(30.0, temp + rng.choice((-0.1, 0, 0, 0.1))))
+        if rng.random() < 0.1:
+            rssi = max(-90, min(-30, rssi + rng.choice((-1, 1))))
+        heap = heap + rng.choice((-0.1, 0, 0.1))
+        if rng.random() < 0.3:
+            accepted += 1
+        if rng.random() < 0.001:
+            rejected += 1
+        packet = {
+            "HashRate": hashrate_text,
+            "Temp": round(temp, 1),
+            "RSSI": rssi,
+            "FreeHeap": round(heap, 1),
+            "Share": f"{rejected}/{accepted} ({accepted / max(1, accepted + rejected) * 100:.2f}%)",
+        }
+        yield timestamp, MinerRecord("10.0.0.1", packet, 0.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compressed history chunk benchmark")
+    parser.add_argument("--miners", type=int, default=50)
+    parser.add_argument("--samples", type=int, default=17280, help="Samples per miner (17280 = 1 day)")
+    parser.add_argument("--chunk-size", type=int, default=120)
+    args = parser.parse_args()
+
+    start = time.time() - args.samples * 5
+    streams = [list(miner_stream(seed, args.samples, start)) for seed in range(args.miners)]
+    total = args.miners * args.samples
+
+    # Plain arrays: one timestamp column plus one column per metric
+    begin = time.perf_counter()
+    plain = []
+    for stream in streams:
+        ring = MetricRing(args.samples)
+        for timestamp, record in stream:
+            ring.append(timestamp, record)
+        plain.append(ring)
+    plain_encode = total / (time.perf_counter() - begin)
+    plain_bytes = sum(ring.nbytes for ring in plain)
+
+    begin = time.perf_counter()
+    chunked = []
+    for stream in streams:
+        chunks = []
+        for offset in range(0, len(stream), args.chunk_size):
+            encoder = ChunkEncoder(METRICS)
+            for timestamp, record in stream[offset:offset + args.chunk_size]:
+                encoder.append(timestamp, [getattr(record, metric) or 0.0 for metric in METRICS])
+            chunks.append(encoder.finish())
+        chunked.append(chunks)
+    chunk_encode = total / (time.perf_counter() - begin)
+    chunk_bytes = sum(chunk.nbytes for chunks in chunked for chunk in chunks)
+    per_metric = {metric: sum(len(chunk.columns[metric]) for chunks in chunked for chunk in chunks) / total
+                  for metric in METRICS}
+    timestamp_bytes = sum(len(chunk.timestamps) for chunks in chunked for chunk in chunks) / total
+
+    print(f"{args.miners} miners x {args.samples} samples, {len(METRICS)} metrics, chunks of {args.chunk_size}")
+    print(f"{'format':<12} {'bytes/sample':>13} {'encode samples/s':>17}")
+    print(f"{'array':<12} {plain_bytes / total:>13.2f} {plain_encode:>17,.0f}")
+    print(f"{'chunks':<12} {chunk_bytes / total:>13.2f} {chunk_encode:>17,.0f}"
+          f"   ({plain_bytes / chunk_bytes:.1f}x smaller)")
+    print(f"  timestamps: {timestamp_bytes:.2f} bytes, "
+          + ", ".join(f"{metric}: {size:.2f}" for metric, size in per_metric.items()))
+
+    # Decode one metric over the whole range, and over the last hour only
+    print(f"{'decode':<28} {'array values/s':>15} {'chunks values/s':>16}")
+    last_hour = start + args.samples * 5 - 3600
+    for label, since in (("hashrate, full range", None), ("hashrate, last hour", last_hour)):
+        begin = time.perf_counter()
+        count = 0
+        for ring in plain:
+            count += len(ring.slice('hashrate', since)[1])
+        plain_rate = count / (time.perf_counter() - begin)
+        begin = time.perf_counter()
+        count = 0
+        for chunks in chunked:
+            count += sum(1 for _ in iter_chunks(chunks, 'hashrate', since))
+        chunk_rate = count / (time.perf_counter() - begin)
+        print(f"{label:<28} {plain_rate:>15,.0f} {chunk_rate:>16,.0f}")
+
+    # Memory of the history store ring types at the same per-miner capacity
+    ring = CompressedRing(args.samples, args.chunk_size)
+    for timestamp, record in streams[0]:
+        ring.append(timestamp, record)
+    print(f"CompressedRing: {ring.nbytes / args.samples:.2f} bytes/sample "
+          f"(MetricRing: {MetricRing.estimate_bytes(args.samples) / args.samples:.2f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+"""
+Synthetic NMMiner fleet.
+
+Emulates N NMMiner devices over UDP: every miner sends firmware-style status
+packets to the status port at its report interval (with jitter) and a config
+packet to the config port at start-up and every config interval. Each
+miner answers `{"command": "get_config"}` on its command port with its
+config, and applies any other JSON object received there as a new config,
+confirming it with a config packet like the firmware does.
+
+Miners get loopback addresses (127.1.0.1, 127.1.0.2, ... by default), which
+Linux routes to the local host without any setup, so the controller sends
+its commands to the right simulated miner. A fraction of the status
+packets can be made oversized (larger than a datagram the controller reads)
+or truncated, to exercise the error paths.
+
+Usage:
+    python -m benchmarks.fleet_simulator [--miners 1000] [--interval 5] [--host 127.0.0.1]
+"""
+
+import argparse
+import heapq
+import json
+import logging
+import random
+import selectors
+import socket
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+BOARD_TYPES = {  # Board -> typical hashrate in KH/s
+    "NMMiner": 78.0,
+    "NMAxe": 1050.0,
+    "NMQAxe": 3200.0,
+    "NMMiner-2.8": 55.0,
+}
+
+POOLS = ("stratum+tcp://public-pool.io:21496", "stratum+tcp://pool.tazmining.ch:33333")
+
+
+def miner_ip(index, base="127.1"):
+    """
+    Address of a simulated miner.
+
+    :param index: Miner index.
+    :param base: First two octets.
+    :return: IP address string, unique for up to 65,000 miners.
+    """
+    return f"{base}.{index // 250}.{index % 250 + 1}"
+
+
+def format_hashrate(khs):
+    """Formats a hashrate in KH/s the way the firmware does."""
+    if khs >= 1000:
+        return f"{khs / 1000:.2f}MH/s"
+    return f"{khs:.2f}KH/s"
+
+
+def format_uptime(seconds):
+    """Formats an uptime the way the firmware does (`001d 01:23:46`)."""
+    seconds = int(seconds)
+    return f"{seconds // 86400:03d}d {seconds // 3600 % 24:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+class SimulatedMiner:
+    """State of one simulated device."""
+
+    def __init__(self, index, ip, rng, started):
+        """
+        :param index: Miner index.
+        :param ip: Address of the miner.
+        :param rng: random.Random used for the miner's initial state.
+        :param started: Epoch time the miner booted.
+        """
+        self.index = index
+        self.ip = ip
+        self.rng = random.Random(rng.random())
+        self.board = rng.choice(list(BOARD_TYPES))
+        self.base_hashrate = BOARD_TYPES[self.board] * rng.uniform(0.9, 1.1)
+        self.temp = rng.uniform(38, 55)
+        self.rssi = rng.randint(-80, -40)
+        self.heap = rng.uniform(90, 150)
+        self.accepted = rng.randint(0, 10000)
+        self.rejected = rng.randint(0, 20)
+        self.best_diff = rng.uniform(0.1, 50)
+        self.started = started - rng.uniform(0, 30 * 86400)
+        self.config = {
+            "ip": ip,
+            "BoardType": self.board,
+            "Version": rng.choice(("v1.0.0", "v1.0.0", "v1.0.0", "v0.9.3")),
+            "WiFiSSID": "NMTech-2.4G",
+            "WiFiPWD": "NMMiner2048",
+            "PrimaryPool": POOLS[0],
+            "PrimaryPassword": "x",
+            "PrimaryAddress": "18dK8EfyepKuS74fs27iuDJWoGUT4rPto1",
+            "SecondaryPool": POOLS[1],
+            "SecondaryPassword": "x",
+            "SecondaryAddress": "18dK8EfyepKuS74fs27iuDJWoGUT4rPto1",
+            "Timezone": 8,
+            "UIRefresh": 2,
+            "ScreenTimeout": 60,
+            "Brightness": 100,
+            "SaveUptime": True,
+            "LedEnable": True,
+            "RotateScreen": False,
+            "BTCPrice": False,
+            "AutoBrightness": True,
+        }
+
+    def status(self, now):
+        """
+        Advances the miner state and returns a status packet.
+
+        :param now: Current epoch time.
+        :return: Dictionary of status fields.
+        """
+        rng = self.rng
+        self.temp = min(80.0, max(30.0, self.temp + rng.choice((-0.1, 0, 0, 0.1))))
+        if rng.random() < 0.1:
+            self.rssi = max(-95, min(-30, self.rssi + rng.choice((-1, 1))))
+        self.heap = max(40.0, self.heap + rng.choice((-0.1, 0, 0.1)))
+        if rng.random() < 0.3:
+            self.accepted += 1
+        if rng.random() < 0.002:
+            self.rejected += 1
+        total = self.accepted + self.rejected
+        return {
+            "ip": self.ip,
+            "BoardType": self.board,
+            "HashRate": format_hashrate(self.base_hashrate * rng.uniform(0.97, 1.03)),
+            "Share": f"{self.rejected}/{self.accepted} ({self.accepted / max(1, total) * 100:.2f}%)",
+            "NetDiff": "89.47T",
+            "PoolDiff": "0.001",
+            "LastDiff": f"{rng.uniform(0, 0.01):.4f}",
+            "BestDiff": f"{self.best_diff:.3f}M",
+            "Valid": 0,
+            "Progress": 0.0,
+            "Temp": round(self.temp, 1),
+            "RSSI": self.rssi,
+            "FreeHeap": round(self.heap, 1),
+            "Uptime": format_uptime(now - self.started),
+            "Version": self.config["Version"],
+            "PoolInUse": self.config["PrimaryPool"],
+        }
+
+
+class FleetSimulator:
+    """
+    Sends the traffic of a simulated fleet and answers its commands.
+
+    run() sends packets from a scheduling loop until stop() is called;
+    start() runs it in a background thread. Counters are kept for the
+    benchmark driver: packets sent per kind and commands answered.
+    """
+
+    def __init__(self, miners, host="127.0.0.1", status_port=12345, command_port=12347, interval=5.0,
+                 jitter=0.1, config_interval=60.0, oversized_rate=0.0, truncated_rate=0.0,
+                 ip_base="127.1", seed=1, answer_commands=True, senders=8):
+        """
+        :param miners: Number of simulated miners.
+        :param host: Address of the controller.
+        :param status_port: Status port of the controller; config packets go to status_port + 1.
+        :param command_port: Port the miners listen on for commands.
+        :param interval: Seconds between status packets of a miner.
+        :param jitter: Random variation of the interval, as a fraction of it.
+        :param config_interval: Seconds between config packets of a miner (0: only at start-up).
+        :param oversized_rate: Fraction of status packets padded beyond 4096 bytes.
+        :param truncated_rate: Fraction of status packets cut short.
+        :param ip_base: First two octets of the miner addresses.
+        :param seed: Random seed, so runs are repeatable.
+        :param answer_commands: Bind a command socket per miner and answer commands.
+        :param senders: Number of sockets the packets are sent from.
+        """
+        rng = random.Random(seed)
+        now = time.time()
+        self.rng = rng
+        self.miners = [SimulatedMiner(index, miner_ip(index, ip_base), rng, now) for index in range(miners)]
+        self.by_ip = {miner.ip: miner for miner in self.miners}
+        self.status_address = (host, status_port)
+        self.config_address = (host, status_port + 1)
+        self.command_port = command_port
+        self.interval = interval
+        self.jitter = jitter
+        self.config_interval = config_interval
+        self.oversized_rate = oversized_rate
+        self.truncated_rate = truncated_rate
+        self.socks = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for _ in range(max(1, senders))]
+        self.sent = {"status": 0, "config": 0, "oversized": 0, "truncated": 0}
+        self.send_errors = 0
+        self.commands = {"get_config": 0, "set_config": 0, "invalid": 0}
+        self._stop_event = threading.Event()
+        self._threads = []
+        self._selector = None
+        self._command_socks = []
+        if answer_commands:
+            self._bind_command_sockets()
+
+    def _bind_command_sockets(self):
+        """Binds one command socket per miner address."""
+        if resource is not None:  # One descriptor per miner: raise the soft limit as far as allowed
+            needed = len(self.miners) + 64
+            soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+            if soft != resource.RLIM_INFINITY and soft < needed:
+                target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+                resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+        self._selector = selectors.DefaultSelector()
+        for miner in self.miners:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            try:
+                sock.bind((miner.ip, self.command_port))
+            except OSError as e:
+                sock.close()
+                logging.warning(f"[FleetSimulator] Commands are answered for the first {len(self._command_socks)} "
+                                f"miners only, binding {miner.ip}:{self.command_port} failed: {e}")
+                break
+            sock.setblocking(False)
+            self._selector.register(sock, selectors.EVENT_READ, miner)
+            self._command_socks.append(sock)
+
+    def _send(self, miner, payload, address):
+        try:
+            self.socks[miner.index % len(self.socks)].sendto(payload, address)
+            return True
+        except OSError:
+            self.send_errors += 1  # Local send buffer full
+            return False
+
+    def send_status(self, miner, now, extra=None):
+        """
+        Sends one status packet, possibly malformed.
+
+        :param miner: SimulatedMiner sending the packet.
+        :param now: Current epoch time.
+        :param extra: Additional fields to include.
+        """
+        packet = miner.status(now)
+        if extra:
+            packet.update(extra)
+        payload = json.dumps(packet).encode()
+        kind = "status"
+        roll = self.rng.random()
+        if roll < self.oversized_rate:
+            packet["Padding"] = "x" * 4200
+            payload = json.dumps(packet).encode()
+            kind = "oversized"
+        elif roll < self.oversized_rate + self.truncated_rate:
+            payload = payload[:self.rng.randint(1, len(payload) - 1)]
+            kind = "truncated"
+        if self._send(miner, payload, self.status_address):
+            self.sent[kind] += 1
+
+    def send_config(self, miner):
+        """Sends the config packet of a miner."""
+        if self._send(miner, json.dumps(miner.config).encode(), self.config_address):
+            self.sent["config"] += 1
+
+    def run(self, duration=None):
+        """
+        Sends packets until stop() is called or the duration has passed.
+
+        :param duration: Seconds to run, or None to run until stopped.
+        """
+        start = time.monotonic()
+        deadline = None if duration is None else start + duration
+        # (due time, kind, miner index); the first status packets are spread over one interval
+        schedule = [(start + self.rng.uniform(0, self.interval), 0, miner.index) for miner in self.miners]
+        schedule += [(start + self.rng.uniform(0, min(self.interval, 1.0)), 1, miner.index) for miner in self.miners]
+        heapq.heapify(schedule)
+        while schedule and not self._stop_event.is_set():
+            due, kind, index = schedule[0]
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                break
+            if due > now:
+                self._stop_event.wait(min(due - now, 0.05))
+                continue
+            miner = self.miners[index]
+            if kind == 0:
+                self.send_status(miner, time.time())
+                delay = self.interval * (1 + self.rng.uniform(-self.jitter, self.jitter))
+            else:
+                self.send_config(miner)
+                delay = self.config_interval
+            if delay > 0:
+                heapq.heapreplace(schedule, (due + delay, kind, index))
+            else:
+                heapq.heappop(schedule)
+
+    def serve_commands(self):
+        """Answers commands on the miners' command sockets until stop() is called."""
+        while not self._stop_event.is_set():
+            for key, _ in self._selector.select(timeout=0.1):
+                try:
+                    data, addr = key.fileobj.recvfrom(4096)
+                except OSError:
+                    continue
+                self.handle_command(key.data, key.fileobj, data, addr)
+
+    def handle_command(self, miner, sock, data, addr):
+        """
+        Handles a command received by a miner.
+
+        :param miner: SimulatedMiner the command was sent to.
+        :param sock: Command socket of the miner.
+        :param data: Received datagram.
+        :param addr: Address of the sender.
+        """
+        try:
+            command = json.loads(bytes(data).decode("utf-8").rstrip("\x00"))
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            self.commands["invalid"] += 1
+            return
+        if not isinstance(command, dict):
+            self.commands["invalid"] += 1
+            return
+        if command.get("command") == "get_config":
+            self.commands["get_config"] += 1
+            reply = dict(miner.config)
+            if "id" in command:
+                reply["id"] = command["id"]  # Echo a correlation id when one is sent
+            sock.sendto(json.dumps(reply).encode(), addr)
+            return
+        self.commands["set_config"] += 1
+        miner.config.update({key: value for key, value in command.items() if key in miner.config and key != "ip"})
+        self.send_config(miner)
+
+    def start(self, duration=None):
+        """
+        Runs the sender and the command server in background threads.
+
+        :param duration: Seconds to send packets, or None to send until stopped.
+        """
+        self._stop_event.clear()
+        self._threads = [threading.Thread(target=self.run, args=(duration,), name="FleetSender", daemon=True)]
+        if self._command_socks:
+            self._threads.append(threading.Thread(target=self.serve_commands, name="FleetCommands", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def is_running(self):
+        """Returns True while the sender thread started by start() is running."""
+        return bool(self._threads) and self._threads[0].is_alive()
+
+    def stop(self):
+        """Stops the background threads and closes every socket."""
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout=2)
+        for sock in self.socks + self._command_socks:
+            sock.close()
+        if self._selector is not None:
+            self._selector.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated NMMiner fleet")
+    parser.add_argument("--miners", type=int, default=1000)
+    parser.add_argument("--host", default="127.0.0.1", help="Controller address (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=12345, help="Controller status port; config is port + 1")
+    parser.add_argument("--command-port", type=int, default=12347)
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between status packets of a miner")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Interval variation as a fraction")
+    parser.add_argument("--config-interval", type=float, default=60.0)
+    parser.add_argument("--oversized", type=float, default=0.0, help="Fraction of oversized status packets")
+    parser.add_argument("--truncated", type=float, default=0.0, help="Fraction of truncated status packets")
+    parser.add_argument("--ip-base", default="127.1")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-commands", action="store_true", help="Do not answer commands")
+    parser.add_argument("--seconds", type=float, default=None, help="Run time (default: until interrupted)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    fleet = FleetSimulator(args.miners, host=args.host, status_port=args.port, command_port=args.command_port,
+                           interval=args.interval, jitter=args.jitter, config_interval=args.config_interval,
+                           oversized_rate=args.oversized, truncated_rate=args.truncated, ip_base=args.ip_base,
+                           seed=args.seed, answer_commands=not args.no_commands)
+    logging.info(f"[FleetSimulator] {args.miners} miners sending to {args.host}:{args.port}, "
+                 f"{args.miners / args.interval:,.0f} status packets/s")
+    fleet.start(args.seconds)
+    try:
+        while fleet.is_running():
+            time.sleep(5)
+            logging.info(f"[FleetSimulator] Sent {fleet.sent}, commands {fleet.commands}, "
+                         f"send errors {fleet.send_errors}")
+    except KeyboardInterrupt:
+        pass
+    fleet.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Replays captured datagram logs through the ingest path.
+
+Reads logs recorded with --capture or /admin/capture (several logs, e.g. one
+per multiprocess ingest worker, are merged by receive time), feeds them
+through UdpThread.process_data() with threads.replay_udp_thread and reports
+throughput, parse failures and process_data latency. With --speed 0 the
+replay runs as fast as possible, which makes parser and merge changes
+comparable on identical, real traffic.
+
+Usage:
+    python -m benchmarks.replay_datagrams capture.nmcap [more.nmcap ...] [--speed 0] [--repeat 3]
+"""
+
+import argparse
+import logging
+
+from threads.replay_udp_thread import ReplayUdpThread
+from utils.datagram_log import merge_datagram_logs
+
+
+def replay_once(paths, speed, batch_size):
+    """
+    Replays the logs once into a fresh ingest engine.
+
+    :param paths: Datagram log files.
+    :param speed: Replay speed, see ReplayUdpThread.
+    :param batch_size: Datagrams per published snapshot.
+    :return: Dictionary of results.
+    """
+    ReplayUdpThread._instance = None  # Allow a fresh engine per run
+    engine = ReplayUdpThread(merge_datagram_logs(paths), speed=speed, batch_size=batch_size)
+    engine.wait()
+    engine.stop()
+    ReplayUdpThread._instance = None
+    process = engine.latency.get("process_data").percentiles((50, 99))
+    return {
+        "datagrams": engine.replayed,
+        "seconds": engine.replay_seconds,
+        "rate": engine.replayed / engine.replay_seconds if engine.replay_seconds else 0.0,
+        "parse_errors": engine.parse_errors,
+        "truncated": engine.truncated_packets,
+        "miners": len(engine.get_miner_map()),
+        "process_p50_us": process.get(50, 0) / 1e3,
+        "process_p99_us": process.get(99, 0) / 1e3,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured datagrams through the ingest path")
+    parser.add_argument("logs", nargs="+", help="Datagram log files, merged by receive time")
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="Replay speed: 1 is real time, 10 ten times faster, 0 as fast as possible (default)")
+    parser.add_argument("--repeat", type=int, default=1, help="Number of replays")
+    parser.add_argument("--batch-size", type=int, default=256, help="Datagrams per published snapshot")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)  # Per-packet logging would dominate the measurement
+    print(f"{'run':>3} {'datagrams':>10} {'seconds':>8} {'datagrams/s':>12} {'errors':>7} {'truncated':>9} "
+          f"{'miners':>7} {'p50':>9} {'p99':>9}")
+    for run in range(1, args.repeat + 1):
+        result = replay_once(args.logs, args.speed, args.batch_size)
+        print(f"{run:>3} {result['datagrams']:>10,} {result['seconds']:>8.2f} {result['rate']:>12,.0f} "
+              f"{result['parse_errors']:>7,} {result['truncated']:>9,} {result['miners']:>7,} "
+              f"{result['process_p50_us']:>7.1f}us {result['process_p99_us']:>7.1f}us")
+
+
+if __name__ == "__main__":
+    main()
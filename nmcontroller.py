@@ -8,19 +8,37 @@ This script initializes and runs the NMMiner monitoring server using Flask.
 It listens for miner updates via UDP and retrieves Bitcoin block reward and price information.
 """
 
+import argparse
+import json
+import multiprocessing
 import os
 import socket
 import sys
+import threading
 import time
 import logging
 
 import waitress
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+from flask import Flask, Response, g, get_template_attribute, render_template, request, jsonify, redirect, url_for
 
 from threads.btcinfo_thread import BtcInfoThread
+from threads.command_thread import CommandThread
+from threads.metrics_writer_thread import MetricsWriterThread
+from threads.stream_thread import StreamBroadcaster
 from threads.udp_thread import UdpThread
+from threads.async_udp_thread import AsyncUdpThread
+from threads.multiprocess_udp_thread import MultiprocessUdpThread
 from utils import hashrate_formatter, firmware_utils
-from utils.time_format_utils import split_time_string, compact_uptime, time_difference
+from utils.downsample import lttb
+from utils.metric_rollups import FLEET
+from utils.miner_query import SortedIndex, build_filter, build_selector, ip_sort_key, project
+from utils.latency_histogram import HistogramSet
+from utils.http_cache import (CompressedBodyCache, body_etag, encoded_etag, make_etag, matching_etag,
+                              negotiate_encoding)
+from utils.profiling import format_samples, format_stats, sample_stacks
+from utils.prometheus import CONTENT_TYPE as METRICS_CONTENT_TYPE, MinerExposition, format_family
+from utils.render_cache import RenderCache
+from utils.time_format_utils import format_duration
 from utils.network_discovery import NetworkDeviceManager
 
 # Configure logging
@@ -38,6 +56,153 @@ hasher = hashrate_formatter.HashrateFormatter()
 # Initialize network device manager
 network_manager = NetworkDeviceManager()
 
+# Persistent metrics writer, set up in __main__ unless disabled
+metrics_writer = None
+
+# Live update broadcaster for /api/stream, set up in __main__
+stream_broadcaster = None
+# Points of the dashboard sparklines, from /api/series and in live stream deltas
+SPARKLINE_POINTS = 60
+# Raw samples read for one miner series; ranges holding more are answered from the rollups
+HISTORY_MAX_SAMPLES = 10000
+# Buckets wanted from the rollups for such ranges (7 days resolve to 5-minute buckets)
+HISTORY_ROLLUP_POINTS = 2000
+
+# Shared command socket and configuration rollouts, set up in __main__
+command_thread = None
+
+# Sorted views of the miner snapshots for /api/miners
+miner_index = SortedIndex()
+
+# Rendered web monitor pages, reused while the data they show is unchanged
+page_cache = RenderCache(max_age=1.0)
+
+# Per-miner /metrics lines, re-rendered only for miners that changed
+miner_exposition = MinerExposition()
+
+# Time spent in each route, including template rendering and compression
+route_latency = HistogramSet()
+
+# Set while /admin/profile is sampling, so only one profile runs at a time
+profile_lock = threading.Lock()
+
+
+@app.before_request
+def start_route_timer():
+    """Remember when the request started, for route_latency."""
+    g.request_start = time.perf_counter_ns()
+
+
+@app.after_request
+def record_route_latency(response):
+    """
+    Record the time spent in the route.
+
+    Registered before compress_json() so that it runs after it and the
+    compression time is included.
+    """
+    start = g.get('request_start')
+    if start is not None:
+        route_latency.get(request.endpoint or 'not_found').record(time.perf_counter_ns() - start)
+    return response
+
+
+# Compressed JSON bodies by ETag, and the smallest body worth compressing
+compressed_bodies = CompressedBodyCache()
+compress_min_bytes = 1024
+# Where /admin/capture writes datagram logs, and their size limit
+capture_dir = 'captures'
+capture_max_bytes = 1024 * 1024 * 1024
+
+
+def not_modified(version):
+    """
+    Check a GET request against an ETag derived from the data version it is served from.
+
+    The tag also covers the path and query string, so it is checked before
+    the response is built and an unchanged resource costs no serialization.
+
+    :param version: Data version of the response (e.g. the snapshot version).
+    :return: Tuple of (304 response or None, ETag to set on the full response).
+    """
+    etag = make_etag(request.path, request.query_string, version)
+    matched = matching_etag(request.if_none_match, etag)
+    if matched:
+        response = Response(status=304)
+        response.set_etag(matched)
+        response.vary.add('Accept-Encoding')
+        return response, etag
+    return None, etag
+
+
+@app.after_request
+def compress_json(response):
+    """
+    Add a strong ETag, answer conditional GETs and compress JSON and /metrics responses.
+
+    Responses without an ETag from not_modified() are tagged with a hash of
+    their body. Bodies of at least compress_min_bytes are compressed with the
+    best encoding the client accepts, once per ETag and encoding.
+    """
+    if (request.method not in ('GET', 'HEAD') or response.status_code != 200
+            or response.mimetype not in ('application/json', 'text/plain') or response.direct_passthrough):
+        return response
+
+    data = response.get_data()
+    etag = response.get_etag()[0] or body_etag(data)
+    response.vary.add('Accept-Encoding')
+    matched = matching_etag(request.if_none_match, etag)
+    if matched:
+        response.status_code = 304
+        response.set_data(b'')
+        response.set_etag(matched)
+        return response
+
+    encoding = negotiate_encoding(request.accept_encodings) if len(data) >= compress_min_bytes else None
+    if encoding:
+        response.set_data(compressed_bodies.get(etag, encoding, data))
+        response.content_encoding = encoding
+    response.set_etag(encoded_etag(etag, encoding))
+    return response
+
+
+def build_miner_row(record, now):
+    """
+    Format a miner record as a row of the monitoring table.
+
+    :param record: MinerRecord of the miner.
+    :param now: Current time.monotonic(), used for the last seen column.
+    :return: List of display values in template column order.
+    """
+    version = record.get('Version', 'Unknown')
+
+    # Check if firmware version is outdated
+    if version != 'Unknown' and not firmware_utils.compare_versions(version, latest_version):
+        version += '*'
+
+    if record.uptime is not None:
+        uptime = format_duration(record.uptime)
+    else:
+        uptime = str(record.uptime_text or '')
+
+    return [
+        record.get('ip', 'Unknown'),
+        record.get("BoardType", 'Unknown'),
+        record.hashrate_text or '0',
+        record.share_display(),
+        record.get('NetDiff', 0),
+        record.get('BestDiff', 0),
+        record.get('Valid', 0),
+        round(record.temp, 1),
+        record.rssi,
+        round(record.free_heap, 2),
+        version,
+        uptime,
+        format_duration(record.age(now)),
+        record.get('LastDiff', 0),
+        record.state,
+    ]
+
 
 @app.route('/', methods=['GET', 'POST'])
 @app.route('/web_monitor', methods=['GET', 'POST'])
@@ -45,83 +210,52 @@ def web_monitor():
     """
     Web route for the monitoring page.
 
-    Retrieves miner data from both UDP thread and network discovery,
-    processes statistics, and renders the web interface.
+    The rendered page is shared by all requests for the same miner snapshot
+    version and BTC values for up to --page-cache-seconds.
+
+    :return: Rendered HTML template with miner details and Bitcoin stats.
+    """
+    snapshot = udp_thread.get_snapshot()
+    key = (snapshot.version, latest_version, btcinfo_thread.block_reward_value, btcinfo_thread.block_reward,
+           btcinfo_thread.btc_price, btcinfo_thread.btc_price_source)
+    return page_cache.get(key, lambda: render_web_monitor(snapshot))
 
+
+def render_web_monitor(snapshot):
+    """
+    Render the monitoring page.
+
+    Retrieves miner data from the UDP thread snapshot, processes statistics,
+    and renders the web interface.
+
+    :param snapshot: MinerSnapshot to render.
     :return: Rendered HTML template with miner details and Bitcoin stats.
     """
     nmminer_list = []
-    total_hashrate = 0.0
-    all_miners = {}
 
-    # Get data from UDP thread only (more reliable)
-    all_miners = udp_thread.get_miner_map()
+    # Get data from UDP thread only (more reliable); the snapshot is shared, not copied
+    all_miners = snapshot.miners
     
     # Debug logging for data state
     logging.info(f"Web monitor: Retrieved {len(all_miners)} devices from UDP thread")
-    for ip, data in all_miners.items():
-        logging.debug(f"Device {ip}: Version={data.get('Version', 'Missing')}, BoardType={data.get('BoardType', 'Missing')}, UpdateTime={data.get('UpdateTime', 'Missing')}")
     
     if not all_miners:
         logging.warning("No miner data available from UDP thread")
     
-    # Process all miner data
-    for miner_id, miner_data in sorted(all_miners.items()):
-        version = miner_data.get('Version', 'Unknown')
-
-        # Check if firmware version is outdated
-        if version != 'Unknown' and not firmware_utils.compare_versions(version, latest_version):
-            version += '*'
+    # Values are parsed once when packets arrive, so only formatting is done here
+    now = time.monotonic()
+    for miner_id, record in sorted(all_miners.items()):
+        nmminer_list.append(build_miner_row(record, now))
 
-        upTime, _ = split_time_string(miner_data.get('Uptime', '0'))
-
-        # Handle share data safely
-        share_data = miner_data.get("Share", "0/0")
-        if isinstance(share_data, str) and '/' in share_data:
-            try:
-                if '(' in share_data and ')' in share_data:
-                    # Format: "rejected/accepted (percentage%)"
-                    parts = share_data.split('(')
-                    rejected, accepted = parts[0].strip().split('/')
-                    percentage = parts[1].replace(')', '').strip()
-                    share_display = f'{rejected}/{accepted} ({percentage})'
-                else:
-                    # Simple format: "rejected/accepted"
-                    rejected, accepted = share_data.split('/')
-                    share_display = f'{rejected}/{accepted}'
-            except (ValueError, IndexError):
-                share_display = share_data
-        else:
-            share_display = str(share_data)
-
-        # Append relevant miner details
-        nmminer_list.append([
-            miner_data.get('ip', 'Unknown'),
-            miner_data.get("BoardType", 'Unknown'),
-            miner_data.get('HashRate', '0'),
-            share_display,
-            miner_data.get('NetDiff', 0),
-            miner_data.get('BestDiff', 0),
-            miner_data.get('Valid', 0),
-            round(float(miner_data.get('Temp', 0.0)), 1),
-            miner_data.get('RSSI', 0),
-            round(float(miner_data.get('FreeHeap', 0.0)), 2),
-            version,
-            compact_uptime(upTime),
-            time_difference(miner_data.get('UpdateTime', 'Unknown')),
-            miner_data.get('LastDiff', 0),
-        ])
-
-        # Convert and accumulate hashrate
-        hashrate_value = miner_data.get('HashRate')
-        if hashrate_value and str(hashrate_value) != '0':
-            total_hashrate += hasher.convert_hashrate(hashrate_value)
+    # Fleet totals are maintained incrementally by the UDP thread
+    total_hashrate = snapshot.aggregates['total_hashrate']
 
     # Render template with miner statistics
     return render_template(
         'web_monitor.html',
         result=nmminer_list,
         totalHash=hasher.format_hashrate(total_hashrate),
+        active_count=snapshot.aggregates['online_count'],
         latest_version=latest_version,
         reward_value=btcinfo_thread.block_reward_value,
         block_reward=btcinfo_thread.block_reward,
@@ -130,14 +264,71 @@ def web_monitor():
     )
 
 
+def render_stream_delta(changes):
+    """
+    Render coalesced miner changes as the JSON payload of a live stream message.
+
+    Called from the stream broadcaster thread, once per interval for all viewers.
+
+    :param changes: Dictionary of IP -> MinerRecord, or None for removed miners.
+    :return: JSON string with the rendered rows and hashrate sparklines,
+             removed IPs and fleet totals.
+    """
+    with app.app_context():
+        miner_row = get_template_attribute('miner_row.html', 'miner_row')
+        now = time.monotonic()
+        miners = []
+        for ip, record in sorted(changes.items()):
+            if record is None:
+                continue
+            miner = {'ip': ip, 'html': str(miner_row(build_miner_row(record, now)))}
+            series = udp_thread.history.query(ip, 'hashrate')
+            if series is not None:
+                # Same points as the dashboard's initial /api/series request
+                timestamps, values = lttb(series[0], series[1], SPARKLINE_POINTS)
+                miner['sparkline'] = {'timestamps': timestamps, 'values': values}
+            miners.append(miner)
+    aggregates = udp_thread.get_aggregates()
+    return json.dumps({
+        'miners': miners,
+        'removed': [ip for ip, record in changes.items() if record is None],
+        'fleet': {
+            'total_hashrate': hasher.format_hashrate(aggregates['total_hashrate']),
+            'active_count': aggregates['online_count'],
+        },
+    })
+
+
+@app.route('/api/stream')
+def api_stream():
+    """
+    Server-Sent Events stream of miner changes for the web monitor.
+
+    Sends a "delta" event with the re-rendered rows of the miners that changed
+    during the last interval, the removed miners and the fleet totals, and a
+    "reset" event when the client falls behind and should reload the page.
+    Answers 503 when --max-streams streams are already open, since every
+    stream holds a web server thread.
+    """
+    if stream_broadcaster is None:
+        return jsonify({'error': 'Live updates are not available'}), 503
+    subscriber = stream_broadcaster.subscribe()
+    if subscriber is None:
+        response = jsonify({'error': 'Too many live streams are open'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+    return Response(stream_broadcaster.stream(subscriber), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @app.route('/config/<device_ip>')
 def device_config(device_ip):
     """
     Configuration page for a specific device.
     """
     # Get device info from UDP thread
-    miner_map = udp_thread.get_miner_map()
-    device_data = miner_map.get(device_ip)
+    device_data = udp_thread.get_miner(device_ip)
     
     if not device_data:
         return redirect(url_for('web_monitor'))
@@ -146,11 +337,11 @@ def device_config(device_ip):
     device = {
         'board_type': device_data.get('BoardType', 'Unknown'),
         'version': device_data.get('Version', 'Unknown'),
-        'is_online': True
+        'is_online': device_data.is_online
     }
     
     # Use the device data as config if available
-    config = device_data
+    config = device_data.fields
     
     return render_template(
         'device_config.html',
@@ -166,10 +357,21 @@ def api_device_config(device_ip):
     API endpoint for device configuration.
     """
     if request.method == 'GET':
+        if request.args.get('live') == '1':
+            # Ask the device itself instead of returning the last packets it sent
+            config = command_thread.request_config(device_ip, request.args.get('timeout', 2.0, type=float))
+            if config is None:
+                return jsonify({'error': f'{device_ip} did not answer get_config'}), 504
+            return jsonify(config)
+
         # Get current configuration from UDP thread
-        miner_map = udp_thread.get_miner_map()
-        config = miner_map.get(device_ip, {})
-        return jsonify(config)
+        record = udp_thread.get_miner(device_ip)
+        cached, etag = not_modified(record.seq if record else None)
+        if cached:
+            return cached
+        response = jsonify(record.to_dict() if record else {})
+        response.set_etag(etag)
+        return response
     
     elif request.method == 'POST':
         # Update device configuration
@@ -178,19 +380,15 @@ def api_device_config(device_ip):
             if not config:
                 return jsonify({'error': 'No configuration data provided'}), 400
             
-            # Send configuration to device via UDP
-            import json
-            config_data = json.dumps(config).encode('utf-8')
-            
+            # Send configuration to the device command port (12347) from the shared command socket,
+            # resent until the device confirms it with a config packet
             try:
-                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-                sock.settimeout(2.0)
-                # Send to device command port (12347) - correct port for sending configs
-                sock.sendto(config_data, (device_ip, 12347))
-                sock.close()
-                
-                logging.info(f"Configuration sent to {device_ip}:12347")
-                return jsonify({'success': True, 'message': 'Configuration sent successfully'})
+                job = command_thread.submit(config, [device_ip])
+                logging.info(f"Configuration queued for {device_ip}:{command_thread.command_port}")
+                response = jsonify({'success': True, 'message': 'Configuration queued', 'job_id': job.id})
+                response.status_code = 202
+                response.headers['Location'] = url_for('api_rollout', job_id=job.id)
+                return response
                 
             except Exception as e:
                 logging.error(f"Error sending config to {device_ip}: {e}")
@@ -201,28 +399,585 @@ def api_device_config(device_ip):
             return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/rollouts', methods=['GET', 'POST'])
+def api_rollouts():
+    """
+    API endpoint for fleet-wide configuration rollouts.
+
+    GET lists the rollout jobs, newest first. POST starts a rollout from a JSON
+    body with:
+      - config: configuration fields sent to every target.
+      - selector: which miners to target; any of ips (list), cidr (network or
+        list), board, version and state (value or list) and the /api/miners
+        thresholds. All criteria must match.
+      - include_offline: also target offline miners (default false).
+    The job is reported at /api/rollouts/<id>.
+    """
+    if request.method == 'GET':
+        return jsonify({'jobs': [job.to_dict() for job in command_thread.list_jobs()],
+                        'channel': command_thread.get_stats()})
+
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    config = body.get('config')
+    if not isinstance(config, dict) or not config:
+        return jsonify({'error': 'config must be a non-empty object'}), 400
+    try:
+        predicate = build_selector(body.get('selector'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    include_offline = bool(body.get('include_offline', False))
+
+    snapshot = udp_thread.get_snapshot()
+    targets = [ip for ip, record in snapshot.miners.items()
+               if (include_offline or record.is_online) and predicate(record)]
+    if not targets:
+        return jsonify({'error': 'No miners match the selector'}), 400
+    targets.sort(key=ip_sort_key)
+    job = command_thread.submit(config, targets)
+    response = jsonify(job.to_dict())
+    response.status_code = 202
+    response.headers['Location'] = url_for('api_rollout', job_id=job.id)
+    return response
+
+
+@app.route('/api/rollouts/<int:job_id>', methods=['GET', 'DELETE'])
+def api_rollout(job_id):
+    """
+    API endpoint for the progress of one rollout job.
+
+    GET returns the counts and the state of every target (`state=failed`
+    lists only the targets in that state). DELETE cancels the targets that
+    were not sent yet.
+    """
+    if request.method == 'DELETE':
+        job = command_thread.cancel(job_id)
+    else:
+        job = command_thread.get_job(job_id)
+    if job is None:
+        return jsonify({'error': f'Unknown rollout {job_id}'}), 404
+    return jsonify(job.to_dict(details=True, target_state=request.args.get('state') or None))
+
+
+@app.route('/api/inventory')
+def api_inventory():
+    """
+    API endpoint that reads the configuration of every known miner with get_config.
+
+    All requests are sent at once over the shared command socket and answered
+    concurrently, so the sweep takes about one timeout regardless of fleet size.
+
+    Query parameters:
+      - timeout: seconds to wait for the replies (default 2, at most 30).
+      - fields: comma-separated config keys to return (default: all).
+      - /api/miners filters (board, version, state, pool, thresholds) select the
+        miners; offline miners are skipped unless a state filter is given.
+    """
+    timeout = request.args.get('timeout', 2.0, type=float)
+    if not 0 < timeout <= 30:
+        return jsonify({'error': 'timeout must be between 0 and 30'}), 400
+    try:
+        predicate = build_filter(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    fields = [field for field in request.args.get('fields', '').split(',') if field]
+    filter_state = bool(request.args.get('state'))
+
+    snapshot = udp_thread.get_snapshot()
+    ips = sorted((ip for ip, record in snapshot.miners.items()
+                  if (filter_state or record.is_online) and (predicate is None or predicate(record))),
+                 key=ip_sort_key)
+    sweep = command_thread.request_configs(ips, timeout)
+    sweep.wait(timeout + 1)
+    configs = sweep.configs
+    if fields:
+        configs = {ip: {field: config[field] for field in fields if field in config} if config is not None else None
+                   for ip, config in configs.items()}
+    return jsonify({
+        'requested': len(ips),
+        'answered': sweep.answered,
+        'timed_out': sweep.timed_out,
+        'seconds': round(sweep.seconds, 3),
+        'configs': configs,
+    })
+
+
+@app.route('/api/fleet')
+def api_fleet():
+    """
+    API endpoint for fleet-wide aggregates (total and per board hashrate, counts, temperatures, shares).
+    """
+    snapshot = udp_thread.get_snapshot()
+    cached, etag = not_modified(snapshot.version)
+    if cached:
+        return cached
+    response = jsonify(snapshot.aggregates)
+    response.set_etag(etag)
+    return response
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """
+    Prometheus scrape endpoint with per-miner gauges and controller internals.
+    """
+    snapshot = udp_thread.get_snapshot()
+    stats = udp_thread.get_receive_stats()
+    fetch_stats = btcinfo_thread.fetch_stats
+    caches = {'page': page_cache.stats(), 'miner_index': {'hits': miner_index.hits, 'misses': miner_index.misses},
+              'compressed_bodies': compressed_bodies.stats()}
+
+    families = [
+        miner_exposition.render(snapshot),
+        format_family('nmcontroller_miners', 'gauge', 'Miners in the miner map.',
+                      [({}, len(snapshot.miners))]),
+        format_family('nmcontroller_miners_online', 'gauge', 'Miners that are not offline.',
+                      [({}, snapshot.aggregates['online_count'])]),
+        format_family('nmcontroller_fleet_hashrate_hashes_per_second', 'gauge', 'Total hashrate of online miners.',
+                      [({}, snapshot.aggregates['total_hashrate'])]),
+        format_family('nmcontroller_snapshot_version', 'gauge', 'Changes applied to the miner map.',
+                      [({}, snapshot.version)]),
+        format_family('nmcontroller_udp_packets_received_total', 'counter', 'Datagrams received per port.',
+                      [({'port': port}, count) for port, count in sorted(stats['packets_received'].items())]),
+        format_family('nmcontroller_udp_kernel_drops_total', 'counter',
+                      'Datagrams dropped by the kernel per port (Linux only).',
+                      [({'port': port}, count) for port, count in sorted(stats['kernel_drops'].items())]),
+        format_family('nmcontroller_parse_failures_total', 'counter', 'Datagrams that were not valid JSON.',
+                      [({}, stats['parse_errors'])]),
+        format_family('nmcontroller_truncated_packets_total', 'counter', 'Datagrams with incomplete JSON dropped.',
+                      [({}, stats['truncated_packets'])]),
+        format_family('nmcontroller_miner_map_lock_acquisitions_total', 'counter',
+                      'Acquisitions of the miner map lock.', [({}, stats['lock_acquisitions'])]),
+        format_family('nmcontroller_miner_map_lock_contended_total', 'counter',
+                      'Acquisitions of the miner map lock that had to wait.', [({}, stats['lock_contended'])]),
+        format_family('nmcontroller_miner_map_lock_wait_seconds_total', 'counter',
+                      'Time spent waiting for the miner map lock.', [({}, stats['lock_wait_seconds'])]),
+        format_family('nmcontroller_btc_fetch_duration_seconds', 'summary',
+                      'Latency of BTC price and block height requests per source.',
+                      [sample for source, fetch in sorted(fetch_stats.items())
+                       for sample in (('_sum', {'source': source}, fetch['seconds_total']),
+                                      ('_count', {'source': source}, fetch['count']))]),
+        format_family('nmcontroller_btc_fetch_last_duration_seconds', 'gauge',
+                      'Latency of the last BTC price or block height request per source.',
+                      [({'source': source}, fetch['last_seconds']) for source, fetch in sorted(fetch_stats.items())]),
+        format_family('nmcontroller_btc_fetch_failures_total', 'counter',
+                      'Failed BTC price and block height requests per source.',
+                      [({'source': source}, fetch['failures']) for source, fetch in sorted(fetch_stats.items())]),
+        format_family('nmcontroller_btc_price_usd', 'gauge', 'Last BTC price.',
+                      [({'source': btcinfo_thread.btc_price_source}, btcinfo_thread.btc_price)]),
+        format_family('nmcontroller_cache_hits_total', 'counter', 'Web server cache hits.',
+                      [({'cache': name}, cache['hits']) for name, cache in caches.items()]),
+        format_family('nmcontroller_cache_misses_total', 'counter', 'Web server cache misses.',
+                      [({'cache': name}, cache['misses']) for name, cache in caches.items()]),
+    ]
+    for name, label, help_text, histograms in (
+            ('nmcontroller_ingest_latency_seconds', 'operation', 'Duration of ingest path operations.',
+             udp_thread.latency.items()),
+            ('nmcontroller_route_latency_seconds', 'route', 'Time spent in web routes.', route_latency.items())):
+        samples = []
+        for key, histogram in histograms:
+            for percentile, value in histogram.percentiles((50, 90, 99)).items():
+                samples.append(({label: key, 'quantile': percentile / 100}, value / 1e9))
+            samples.append(('_sum', {label: key}, histogram.total / 1e9))
+            samples.append(('_count', {label: key}, histogram.count))
+        families.append(format_family(name, 'summary', help_text, samples))
+    if metrics_writer is not None:
+        families.append(format_family('nmcontroller_metrics_samples_written_total', 'counter',
+                                      'Samples persisted to the metrics database.',
+                                      [({}, metrics_writer.samples_written)]))
+    return Response(''.join(families), content_type=METRICS_CONTENT_TYPE)
+
+
+@app.route('/api/latency')
+def api_latency():
+    """
+    API endpoint for the latency histograms of the ingest path and of every route.
+
+    Durations are in microseconds. With reset=1 the histograms are cleared
+    after they are read, so successive calls cover successive windows.
+    """
+    data = {
+        'ingest': {name: histogram.summary() for name, histogram in udp_thread.latency.items()},
+        'routes': {name: histogram.summary() for name, histogram in route_latency.items()},
+    }
+    if request.args.get('reset') == '1':
+        udp_thread.latency.reset()
+        route_latency.reset()
+    return jsonify(data)
+
+
+@app.route('/admin/profile')
+def admin_profile():
+    """
+    Profile the running server for a few seconds and return a text report.
+
+    Query parameters:
+      - seconds: profiling duration (default 5, at most 60).
+      - mode: `sample` (default) samples the stacks of every thread;
+        `cprofile` runs cProfile in the UDP ingest thread for exact call counts.
+      - limit: functions listed (default 30).
+      - sort: pstats sort key for cprofile (default cumulative).
+      - format: `collapsed` returns sampled stacks in the collapsed format
+        read by flame graph tools instead of the report.
+      - idle=1 keeps the samples of threads waiting in a lock or select.
+    """
+    seconds = request.args.get('seconds', 5.0, type=float)
+    if not 0 < seconds <= 60:
+        return jsonify({'error': 'seconds must be between 0 and 60'}), 400
+    mode = request.args.get('mode', 'sample')
+    if mode not in ('sample', 'cprofile'):
+        return jsonify({'error': f'Unknown mode `{mode}`'}), 400
+    limit = request.args.get('limit', 30, type=int)
+
+    if not profile_lock.acquire(blocking=False):
+        return jsonify({'error': 'A profile is already running'}), 409
+    try:
+        if mode == 'cprofile':
+            result = udp_thread.profiler.profile(seconds)
+            if result is None:
+                return jsonify({'error': 'The ingest thread did not start the profiler in time'}), 503
+            stats, duration = result
+            try:
+                report = format_stats(stats, request.args.get('sort', 'cumulative'), limit)
+            except KeyError as e:
+                return jsonify({'error': f'Unknown sort key {e}'}), 400
+            body = f'cProfile of {udp_thread.get_thread_name()} for {duration:.1f} s\n\n{report}'
+        else:
+            result = sample_stacks(seconds, include_idle=request.args.get('idle') == '1')
+            if request.args.get('format') == 'collapsed':
+                body = ''.join(f'{stack} {count}\n' for stack, count in result['stacks'].most_common())
+            else:
+                body = format_samples(result, limit)
+    finally:
+        profile_lock.release()
+    return Response(body, mimetype='text/plain')
+
+
+@app.route('/admin/capture', methods=['GET', 'POST'])
+def admin_capture():
+    """
+    Show, start or stop the datagram capture of the UDP ingest engine.
+
+    GET returns the capture counters. POST with `action=start` records every
+    received datagram to a new log in the capture directory, `action=stop`
+    ends the capture. Logs are replayed with benchmarks/replay_datagrams.py.
+    """
+    if request.method == 'POST':
+        action = request.args.get('action')
+        if action == 'start':
+            path = os.path.join(capture_dir, time.strftime('capture-%Y%m%d-%H%M%S.nmcap'))
+            try:
+                udp_thread.start_capture(path, capture_max_bytes)
+            except (RuntimeError, OSError) as e:
+                return jsonify({'error': str(e)}), 409
+        elif action == 'stop':
+            stats = udp_thread.stop_capture()
+            if stats is None:
+                return jsonify({'error': 'No capture is running'}), 409
+            return jsonify({'capturing': False, **stats})
+        else:
+            return jsonify({'error': 'action must be `start` or `stop`'}), 400
+    return jsonify(udp_thread.get_capture_stats())
+
+
+@app.route('/api/cache')
+def api_cache():
+    """
+    API endpoint for the hit and miss counters of the web server caches.
+    """
+    return jsonify({
+        'page': page_cache.stats(),
+        'miner_index': {'hits': miner_index.hits, 'misses': miner_index.misses},
+        'compressed_bodies': compressed_bodies.stats(),
+    })
+
+
+def _float_arg(name):
+    """
+    Read an optional float query parameter.
+
+    :param name: Parameter name.
+    :return: Float value or None when absent.
+    :raises ValueError: If the value is not a number.
+    """
+    value = request.args.get(name)
+    return float(value) if value not in (None, '') else None
+
+
+def _miner_series(device_ip, metric, since, until, limit=None):
+    """
+    Read one miner metric from the in-memory history, or from the on-disk store
+    when the ring buffer does not reach back far enough.
+
+    :param device_ip: Miner IP address.
+    :param metric: Metric name.
+    :param since: Earliest sample time (epoch seconds) or None.
+    :param until: Latest sample time (epoch seconds) or None.
+    :param limit: Maximum number of (newest) samples or None.
+    :return: (timestamps, values) lists, or None when there is no history.
+    :raises ValueError: If the metric is unknown.
+    """
+    series = udp_thread.history.query(device_ip, metric, since, until, limit)
+    oldest = udp_thread.history.oldest_timestamp(device_ip)
+    if metrics_writer is not None and (oldest is None or (since is not None and since < oldest)):
+        series = metrics_writer.store.query(device_ip, metric, since, until, limit) or series
+    return series
+
+
+def _bounded_series(device_ip, metric, since, until, limit=None):
+    """
+    Read one miner metric like _miner_series(), but answer ranges holding more
+    than HISTORY_MAX_SAMPLES samples with the means of rollup buckets, so the
+    cost does not grow with the length of the range.
+
+    :param device_ip: Miner IP address.
+    :param metric: Metric name.
+    :param since: Earliest sample time (epoch seconds) or None.
+    :param until: Latest sample time (epoch seconds) or None.
+    :param limit: Maximum number of (newest) samples or None.
+    :return: Tuple of ((timestamps, values) or None, bucket width in seconds or
+             None for raw samples).
+    :raises ValueError: If the metric is unknown.
+    """
+    capped = limit is None or limit > HISTORY_MAX_SAMPLES
+    series = _miner_series(device_ip, metric, since, until, HISTORY_MAX_SAMPLES + 1 if capped else limit)
+    if not capped or series is None or len(series[0]) <= HISTORY_MAX_SAMPLES:
+        return series, None
+    if metrics_writer is None:
+        return (series[0][-HISTORY_MAX_SAMPLES:], series[1][-HISTORY_MAX_SAMPLES:]), None
+    until = time.time() if until is None else until
+    since = until - metrics_writer.retention_seconds if since is None else since
+    rollup = metrics_writer.query_rollup(device_ip, metric, since, until, HISTORY_ROLLUP_POINTS)
+    return (rollup['timestamps'], rollup['mean']), rollup['resolution']
+
+
+@app.route('/api/miners/<device_ip>/history')
+def api_miner_history(device_ip):
+    """
+    API endpoint for the recent history of one miner metric.
+
+    Query parameters: metric (hashrate, temp, rssi, free_heap, shares_accepted,
+    shares_rejected), since and until (epoch seconds) and limit (newest samples).
+
+    Ranges holding more than HISTORY_MAX_SAMPLES samples are answered with
+    rollup bucket means instead of raw samples; `resolution` is then the
+    bucket width in seconds (null for raw samples).
+    """
+    metric = request.args.get('metric', 'hashrate')
+    try:
+        since = _float_arg('since')
+        until = _float_arg('until')
+        limit = request.args.get('limit', type=int)
+        series, resolution = _bounded_series(device_ip, metric, since, until, limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if series is None:
+        return jsonify({'error': f'No history for {device_ip}'}), 404
+
+    timestamps, values = series
+    return jsonify({'ip': device_ip, 'metric': metric, 'resolution': resolution,
+                    'timestamps': timestamps, 'values': values})
+
+
+@app.route('/api/miners/<device_ip>/series')
+def api_miner_series(device_ip):
+    """
+    API endpoint for one miner metric downsampled for charting.
+
+    Takes the metric, since and until parameters of /api/miners/<ip>/history
+    plus points (default 300); the series is reduced with LTTB, which keeps
+    the visual shape including peaks and dips. Long ranges are read from the
+    rollups, as for /history.
+    """
+    metric = request.args.get('metric', 'hashrate')
+    try:
+        since = _float_arg('since')
+        until = _float_arg('until')
+        points = request.args.get('points', 300, type=int)
+        series, _ = _bounded_series(device_ip, metric, since, until)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if series is None:
+        return jsonify({'error': f'No history for {device_ip}'}), 404
+
+    timestamps, values = lttb(series[0], series[1], points)
+    return jsonify({'ip': device_ip, 'metric': metric, 'samples': len(series[0]),
+                    'timestamps': timestamps, 'values': values})
+
+
+@app.route('/api/series')
+def api_series():
+    """
+    API endpoint for downsampled series of every miner at once (dashboard sparklines).
+
+    Query parameters: metric (default hashrate), points (default 60) and since
+    (epoch seconds, default: the whole in-memory history). Only the in-memory
+    history is read.
+    """
+    metric = request.args.get('metric', 'hashrate')
+    try:
+        since = _float_arg('since')
+        points = request.args.get('points', SPARKLINE_POINTS, type=int)
+        miners = {}
+        for ip in udp_thread.get_miner_map():
+            series = udp_thread.history.query(ip, metric, since)
+            if series is not None:
+                timestamps, values = lttb(series[0], series[1], points)
+                miners[ip] = {'timestamps': timestamps, 'values': values}
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'metric': metric, 'miners': miners})
+
+
+def _rollup_response(key, metric, **extra):
+    """
+    Answer a rollup query for one series from the since, until and points query parameters.
+
+    :param key: Miner IP address, or FLEET.
+    :param metric: Metric name.
+    :param extra: Additional fields of the JSON response.
+    :return: Flask response.
+    """
+    if metrics_writer is None:
+        return jsonify({'error': 'Metrics store is disabled'}), 503
+    try:
+        until = _float_arg('until')
+        until = time.time() if until is None else until
+        since = _float_arg('since')
+        since = until - 86400 if since is None else since
+        points = request.args.get('points', 300, type=int)
+        if points < 1:
+            raise ValueError('points must be at least 1')
+        series = metrics_writer.query_rollup(key, metric, since, until, points)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(dict(series, metric=metric, since=since, until=until, **extra))
+
+
+@app.route('/api/fleet/rollup')
+def api_fleet_rollup():
+    """
+    API endpoint for a fleet-wide metric over a time range, from pre-aggregated buckets.
+
+    Query parameters: metric (total_hashrate, online_count, mean_temp, max_temp,
+    shares_accepted, shares_rejected), since and until (epoch seconds, default:
+    the last 24 hours) and points (buckets wanted, default 300). The coarsest of
+    the 1m/5m/1h/1d resolutions that gives at least that many buckets is used,
+    so a 30 day chart reads 720 hourly buckets.
+    """
+    return _rollup_response(FLEET, request.args.get('metric', 'total_hashrate'))
+
+
+@app.route('/api/miners/<device_ip>/rollup')
+def api_miner_rollup(device_ip):
+    """
+    API endpoint for one miner metric over a time range, from pre-aggregated buckets.
+
+    Takes the same query parameters as /api/fleet/rollup, with the metrics of
+    /api/miners/<ip>/history.
+    """
+    return _rollup_response(device_ip, request.args.get('metric', 'hashrate'), ip=device_ip)
+
+
+def miner_to_json(record):
+    """
+    Serialize a miner record for the JSON APIs.
+
+    :param record: MinerRecord of the miner.
+    :return: Dictionary of the packet fields plus UpdateTime, state and change sequence number.
+    """
+    data = record.to_dict()
+    data['state'] = record.state
+    data['seq'] = record.seq
+    return data
+
+
+@app.route('/api/miners')
+def api_miners():
+    """
+    API endpoint for listing miners, page by page or as changes since a cursor.
+
+    Listing query parameters:
+      - sort: ip (default), hashrate, temp, rssi, free_heap, shares_accepted,
+        shares_rejected, uptime, last_seen or seq; prefix with - for descending.
+      - limit (default 100, max 1000) and cursor (`next` of the previous page).
+      - board, version, state (comma-separated), pool (substring),
+        min_temp, max_temp, min_hashrate and max_hashrate (H/s) filters.
+      - fields: comma-separated packet fields (e.g. BoardType, Version) and
+        parsed values (ip, state, seq, hashrate, temp, rssi, free_heap,
+        shares_accepted, shares_rejected, uptime) to return instead of everything.
+
+    With since, the `seq` high-water cursor (`<boot_id>:<n>`) of a previous
+    response, only the miners changed and the IPs removed after it are
+    returned (filters and fields apply to them). `full` is true when every
+    miner is returned because the changes since `since` are no longer known,
+    e.g. after a restart; clients should then replace their copy.
+    """
+    fields = [name for name in request.args.get('fields', '').split(',') if name]
+    serialize = (lambda record: project(record, fields)) if fields else miner_to_json
+    try:
+        predicate = build_filter(request.args)
+        if 'since' in request.args:
+            changes = udp_thread.changes_since(request.args.get('since'))
+            miners = [record for record in changes.miners if predicate is None or predicate(record)]
+            return jsonify({
+                'seq': changes.seq,
+                'full': changes.full,
+                'miners': [serialize(record) for record in miners],
+                'removed': changes.removed,
+            })
+
+        sort = request.args.get('sort', 'ip')
+        limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+        snapshot = udp_thread.get_snapshot()
+        cached, etag = not_modified(snapshot.version)
+        if cached:
+            return cached
+        page, cursor = miner_index.page(snapshot, sort.lstrip('-'), sort.startswith('-'),
+                                        request.args.get('cursor'), limit, predicate)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    response = jsonify({
+        'seq': udp_thread.change_cursor(snapshot.version),
+        'miners': [serialize(record) for record in page],
+        'next': cursor,
+    })
+    response.set_etag(etag)
+    return response
+
+
 @app.route('/api/devices')
 def api_devices():
     """
     API endpoint to get all devices.
     """
+    snapshot = udp_thread.get_snapshot()
+    cached, etag = not_modified(snapshot.version)
+    if cached:
+        return cached
+
     devices = []
-    for device in network_manager.get_devices():
-        device_dict = {
-            'ip': device.ip,
-            'device_id': device.device_id,
-            'board_type': device.board_type,
-            'hash_rate': device.hash_rate,
-            'temp': device.temp,
-            'rssi': device.rssi,
-            'version': device.version,
-            'uptime': device.uptime,
-            'is_online': device.is_online,
-            'update_time': device.update_time
-        }
-        devices.append(device_dict)
-    
-    return jsonify(devices)
+    for ip, record in sorted(snapshot.miners.items(), key=lambda item: ip_sort_key(item[0])):
+        devices.append({
+            'ip': ip,
+            'device_id': record.get('BoardType', ''),
+            'board_type': record.get('BoardType', ''),
+            'hash_rate': record.get('HashRate', '0'),
+            'temp': record.temp,
+            'rssi': record.rssi,
+            'version': record.get('Version', ''),
+            'uptime': record.get('Uptime', '0'),
+            'is_online': record.is_online,
+            'update_time': record.to_dict()['UpdateTime'],
+        })
+
+    response = jsonify(devices)
+    response.set_etag(etag)
+    return response
 
 
 def get_local_ip():
@@ -243,6 +998,84 @@ def get_local_ip():
     return ip
 
 
+def parse_args():
+    """
+    Parse command line options.
+
+    :return: Parsed argparse namespace.
+    """
+    parser = argparse.ArgumentParser(description="NMMiner centralized monitor server")
+    parser.add_argument('--ingest', choices=['thread', 'asyncio', 'multiprocess'], default='thread',
+                        help="UDP ingest engine: select() based thread, asyncio event loop or "
+                             "SO_REUSEPORT worker processes (default: thread)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Number of worker processes for --ingest multiprocess (default: CPU count)")
+    parser.add_argument('--stream-interval', type=float, default=1.0,
+                        help="Seconds over which miner changes are coalesced for the live dashboard (default: 1)")
+    parser.add_argument('--threads', type=int, default=16,
+                        help="Web server threads; every open dashboard holds one for its live stream (default: 16)")
+    parser.add_argument('--max-streams', type=int, default=None,
+                        help="Live dashboard streams served at once; further viewers get 503 and fall back to "
+                             "periodic reloads (default: --threads minus 4, at least 1)")
+    parser.add_argument('--history-samples', type=int, default=720,
+                        help="Samples kept in memory per miner (default: 720, one hour at 5 s intervals)")
+    parser.add_argument('--history-max-bytes', type=int, default=32 * 1024 * 1024,
+                        help="Memory budget of the in-memory history; larger fleets keep fewer samples "
+                             "per miner (default: 33554432, 32 MiB)")
+    parser.add_argument('--compress-history', action='store_true',
+                        help="Keep older in-memory samples in compressed chunks, to fit a longer history")
+    parser.add_argument('--compress-min-bytes', type=int, default=1024,
+                        help="Smallest JSON response compressed with gzip or brotli (default: 1024)")
+    parser.add_argument('--metrics-db', default='nmcontroller_metrics.db',
+                        help="SQLite file for persistent miner metrics (default: nmcontroller_metrics.db)")
+    parser.add_argument('--no-metrics-db', action='store_true',
+                        help="Do not persist miner metrics to disk")
+    parser.add_argument('--retention-days', type=float, default=7,
+                        help="Days of miner metrics kept on disk (default: 7)")
+    parser.add_argument('--page-cache-seconds', type=float, default=1.0,
+                        help="Seconds a rendered web monitor page is reused while the data is unchanged; "
+                             "0 disables the cache (default: 1)")
+    parser.add_argument('--rollout-window', type=int, default=64,
+                        help="Configurations sent to miners but not yet confirmed, at most (default: 64)")
+    parser.add_argument('--rollout-retries', type=int, default=3,
+                        help="Resends of an unconfirmed configuration before it counts as failed (default: 3)")
+    parser.add_argument('--rollout-ack-timeout', type=float, default=2.0,
+                        help="Seconds to wait for a miner to confirm a configuration before resending it; "
+                             "doubles with every resend (default: 2)")
+    parser.add_argument('--capture', metavar='PATH', default=None,
+                        help="Record every received datagram to a datagram log for replay; with "
+                             "--ingest multiprocess each worker writes PATH.<worker>")
+    parser.add_argument('--capture-dir', default='captures',
+                        help="Directory for captures started from /admin/capture (default: captures)")
+    parser.add_argument('--capture-max-mb', type=float, default=1024,
+                        help="Stop a capture after this many megabytes, 0 for no limit (default: 1024)")
+    return parser.parse_args()
+
+
+def create_udp_listener(args):
+    """
+    Create the UDP ingest engine selected on the command line.
+
+    :param args: Parsed command line options.
+    :return: Running UdpThread (or subclass) instance.
+    """
+    history = {'history_samples': args.history_samples, 'history_max_bytes': args.history_max_bytes,
+               'history_compressed': args.compress_history}
+    capture_max_bytes = int(args.capture_max_mb * 1024 * 1024)
+    if args.ingest == 'asyncio':
+        listener = AsyncUdpThread(name="NMMiner_Info", **history)
+    elif args.ingest == 'multiprocess' and hasattr(socket, 'SO_REUSEPORT'):
+        return MultiprocessUdpThread(name="NMMiner_Info", workers=args.workers, capture_path=args.capture,
+                                     capture_max_bytes=capture_max_bytes, **history)
+    else:
+        if args.ingest == 'multiprocess':
+            logging.error("SO_REUSEPORT is not available on this platform, falling back to the thread ingest engine")
+        listener = UdpThread(name="NMMiner_Info", **history)
+    if args.capture:
+        listener.start_capture(args.capture, capture_max_bytes)
+    return listener
+
+
 def logo_print():
     """Prints ASCII logo for the NMTech monitor."""
     print("""
@@ -261,6 +1094,8 @@ def logo_print():
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Needed for ingest worker processes in frozen builds
+    args = parse_args()
     local_ip = get_local_ip()
     port = 7877
 
@@ -274,7 +1109,29 @@ if __name__ == "__main__":
 
     # Start monitoring threads
     btcinfo_thread = BtcInfoThread(name="BTC_Info", update_seconds=1800)
-    udp_thread = UdpThread(name="NMMiner_Info")
+    udp_thread = create_udp_listener(args)
+    logging.info(f"UDP ingest engine: {args.ingest}")
+    page_cache.max_age = args.page_cache_seconds
+    compress_min_bytes = args.compress_min_bytes
+    capture_dir = args.capture_dir
+    capture_max_bytes = int(args.capture_max_mb * 1024 * 1024)
+
+    max_streams = args.max_streams if args.max_streams is not None else max(1, args.threads - 4)
+    if max_streams >= args.threads:
+        logging.warning(f"--max-streams {max_streams} leaves no web server threads for other requests")
+    stream_broadcaster = StreamBroadcaster(render_stream_delta, update_seconds=args.stream_interval,
+                                           max_subscribers=max_streams)
+    udp_thread.add_listener(stream_broadcaster.on_miner_event)
+
+    command_thread = CommandThread(name="Commands", window=args.rollout_window, retries=args.rollout_retries,
+                                   ack_timeout=args.rollout_ack_timeout)
+    udp_thread.add_config_listener(command_thread.on_config_packet)
+
+    if not args.no_metrics_db:
+        metrics_writer = MetricsWriterThread(args.metrics_db, retention_days=args.retention_days,
+                                             fleet_source=udp_thread.get_aggregates)
+        udp_thread.add_sample_listener(metrics_writer.enqueue)
+        logging.info(f"Persisting miner metrics to {args.metrics_db} ({args.retention_days} days retention)")
     
     # Network device manager disabled to avoid port conflict with UdpThread
     # network_manager.start_listening()
@@ -291,13 +1148,17 @@ if __name__ == "__main__":
 
     try:
         # Start the Flask server with Waitress
-        waitress.serve(app, host='0.0.0.0', port=port)
+        waitress.serve(app, host='0.0.0.0', port=port, threads=args.threads)
     except KeyboardInterrupt:
         logging.info("Shutting down server...")
 
     # Ensure proper shutdown of threads
     logging.info("Stopping threads...")
     udp_thread.stop()
+    stream_broadcaster.stop()
+    command_thread.stop()
+    if metrics_writer is not None:
+        metrics_writer.stop()
     btcinfo_thread.stop()
     network_manager.stop_listening()
 
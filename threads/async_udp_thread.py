@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import time
+
+from threads.udp_thread import UdpThread
+
+# Configure logging for better debugging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+
+class _IngestProtocol(asyncio.DatagramProtocol):
+    """Datagram protocol that hands every received packet straight to the owning thread."""
+
+    def __init__(self, owner, port):
+        self.owner = owner
+        self.port = port
+
+    def datagram_received(self, data, addr):
+        self.owner.packets_received[self.port] = self.owner.packets_received.get(self.port, 0) + 1
+        if self.owner.capture is not None:
+            self.owner.capture.write(self.port, data, addr)
+        self.owner.process_data(data, addr)
+        self.owner.schedule_publish()
+
+    def error_received(self, exc):
+        logging.error(f"{self.owner.get_thread_name()} Error receiving data on port {self.port}: {exc}")
+
+
+class AsyncUdpThread(UdpThread):
+    """
+    Event-driven variant of UdpThread.
+
+    Runs an asyncio event loop in its own thread and registers the status and
+    config sockets with it, so packets are merged into the miner map as soon as
+    they arrive and the thread sleeps in the selector while the network is idle.
+    """
+
+    def __init__(self, name="UdpThread", ip="0.0.0.0", port=12345, min_publish_interval=0.001, **kwargs):
+        """
+        Initializes the asyncio UDP listener thread.
+
+        :param name: Thread name.
+        :param ip: Address to bind the listening sockets to.
+        :param port: Status port; the config port is port + 1.
+        :param min_publish_interval: Minimum seconds between miner map snapshots under load.
+        """
+        if self._initialized:
+            return  # Prevent re-initialization if already initialized
+
+        self.loop = None
+        self._transports = []
+        self._publish_pending = False
+        self._last_publish = 0.0
+        self.min_publish_interval = min_publish_interval
+        kwargs["drain_all"] = True  # asyncio requires non-blocking sockets
+        super().__init__(name=name, ip=ip, port=port, **kwargs)
+
+    def run(self):
+        """Runs the asyncio event loop until the thread is stopped."""
+        # The thread is started by ManagedThread before the sockets are bound
+        while not self._initialized:
+            if self._stop_event.wait(0.01):
+                return
+
+        logging.info(f"{self.get_thread_name()} Starting asyncio UDP listener...")
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._batch_depth += 1  # Snapshots are published by schedule_publish() instead of per packet
+        try:
+            self.loop.run_until_complete(self._open_endpoints())
+            self.loop.call_soon(self._housekeeping_tick)
+            if not self.should_stop():
+                self.loop.run_forever()
+        finally:
+            self._batch_depth -= 1
+            for transport in self._transports:
+                transport.close()
+            self._transports = []
+            self.loop.run_until_complete(asyncio.sleep(0))  # Let transports finish closing
+            self.loop.close()
+
+    def schedule_publish(self):
+        """
+        Publishes a snapshot once the datagrams already read by the event loop are merged.
+
+        Callbacks queued on the loop run after the protocol callbacks of the
+        current iteration, and publications are spaced by min_publish_interval,
+        so a burst of packets results in a single copy of the miner map.
+        """
+        if not self._publish_pending:
+            self._publish_pending = True
+            delay = self._last_publish + self.min_publish_interval - time.monotonic()
+            if delay > 0:
+                self.loop.call_later(delay, self._flush_publish)
+            else:
+                self.loop.call_soon(self._flush_publish)
+
+    def _flush_publish(self):
+        self._publish_pending = False
+        self._last_publish = time.monotonic()
+        self.publish_snapshot()
+
+    def _housekeeping_tick(self):
+        """Runs periodic maintenance on the event loop thread."""
+        try:
+            self.housekeeping()
+        except Exception as e:
+            logging.exception(f"{self.get_thread_name()} Unexpected error in housekeeping: {e}")
+        self.loop.call_later(5.0, self._housekeeping_tick)
+
+    async def _open_endpoints(self):
+        """Registers the status and config sockets with the event loop."""
+        for sock in (self.status_sock, self.config_sock):
+            if sock is None or sock.fileno() == -1:
+                logging.error(f"{self.get_thread_name()} UDP sockets have been closed and unable to receive data.")
+                continue
+            port = sock.getsockname()[1]
+            transport, _ = await self.loop.create_datagram_endpoint(
+                lambda port=port: _IngestProtocol(self, port), sock=sock)
+            self._transports.append(transport)
+
+    def stop(self):
+        """Stops the event loop, then closes the sockets."""
+        self._stop_event.set()
+        if self.loop is not None and not self.loop.is_closed():
+            try:
+                self.loop.call_soon_threadsafe(self.loop.stop)
+            except RuntimeError:
+                pass  # Loop closed between the check and the call
+        super().stop()
+
+
+# Usage Example:
+if __name__ == "__main__":
+    async_thread = AsyncUdpThread(port=12345)
+    time.sleep(10)  # Let it run for a while
+    async_thread.stop()  # Stop the listener
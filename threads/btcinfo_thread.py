@@ -59,11 +59,12 @@ class BtcInfoThread(ManagedThread):
         :param name: Thread name.
         :param update_seconds: Interval for fetching data (default: 30 minutes).
         """
-        super().__init__(name=name, update_seconds=update_seconds)
         self.btc_price_source = ''
         self.btc_price = 0.0
         self.block_reward = 0.0
         self.block_reward_value = 0.00
+        self.fetch_stats = {}  # Source name -> request count, failures, total and last latency
+        super().__init__(name=name, update_seconds=update_seconds)
 
     def run(self):
         """Runs the Bitcoin info update loop."""
@@ -81,8 +82,14 @@ class BtcInfoThread(ManagedThread):
             self.btc_price_source, self.btc_price = self.get_btc_price()
 
             # Get the latest Bitcoin block height
-            block_height_response = requests.get(LATEST_BLOCK_HEIGHT_URL, timeout=10)
-            block_height_response.raise_for_status()
+            start = time.perf_counter()
+            try:
+                block_height_response = requests.get(LATEST_BLOCK_HEIGHT_URL, timeout=10)
+                block_height_response.raise_for_status()
+            except requests.RequestException:
+                self.record_fetch("blockchain.info", time.perf_counter() - start, failed=True)
+                raise
+            self.record_fetch("blockchain.info", time.perf_counter() - start)
             latest_block_height = int(block_height_response.text)
 
             # Calculate current block reward based on halvings
@@ -107,25 +114,48 @@ class BtcInfoThread(ManagedThread):
 
         logging.info(f"[BtcInfoThread] BTC Price: ${self.btc_price}, Block Reward: {self.block_reward} BTC, Reward Value: ${self.block_reward_value}")
 
-    @staticmethod
-    def get_btc_price():
+    def get_btc_price(self):
         """Fetch BTC price in USD from multiple free crypto APIs."""
 
         for source in BTC_PRICE_API_SOURCES:  # Try one of the free crypto APIs to get the Bitcoin price
+            start = time.perf_counter()
             try:
                 response = requests.get(source["url"], timeout=10)
                 response.raise_for_status()
                 data = response.json()
-                return source['name'], source["parser"](data)
+                price = source["parser"](data)
+                self.record_fetch(source["name"], time.perf_counter() - start)
+                return source['name'], price
             except (requests.RequestException, KeyError, IndexError, ValueError) as e:
+                self.record_fetch(source["name"], time.perf_counter() - start, failed=True)
                 logging.warning(f"[BtcInfoThread] {source['name']} API failed: {e}")
             except Exception as e:
                 # Catch anything else that falls through
+                self.record_fetch(source["name"], time.perf_counter() - start, failed=True)
                 logging.error(f"[BtcInfoThread] {source['name']} API failed: {e}")
 
         # Return 0.0 if all APIs fail
         return '', 0.0
 
+    def record_fetch(self, source, seconds, failed=False):
+        """
+        Records the latency of a request to a price or block height source.
+
+        :param source: Source name.
+        :param seconds: Time the request took, including failed requests.
+        :param failed: Whether the request or its response failed.
+        """
+        stats = self.fetch_stats.get(source)
+        if stats is None:
+            stats = {"count": 0, "failures": 0, "seconds_total": 0.0, "last_seconds": 0.0}
+        else:
+            stats = dict(stats)  # Replaced, not mutated, so readers never see a partial update
+        stats["count"] += 1
+        stats["failures"] += failed
+        stats["seconds_total"] += seconds
+        stats["last_seconds"] = seconds
+        self.fetch_stats = {**self.fetch_stats, source: stats}
+
     def sleep_for(self, seconds):
         """Utility method to sleep without blocking thread stopping."""
         for _ in range(seconds):
@@ -0,0 +1,558 @@
+import heapq
+import json
+import logging
+import select
+import socket
+import threading
+import time
+from collections import OrderedDict, deque
+
+from threads.managed_thread import ManagedThread
+from utils.packet_parser import decode_packet
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+# Rollout target states
+PENDING = 'pending'  # Not sent yet, waiting for a window slot
+SENT = 'sent'  # Sent, waiting for the matching config packet
+ACKED = 'acked'  # The miner reported the new values
+FAILED = 'failed'  # No matching config packet after every retry
+CANCELLED = 'cancelled'  # The job was cancelled before the target was sent
+SUPERSEDED = 'superseded'  # A newer job changes the same keys on this miner
+UNCONFIRMABLE = 'unconfirmable'  # Delivered, but the miner does not report the pushed keys
+
+# Keys whose change may move the miner to another network, so it cannot confirm them here
+WIFI_KEYS = frozenset(('WiFiSSID', 'WiFiPWD'))
+
+# Keys of periodic status packets; the ingest engine also hands these to
+# on_config_packet() because they carry Version and BoardType
+STATUS_KEYS = frozenset(('ip', 'BoardType', 'HashRate', 'Share', 'NetDiff', 'PoolDiff', 'LastDiff', 'BestDiff',
+                         'Valid', 'Progress', 'Temp', 'RSSI', 'FreeHeap', 'Uptime', 'Version', 'PoolInUse'))
+
+
+def _same_value(expected, reported):
+    """Compares a pushed value with a reported one, tolerating 8 vs "8" and True vs "true"."""
+    return expected == reported or str(expected).lower() == str(reported).lower()
+
+
+def config_matches(config, fields):
+    """
+    Checks whether a config packet confirms a pushed configuration.
+
+    :param config: Pushed configuration.
+    :param fields: Fields of a config packet sent by the miner.
+    :return: True when every pushed key the packet reports has the pushed value,
+             False when one has another value or the packet is a status packet
+             reporting none of them, None when a config packet reports none of
+             the pushed keys (e.g. a password-only change), so it cannot tell.
+    """
+    reported = False
+    for key, value in config.items():
+        if key == 'ip' or key not in fields:
+            continue
+        if not _same_value(value, fields[key]):
+            return False
+        reported = True
+    if reported:
+        return True
+    # Only a config packet shows that the miner does not report the keys
+    return None if any(key not in STATUS_KEYS for key in fields) else False
+
+
+class RolloutTarget:
+    """Delivery state of a configuration on one miner."""
+    __slots__ = ('ip', 'state', 'attempts', 'first_sent', 'deadline', 'acked_at')
+
+    def __init__(self, ip):
+        self.ip = ip
+        self.state = PENDING
+        self.attempts = 0
+        self.first_sent = None  # time.monotonic() of the first send
+        self.deadline = 0.0  # time.monotonic() after which the config is sent again
+        self.acked_at = None
+
+    def to_dict(self):
+        latency = self.acked_at - self.first_sent if self.acked_at is not None else None
+        return {'ip': self.ip, 'state': self.state, 'attempts': self.attempts,
+                'ack_seconds': round(latency, 3) if latency is not None else None}
+
+
+class RolloutJob:
+    """A configuration pushed to a set of miners, with per-miner progress."""
+
+    def __init__(self, job_id, config, targets):
+        """
+        :param job_id: Job number.
+        :param config: Configuration fields sent to every target.
+        :param targets: Miner IPs, in send order.
+        """
+        self.id = job_id
+        self.config = config
+        self.payload = json.dumps(config).encode('utf-8')
+        self.keys = frozenset(config) - {'ip'}
+        self.resend = not self.keys & WIFI_KEYS  # A miner that changed networks cannot confirm, do not repeat it
+        self.created = time.time()
+        self.finished = None  # Epoch time when no target was pending or in flight any more
+        self.cancelled = False
+        self.targets = OrderedDict((ip, RolloutTarget(ip)) for ip in targets)
+        self.pending = deque(self.targets.values())
+        self.counts = {PENDING: len(self.targets), SENT: 0, ACKED: 0, FAILED: 0, CANCELLED: 0,
+                       SUPERSEDED: 0, UNCONFIRMABLE: 0}
+
+    def set_state(self, target, state):
+        """Moves a target to another state, keeping the counts current."""
+        self.counts[target.state] -= 1
+        self.counts[state] += 1
+        target.state = state
+        if not self.counts[PENDING] and not self.counts[SENT] and self.finished is None:
+            self.finished = time.time()
+
+    @property
+    def state(self):
+        if self.finished is None:
+            return 'running'
+        return 'cancelled' if self.cancelled else 'done'
+
+    def to_dict(self, details=False, target_state=None):
+        """
+        Returns the job progress.
+
+        :param details: Include the state of every target.
+        :param target_state: Only list the targets in this state.
+        :return: Dictionary for the job endpoint. Config values are not echoed, they may hold passwords.
+        """
+        data = {
+            'id': self.id,
+            'state': self.state,
+            'created': self.created,
+            'finished': self.finished,
+            'keys': sorted(self.config),
+            'total': len(self.targets),
+            'counts': dict(self.counts),
+        }
+        if details:
+            data['targets'] = [target.to_dict() for target in self.targets.values()
+                               if target_state is None or target.state == target_state]
+        return data
+
+
+class ConfigSweep:
+    """A group of get_config requests answered through the shared command socket."""
+
+    def __init__(self, ips):
+        """
+        :param ips: Miner IPs queried.
+        """
+        self.configs = dict.fromkeys(ips)  # IP -> reply, None until answered
+        self.remaining = len(self.configs)
+        self.answered = 0
+        self.timed_out = 0
+        self.started = time.monotonic()
+        self.finished = None  # time.monotonic() when every request was answered or timed out
+        self._done = threading.Event()
+        if not self.remaining:
+            self._complete()
+
+    def _complete(self):
+        self.finished = time.monotonic()
+        self._done.set()
+
+    def wait(self, timeout=None):
+        """
+        Waits until every request was answered or timed out.
+
+        :param timeout: Maximum seconds to wait.
+        :return: True when the sweep is complete.
+        """
+        return self._done.wait(timeout)
+
+    @property
+    def seconds(self):
+        return (self.finished or time.monotonic()) - self.started
+
+
+class CommandThread(ManagedThread):
+    """
+    Sends commands to miners on their command port from one shared UDP socket.
+
+    Configuration rollouts are queued as jobs. The thread keeps at most `window`
+    configurations in flight, resends a configuration with exponential backoff
+    until the miner confirms it with a matching config packet (delivered by
+    the ingest engine through on_config_packet()), and gives up after `retries`
+    resends. A newer job that changes the same keys on a miner supersedes the
+    older one there, so an older value is never resent over a newer one.
+    Configurations the miner cannot confirm (keys it does not report, or a
+    Wi-Fi change) end as unconfirmable instead of being resent.
+
+    get_config requests are multiplexed over the same socket: each carries a
+    request id, and replies are matched by source address and the echoed id,
+    or to the oldest outstanding request of that address when the firmware
+    does not echo it. Any number of requests can be outstanding, each with its
+    own timeout.
+    """
+
+    def __init__(self, name="CommandThread", command_port=12347, window=64, retries=3, ack_timeout=2.0,
+                 backoff=2.0, max_jobs=100, update_seconds=0.02, rcvbuf_size=4 * 1024 * 1024):
+        """
+        Initializes the command socket and the rollout scheduler.
+
+        :param name: Thread name.
+        :param command_port: Port the miners listen on for commands.
+        :param window: Maximum configurations sent but not yet confirmed, over all jobs.
+        :param retries: Resends before a target counts as failed.
+        :param ack_timeout: Seconds to wait for the confirmation of the first send.
+        :param backoff: Factor by which the wait grows with every resend.
+        :param max_jobs: Finished jobs kept for the job endpoint.
+        :param update_seconds: Maximum seconds between checks for expired sends and requests.
+        :param rcvbuf_size: Requested kernel receive buffer size (SO_RCVBUF) of the command socket.
+        """
+        self.command_port = command_port
+        self.window = max(1, int(window))
+        self.retries = max(0, int(retries))
+        self.ack_timeout = ack_timeout
+        self.backoff = backoff
+        self.max_jobs = max_jobs
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf_size)  # Sweeps answer in bursts
+        self.sock.setblocking(False)
+        self.sock.bind(('0.0.0.0', 0))
+        self._wake_reader, self._wake_writer = socket.socketpair()  # Interrupts select() when work is queued
+        self._wake_reader.setblocking(False)
+        self._wake_writer.setblocking(False)
+        self._queries = {}  # Request id -> (ConfigSweep, IP) of outstanding get_config requests
+        self._queries_by_ip = {}  # IP -> deque of outstanding request ids, oldest first
+        self._query_deadlines = []  # Heap of (deadline, request id)
+        self._next_query_id = 1
+        self.replies_received = 0
+        self.unmatched_replies = 0
+        self.jobs = OrderedDict()  # Job id -> RolloutJob, oldest first
+        self._next_job_id = 1
+        self._in_flight = {}  # IP -> list of (job, target) waiting for a config packet
+        self.in_flight = 0
+        self.datagrams_sent = 0
+        self.send_errors = 0
+        self._lock = threading.Lock()
+        super().__init__(name=name, update_seconds=update_seconds)
+
+    def submit(self, config, targets):
+        """
+        Queues a configuration rollout.
+
+        :param config: Configuration fields to send.
+        :param targets: Miner IPs.
+        :return: The RolloutJob.
+        """
+        with self._lock:
+            job = RolloutJob(self._next_job_id, config, targets)
+            self._next_job_id += 1
+            self._supersede(job)
+            self.jobs[job.id] = job
+            self._prune_jobs()
+        self._wake()
+        logging.info(f"{self.get_thread_name()} Rollout {job.id} of {', '.join(sorted(config))} "
+                     f"to {len(job.targets)} miners queued")
+        return job
+
+    def _supersede(self, job):
+        """
+        Retires the targets of older running jobs that push any of the same keys to the same miners.
+        Called with the lock held.
+
+        :param job: The new RolloutJob.
+        """
+        for older in self.jobs.values():
+            if older.finished is not None or not older.keys & job.keys:
+                continue
+            for ip in job.targets:
+                target = older.targets.get(ip)
+                if target is None or target.state not in (PENDING, SENT):
+                    continue
+                if target.state == SENT:
+                    self._in_flight[ip].remove((older, target))
+                    if not self._in_flight[ip]:
+                        del self._in_flight[ip]
+                    self.in_flight -= 1
+                # Pending targets stay in the queue and are skipped by _schedule()
+                older.set_state(target, SUPERSEDED)
+
+    def cancel(self, job_id):
+        """
+        Cancels the targets of a job that were not sent yet; sent ones still complete.
+
+        :param job_id: Job number.
+        :return: The RolloutJob, or None when it is unknown.
+        """
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            job.cancelled = True
+            while job.pending:
+                target = job.pending.popleft()
+                if target.state == PENDING:
+                    job.set_state(target, CANCELLED)
+        return job
+
+    def get_job(self, job_id):
+        """Returns a RolloutJob by number, or None."""
+        return self.jobs.get(job_id)
+
+    def list_jobs(self):
+        """Returns the jobs, newest first."""
+        with self._lock:
+            return list(reversed(self.jobs.values()))
+
+    def on_config_packet(self, ip, fields):
+        """
+        Confirms in-flight configurations of a miner. Called by the ingest engine
+        for every packet that carries config fields.
+
+        :param ip: Miner IP.
+        :param fields: Fields of the packet.
+        """
+        if ip not in self._in_flight:
+            return
+        now = time.monotonic()
+        with self._lock:
+            waiting = self._in_flight.get(ip)
+            if not waiting:
+                return
+            remaining = []
+            for job, target in waiting:
+                matches = config_matches(job.config, fields)
+                if matches is False:
+                    # Not applied yet, the packet predates the send, or it is a status packet
+                    remaining.append((job, target))
+                    continue
+                if matches:
+                    target.acked_at = now
+                job.set_state(target, ACKED if matches else UNCONFIRMABLE)
+                self.in_flight -= 1
+            if len(remaining) == len(waiting):
+                return
+            if remaining:
+                self._in_flight[ip] = remaining
+            else:
+                del self._in_flight[ip]
+        self._wake()  # Window slots are free
+
+    def request_configs(self, ips, timeout=2.0):
+        """
+        Sends get_config to miners without waiting for the replies.
+
+        :param ips: Miner IPs.
+        :param timeout: Seconds after which an unanswered request is given up.
+        :return: ConfigSweep collecting the replies; call wait() on it.
+        """
+        sweep = ConfigSweep(ips)
+        if not sweep.configs:
+            return sweep
+        deadline = time.monotonic() + timeout
+        sends = []
+        with self._lock:
+            for ip in sweep.configs:
+                query_id = self._next_query_id
+                self._next_query_id += 1
+                self._queries[query_id] = (sweep, ip)
+                self._queries_by_ip.setdefault(ip, deque()).append(query_id)
+                heapq.heappush(self._query_deadlines, (deadline, query_id))
+                sends.append((json.dumps({'command': 'get_config', 'id': query_id}).encode('utf-8'), ip))
+        self._send(sends)  # Sending from the caller's thread keeps the command thread free for replies
+        self._wake()  # The earliest deadline may have changed
+        return sweep
+
+    def request_config(self, ip, timeout=2.0):
+        """
+        Reads the configuration of one miner.
+
+        :param ip: Miner IP.
+        :param timeout: Seconds to wait for the reply.
+        :return: The configuration, or None when the miner did not answer in time.
+        """
+        sweep = self.request_configs([ip], timeout)
+        sweep.wait(timeout + 1)
+        return sweep.configs[ip]
+
+    def run(self):
+        """Sends queued configurations, resends unconfirmed ones and receives replies until stopped."""
+        while not self.should_stop():
+            try:
+                now = time.monotonic()
+                self._send(self._schedule(now))
+                self._expire_queries(now)
+                timeout = self.update_seconds
+                if self._query_deadlines:
+                    timeout = max(0.0, min(timeout, self._query_deadlines[0][0] - now))
+                readable, _, _ = select.select([self.sock, self._wake_reader], [], [], timeout)
+                if self._wake_reader in readable:
+                    self._drain_wakeups()
+                if self.sock in readable:
+                    self._receive_replies()
+            except Exception as e:
+                if self.should_stop():
+                    break  # Sockets closed by stop()
+                logging.exception(f"{self.get_thread_name()} Unexpected error in run loop: {e}")
+
+    def _wake(self):
+        """Interrupts the select() of the run loop."""
+        try:
+            self._wake_writer.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass  # Already pending, or closed
+
+    def _drain_wakeups(self):
+        try:
+            while self._wake_reader.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+    def _receive_replies(self):
+        """Reads every queued reply from the command socket."""
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(4096)
+            except (BlockingIOError, InterruptedError):
+                return
+            try:
+                reply = decode_packet(data)
+            except ValueError as e:  # Includes JSONDecodeError and TruncatedPacketError
+                logging.warning(f"{self.get_thread_name()} Dropped malformed reply from {addr[0]}: {e}")
+                continue
+            if not isinstance(reply, dict):
+                continue
+            self.replies_received += 1
+            self._answer(addr[0], reply)
+
+    def _answer(self, ip, reply):
+        """
+        Completes the get_config request a reply belongs to.
+
+        :param ip: Source address of the reply.
+        :param reply: Decoded reply; an echoed request id is removed from it.
+        """
+        query_id = reply.pop('id', None)
+        with self._lock:
+            waiting = self._queries_by_ip.get(ip)
+            if not waiting:
+                self.unmatched_replies += 1
+                return
+            if query_id not in self._queries or self._queries[query_id][1] != ip:
+                query_id = waiting[0]  # Firmware without request ids: answer the oldest request
+            waiting.remove(query_id)
+            if not waiting:
+                del self._queries_by_ip[ip]
+            sweep, _ = self._queries.pop(query_id)
+            sweep.configs[ip] = reply
+            sweep.answered += 1
+            sweep.remaining -= 1
+            if not sweep.remaining:
+                sweep._complete()
+
+    def _expire_queries(self, now):
+        """Gives up get_config requests whose deadline passed."""
+        if not self._query_deadlines or self._query_deadlines[0][0] > now:
+            return
+        with self._lock:
+            while self._query_deadlines and self._query_deadlines[0][0] <= now:
+                _, query_id = heapq.heappop(self._query_deadlines)
+                query = self._queries.pop(query_id, None)
+                if query is None:
+                    continue  # Already answered
+                sweep, ip = query
+                waiting = self._queries_by_ip[ip]
+                waiting.remove(query_id)
+                if not waiting:
+                    del self._queries_by_ip[ip]
+                sweep.timed_out += 1
+                sweep.remaining -= 1
+                if not sweep.remaining:
+                    sweep._complete()
+
+    def _schedule(self, now):
+        """
+        Expires and refills the window.
+
+        :param now: Current time.monotonic().
+        :return: List of (payload, ip) to send.
+        """
+        sends = []
+        with self._lock:
+            for ip, waiting in list(self._in_flight.items()):
+                remaining = []
+                for job, target in waiting:
+                    if now < target.deadline:
+                        remaining.append((job, target))
+                    elif not job.resend:
+                        job.set_state(target, UNCONFIRMABLE)
+                        self.in_flight -= 1
+                    elif target.attempts <= self.retries:
+                        self._mark_sent(target, now)
+                        sends.append((job.payload, ip))
+                        remaining.append((job, target))
+                    else:
+                        job.set_state(target, FAILED)
+                        self.in_flight -= 1
+                        logging.warning(f"{self.get_thread_name()} Rollout {job.id}: {ip} did not confirm "
+                                        f"after {target.attempts} sends")
+                if remaining:
+                    self._in_flight[ip] = remaining
+                else:
+                    del self._in_flight[ip]
+
+            for job in self.jobs.values():
+                while job.pending and self.in_flight < self.window:
+                    target = job.pending.popleft()
+                    if target.state != PENDING:
+                        continue  # Superseded while queued
+                    job.set_state(target, SENT)
+                    target.first_sent = now
+                    self._mark_sent(target, now)
+                    self._in_flight.setdefault(target.ip, []).append((job, target))
+                    self.in_flight += 1
+                    sends.append((job.payload, target.ip))
+                if self.in_flight >= self.window:
+                    break
+        return sends
+
+    def _mark_sent(self, target, now):
+        """Counts a send and sets the deadline of its confirmation."""
+        target.deadline = now + self.ack_timeout * self.backoff ** target.attempts
+        target.attempts += 1
+
+    def _send(self, sends):
+        """Sends datagrams to the miners' command port."""
+        for payload, ip in sends:
+            try:
+                self.sock.sendto(payload, (ip, self.command_port))
+                self.datagrams_sent += 1
+            except OSError as e:
+                # A failed send is treated like a lost datagram and retried on expiry
+                self.send_errors += 1
+                logging.debug(f"{self.get_thread_name()} Error sending to {ip}: {e}")
+
+    def _prune_jobs(self):
+        """Forgets the oldest finished jobs beyond max_jobs."""
+        excess = len(self.jobs) - self.max_jobs
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished is not None][:max(0, excess)]:
+            del self.jobs[job_id]
+
+    def get_stats(self):
+        """
+        Returns the command channel counters.
+
+        :return: Dictionary of counters.
+        """
+        return {'in_flight': self.in_flight, 'window': self.window, 'datagrams_sent': self.datagrams_sent,
+                'send_errors': self.send_errors, 'jobs': len(self.jobs), 'queries_outstanding': len(self._queries),
+                'replies_received': self.replies_received, 'unmatched_replies': self.unmatched_replies}
+
+    def stop(self):
+        """Stops the thread and closes the command socket."""
+        self._stop_event.set()
+        self._wake()
+        super().stop()
+        self.sock.close()
+        self._wake_reader.close()
+        self._wake_writer.close()
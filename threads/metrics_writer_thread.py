@@ -0,0 +1,147 @@
+import logging
+import time
+from collections import deque
+
+from threads.managed_thread import ManagedThread
+from utils.metric_rollups import FLEET, FLEET_METRICS, RollupAggregator, choose_resolution
+from utils.metrics_store import MetricsStore
+from utils.miner_history import METRICS
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+
+class MetricsWriterThread(ManagedThread):
+    """
+    A thread that persists miner samples to the metrics store in batches.
+
+    The ingest thread only appends to an in-memory queue (enqueue() never
+    blocks on disk); this thread flushes the queue every update_seconds, feeds
+    the samples and a fleet-wide sample into the rollups, and periodically
+    deletes samples older than the retention period.
+    """
+
+    def __init__(self, path, name="MetricsWriter", update_seconds=0.5, retention_days=7,
+                 compact_seconds=3600, max_pending=200000, fleet_source=None):
+        """
+        Initialize the metrics writer thread.
+
+        :param path: SQLite database file path.
+        :param name: Thread name.
+        :param update_seconds: Interval between batched writes.
+        :param retention_days: Age after which samples are deleted.
+        :param compact_seconds: Interval between retention compactions.
+        :param max_pending: Maximum queued samples; the oldest are dropped beyond this.
+        :param fleet_source: Callable returning the fleet aggregates dict, sampled on every flush.
+        """
+        self.store = MetricsStore(path)
+        self.rollups = RollupAggregator()
+        self.fleet_source = fleet_source
+        self.retention_seconds = retention_days * 86400
+        self.compact_seconds = compact_seconds
+        self.last_compact = time.monotonic()
+        self.pending = deque(maxlen=max_pending)
+        self.samples_written = 0
+        super().__init__(name=name, update_seconds=update_seconds)
+
+    def enqueue(self, record, timestamp):
+        """
+        Queue a sample for writing. Called from the ingest thread.
+
+        :param record: Updated MinerRecord.
+        :param timestamp: Sample time (epoch seconds).
+        """
+        self.pending.append((record.ip, timestamp, tuple(getattr(record, metric) or 0.0 for metric in METRICS)))
+
+    def run(self):
+        """Runs the batched write loop."""
+        while not self.should_stop():
+            if self.needs_update():
+                self.flush()
+                if time.monotonic() - self.last_compact >= self.compact_seconds:
+                    self.last_compact = time.monotonic()
+                    self.compact()
+            else:
+                self._stop_event.wait(0.05)
+        self.flush()  # Write whatever is left before exiting
+        self._write_rollups(self.rollups.close_all())
+
+    def flush(self):
+        """Writes all queued samples in one transaction and updates the rollups."""
+        batch = []
+        try:
+            while True:
+                batch.append(self.pending.popleft())
+        except IndexError:
+            pass
+
+        closed = []
+        for ip, timestamp, values in batch:
+            closed += self.rollups.add(ip, timestamp, values)
+        now = time.time()
+        if self.fleet_source is not None:
+            aggregates = self.fleet_source()
+            closed += self.rollups.add(FLEET, now, tuple(float(aggregates[metric]) for metric in FLEET_METRICS))
+        closed += self.rollups.sweep(now)
+
+        if batch:
+            try:
+                self.samples_written += self.store.write_samples(batch)
+            except Exception as e:
+                logging.error(f"[{self.get_thread_name()}] Failed to write {len(batch)} samples: {e}", exc_info=True)
+        self._write_rollups(closed)
+
+    def _write_rollups(self, closed):
+        if not closed:
+            return
+        try:
+            self.store.write_rollups(closed)
+        except Exception as e:
+            logging.error(f"[{self.get_thread_name()}] Failed to write {len(closed)} rollup buckets: {e}",
+                          exc_info=True)
+
+    def query_rollup(self, key, metric, since, until, points):
+        """
+        Returns a metric over a time range at the coarsest resolution that gives the wanted point count.
+
+        Buckets still open in memory are merged with the persisted ones, so the
+        newest bucket is up to date.
+
+        :param key: Miner IP address, or FLEET.
+        :param metric: Metric name (METRICS for miners, FLEET_METRICS for the fleet).
+        :param since: Range start (epoch seconds).
+        :param until: Range end (epoch seconds).
+        :param points: Number of buckets wanted (see choose_resolution).
+        :return: Dictionary with the resolution and per-bucket timestamps, min, max, mean and last lists.
+        :raises ValueError: If the metric is unknown.
+        """
+        resolution = choose_resolution(since, until, points, time.time(), self.rollups.resolutions)
+        first = since - since % resolution
+        rows = self.store.query_rollups(key, metric, resolution, first, until)
+
+        current = self.rollups.open_bucket(key, resolution)
+        if current is not None and first <= current.start <= until:
+            index = (FLEET_METRICS if key is FLEET else METRICS).index(metric)
+            row = (current.start, current.count, current.mins[index], current.maxs[index],
+                   current.sums[index], current.lasts[index])
+            if rows and rows[-1][0] == current.start:
+                # A partial bucket was persisted at the last shutdown
+                start, count, low, high, total, _ = rows.pop()
+                row = (start, count + row[1], min(low, row[2]), max(high, row[3]), total + row[4], row[5])
+            rows.append(row)
+
+        return {
+            'resolution': resolution,
+            'timestamps': [row[0] for row in rows],
+            'min': [row[2] for row in rows],
+            'max': [row[3] for row in rows],
+            'mean': [row[4] / row[1] for row in rows],
+            'last': [row[5] for row in rows],
+        }
+
+    def compact(self):
+        """Deletes samples older than the retention period."""
+        try:
+            self.store.compact(self.retention_seconds)
+        except Exception as e:
+            logging.error(f"[{self.get_thread_name()}] Compaction failed: {e}", exc_info=True)
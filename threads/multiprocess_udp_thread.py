@@ -0,0 +1,266 @@
+import json
+import logging
+import multiprocessing
+import os
+import select
+import socket
+import time
+from multiprocessing.connection import wait
+
+from threads.udp_thread import UdpThread, read_udp_drops
+from utils.datagram_log import DatagramLogWriter
+from utils.packet_parser import PacketReceiver, TruncatedPacketError, decode_packet
+
+# Configure logging for better debugging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+
+def _ingest_worker(worker_id, ip, port, conn, stop_event, rcvbuf_size, batch_size, flush_seconds,
+                   capture_path=None, capture_max_bytes=0):
+    """
+    Worker process entry point.
+
+    Binds the status and config ports with SO_REUSEPORT so the kernel spreads
+    incoming datagrams across all workers, decodes each packet and forwards the
+    results to the parent in batches over a pipe.
+
+    :param worker_id: Index of the worker, used in log messages.
+    :param ip: Address to bind to.
+    :param port: Status port; the config port is port + 1.
+    :param conn: Write end of the pipe to the parent process.
+    :param stop_event: Event set by the parent to request shutdown.
+    :param rcvbuf_size: Requested SO_RCVBUF size in bytes.
+    :param batch_size: Maximum updates per message sent to the parent.
+    :param flush_seconds: Maximum time an update waits before being forwarded.
+    :param capture_path: Datagram log prefix; the worker records to "<capture_path>.<worker_id>".
+    :param capture_max_bytes: Size limit of the worker's datagram log (0: no limit).
+    """
+    name = f"IngestWorker-{worker_id}"
+    socks = []
+    try:
+        for bind_port in (port, port + 1):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            if rcvbuf_size:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf_size)
+            sock.setblocking(False)
+            sock.bind((ip, bind_port))
+            socks.append(sock)
+    except OSError as e:
+        conn.send(("error", f"{name} Error binding sockets. Error: {e}"))
+        for sock in socks:
+            sock.close()
+        conn.close()
+        return
+
+    ports = {sock: sock.getsockname()[1] for sock in socks}
+    conn.send(("hello", {os.fstat(sock.fileno()).st_ino: ports[sock] for sock in socks}))
+
+    receiver = PacketReceiver()
+    capture = DatagramLogWriter(f"{capture_path}.{worker_id}", capture_max_bytes) if capture_path else None
+    last_capture_flush = time.monotonic()
+    updates = []
+    counts = {bind_port: 0 for bind_port in ports.values()}
+    errors = 0
+    truncated = 0
+    last_flush = time.monotonic()
+    try:
+        while not stop_event.is_set():
+            ready, _, _ = select.select(socks, [], [], flush_seconds)
+            for sock in ready:
+                while len(updates) < batch_size:
+                    try:
+                        data, addr = receiver.receive(sock)
+                    except (BlockingIOError, InterruptedError):
+                        break
+                    counts[ports[sock]] += 1
+                    if capture is not None:
+                        capture.write(ports[sock], data, addr)
+                    try:
+                        json_data = decode_packet(data)
+                    except TruncatedPacketError as e:
+                        truncated += 1
+                        logging.warning(f"{name} Dropped truncated packet from {addr[0]}: {e}")
+                        continue
+                    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                        errors += 1
+                        logging.warning(f"{name} Dropped malformed packet from {addr[0]}: {e}")
+                        continue
+                    updates.append((addr[0], json_data))
+
+            now = time.monotonic()
+            # Counters of dropped packets are sent too, even when nothing decoded in the meantime
+            pending = updates or errors or truncated or any(counts.values())
+            if len(updates) >= batch_size or (pending and now - last_flush >= flush_seconds):
+                conn.send(("batch", counts, errors, truncated, updates))
+                updates = []
+                counts = dict.fromkeys(counts, 0)
+                errors = 0
+                truncated = 0
+                last_flush = now
+            elif not pending:
+                last_flush = now
+            if capture is not None and now - last_capture_flush >= 1:
+                capture.flush()
+                last_capture_flush = now
+    except (BrokenPipeError, EOFError):
+        pass  # Parent went away
+    finally:
+        if capture is not None:
+            capture.close()
+        for sock in socks:
+            sock.close()
+        conn.close()
+
+
+class MultiprocessUdpThread(UdpThread):
+    """
+    Multi-core variant of UdpThread.
+
+    Spawns worker processes that all bind the status and config ports with
+    SO_REUSEPORT. Each worker decodes its share of the datagrams and sends the
+    parsed packets to this thread, which only merges them into the miner map.
+    Requires SO_REUSEPORT load balancing (Linux 3.9+).
+    """
+    binds_sockets = False  # The worker processes own the sockets
+
+    def __init__(self, name="UdpThread", ip="0.0.0.0", port=12345, workers=None,
+                 batch_size=64, flush_seconds=0.02, capture_path=None, capture_max_bytes=0, **kwargs):
+        """
+        Initializes the worker processes and the merging thread.
+
+        :param name: Thread name.
+        :param ip: Address the workers bind to.
+        :param port: Status port; the config port is port + 1.
+        :param workers: Number of worker processes (default: CPU count).
+        :param batch_size: Maximum updates per message from a worker.
+        :param flush_seconds: Maximum time a worker holds an update before forwarding it.
+        :param capture_path: Record every datagram; each worker writes "<capture_path>.<worker_id>".
+        :param capture_max_bytes: Size limit of each worker's datagram log (0: no limit).
+        """
+        if self._initialized:
+            return  # Prevent re-initialization if already initialized
+        if not hasattr(socket, "SO_REUSEPORT"):
+            raise RuntimeError("SO_REUSEPORT is not supported on this platform")
+
+        self.worker_count = max(1, workers or os.cpu_count() or 1)
+        self._connections = []
+        self._worker_inodes = {}
+        self._processes = []
+        self.capture_paths = [f"{capture_path}.{worker_id}" for worker_id in range(self.worker_count)] \
+            if capture_path else []
+
+        context = multiprocessing.get_context("spawn")
+        self._worker_stop = context.Event()
+        rcvbuf_size = kwargs.get("rcvbuf_size", 4 * 1024 * 1024)
+        for worker_id in range(self.worker_count):
+            reader, writer = context.Pipe(duplex=False)
+            process = context.Process(
+                target=_ingest_worker, name=f"IngestWorker-{worker_id}", daemon=True,
+                args=(worker_id, ip, port, writer, self._worker_stop, rcvbuf_size, batch_size, flush_seconds,
+                      capture_path, capture_max_bytes))
+            process.start()
+            writer.close()  # Only the worker writes
+            self._connections.append(reader)
+            self._processes.append(process)
+
+        super().__init__(name=name, ip=ip, port=port, **kwargs)
+        logging.info(f"{self.get_thread_name()} Started {self.worker_count} ingest workers on ports {port}/{port + 1}")
+
+    def run(self):
+        """Receives decoded packets from the workers and merges them into the miner map."""
+        while not self._initialized:
+            if self._stop_event.wait(0.01):
+                return
+
+        logging.info(f"{self.get_thread_name()} Starting multiprocess UDP listener...")
+        while not self.should_stop() and self._connections:
+            for conn in wait(self._connections, timeout=0.1):
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    if not self._worker_stop.is_set():
+                        logging.error(f"{self.get_thread_name()} Ingest worker exited unexpectedly")
+                    self._connections.remove(conn)
+                    continue
+                with self.batch_updates():
+                    self._handle_message(message)
+            self.housekeeping()
+
+    def _handle_message(self, message):
+        """
+        Applies one message received from a worker.
+
+        :param message: Tuple whose first element is the message kind.
+        """
+        kind = message[0]
+        if kind == "batch":
+            _, counts, errors, truncated, updates = message
+            for port, count in counts.items():
+                self.packets_received[port] = self.packets_received.get(port, 0) + count
+            self.parse_errors += errors
+            self.truncated_packets += truncated
+            for sender_ip, json_data in updates:
+                start = time.perf_counter_ns()  # Packets are decoded by the workers, only the merge is timed here
+                try:
+                    self.merge_packet(json_data, sender_ip)
+                except Exception as e:
+                    logging.exception(f"{self.get_thread_name()} Unexpected error merging packet from {sender_ip}: {e}")
+                finally:
+                    self._process_latency.record(time.perf_counter_ns() - start)
+        elif kind == "hello":
+            self._worker_inodes.update(message[1])
+        elif kind == "error":
+            logging.error(message[1])
+
+    def start_capture(self, path, max_bytes=0):
+        """
+        The worker processes receive the datagrams, so capture can only be enabled at
+        start-up through the capture_path argument.
+
+        :raises RuntimeError: Always.
+        """
+        raise RuntimeError("The multiprocess ingest engine can only capture when started with a capture path")
+
+    def stop_capture(self):
+        """Worker captures end when the workers stop; nothing to do here."""
+        return None
+
+    def get_capture_stats(self):
+        """
+        Returns the logs the workers record to.
+
+        :return: Dictionary with `capturing` and the worker log paths.
+        """
+        return {"capturing": bool(self.capture_paths), "paths": self.capture_paths}
+
+    def get_kernel_drops(self):
+        """
+        Returns the number of datagrams the kernel dropped on each port, summed over all workers.
+
+        :return: Dictionary mapping port to dropped datagram count.
+        """
+        totals = {}
+        for inode, count in read_udp_drops(self._worker_inodes).items():
+            port = self._worker_inodes[inode]
+            totals[port] = totals.get(port, 0) + count
+        return totals
+
+    def stop(self):
+        """Stops the worker processes and the merging thread."""
+        self._worker_stop.set()
+        for process in self._processes:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+        super().stop()
+        for conn in self._connections:
+            conn.close()
+        self._connections = []
+
+
+# Usage Example:
+if __name__ == "__main__":
+    multiprocess_thread = MultiprocessUdpThread(port=12345, workers=2)
+    time.sleep(10)  # Let it run for a while
+    multiprocess_thread.stop()  # Stop the listener
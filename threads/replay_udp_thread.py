@@ -0,0 +1,104 @@
+import logging
+import threading
+import time
+
+from threads.udp_thread import UdpThread
+
+# Configure logging for better debugging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+
+class ReplayUdpThread(UdpThread):
+    """
+    Variant of UdpThread that feeds captured datagrams through process_data()
+    instead of receiving from the network.
+
+    The datagrams come from utils.datagram_log (see UdpThread.start_capture),
+    so production traffic, including its malformed and truncated packets, can be
+    replayed deterministically: in real time, accelerated, or as fast as possible
+    to measure the ingest path alone. Miner timestamps are taken at replay time,
+    so accelerated replays compress the expiry timeline accordingly.
+    """
+    binds_sockets = False  # Datagrams come from the log
+
+    def __init__(self, datagrams, name="ReplayUdpThread", speed=0.0, batch_size=256, **kwargs):
+        """
+        Initializes the replay thread.
+
+        :param datagrams: Iterable of utils.datagram_log.Datagram in receive order.
+        :param name: Thread name.
+        :param speed: Replay speed relative to the capture: 1.0 is real time, 10.0 ten
+                      times faster, 0 as fast as possible.
+        :param batch_size: Maximum datagrams merged per published snapshot, like recv_batch_size.
+        """
+        if self._initialized:
+            return  # Prevent re-initialization if already initialized
+
+        self.datagrams = datagrams
+        self.speed = speed
+        self.batch_size = max(1, int(batch_size))
+        self.replayed = 0  # Datagrams fed through process_data()
+        self.replay_seconds = 0.0  # Wall time from the first to the last replayed datagram
+        self.finished = threading.Event()  # Set when the log is exhausted or the thread stops
+        super().__init__(name=name, **kwargs)
+
+    def run(self):
+        """Replays the datagrams, paced by their capture timestamps unless speed is 0."""
+        # The thread is started by ManagedThread before __init__ has finished
+        while not self._initialized:
+            if self._stop_event.wait(0.01):
+                self.finished.set()
+                return
+
+        logging.info(f"{self.get_thread_name()} Starting replay...")
+        try:
+            self._replay()
+        except Exception as e:
+            logging.exception(f"{self.get_thread_name()} Unexpected error during replay: {e}")
+        finally:
+            self.finished.set()
+        logging.info(f"{self.get_thread_name()} Replayed {self.replayed} datagrams in {self.replay_seconds:.2f} s")
+
+    def _replay(self):
+        """Feeds the datagrams to process_data() in batches, publishing before every pause."""
+        datagrams = iter(self.datagrams)
+        datagram = next(datagrams, None)
+        if datagram is None:
+            return
+        first_capture = datagram.timestamp
+        start = time.perf_counter()
+        while datagram is not None and not self.should_stop():
+            if self.speed > 0:
+                delay = (datagram.timestamp - first_capture) / self.speed - (time.perf_counter() - start)
+                if delay > 0 and self._stop_event.wait(delay):
+                    break
+            with self.batch_updates():  # Publish one snapshot per batch, like a receive wakeup
+                for _ in range(self.batch_size):
+                    self.packets_received[datagram.port] = self.packets_received.get(datagram.port, 0) + 1
+                    self.process_data(datagram.payload, (datagram.ip, datagram.source_port))
+                    self.replayed += 1
+                    datagram = next(datagrams, None)
+                    if datagram is None or (self.speed > 0 and (datagram.timestamp - first_capture) / self.speed
+                                            > time.perf_counter() - start):
+                        break  # Log exhausted, or the next datagram is not due yet
+            self.housekeeping()
+        self.replay_seconds = time.perf_counter() - start
+
+    def wait(self, timeout=None):
+        """
+        Waits until every datagram has been replayed.
+
+        :param timeout: Maximum seconds to wait.
+        :return: True when the replay finished.
+        """
+        return self.finished.wait(timeout)
+
+
+# Usage Example:
+if __name__ == "__main__":
+    import sys
+    from utils.datagram_log import merge_datagram_logs
+
+    replay_thread = ReplayUdpThread(merge_datagram_logs(sys.argv[1:]), speed=1.0)
+    replay_thread.wait()
+    replay_thread.stop()
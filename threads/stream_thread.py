@@ -0,0 +1,131 @@
+import logging
+import queue
+import threading
+
+from threads.managed_thread import ManagedThread
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+
+class StreamBroadcaster(ManagedThread):
+    """
+    A thread that pushes coalesced miner changes to Server-Sent Events subscribers.
+
+    Miner events only record the latest record per IP (on_miner_event() is
+    O(1) on the ingest thread). Every update_seconds the pending changes are
+    rendered once and the same encoded message is queued for every
+    subscriber, so the work depends on how many miners changed, not on how
+    many dashboards are open.
+
+    Every open stream holds a web server thread, so the number of subscribers
+    is capped below the server's thread count.
+    """
+
+    def __init__(self, render, name="StreamBroadcaster", update_seconds=1.0, max_queue=32, keepalive_seconds=15,
+                 max_subscribers=0):
+        """
+        Initialize the stream broadcaster thread.
+
+        :param render: Callable taking a dict of IP -> MinerRecord (None for removed
+                       miners) and returning the JSON payload of a delta message.
+        :param name: Thread name.
+        :param update_seconds: Interval over which changes are coalesced.
+        :param max_queue: Messages buffered per subscriber before it is reset.
+        :param keepalive_seconds: Interval of keepalive comments on idle streams.
+        :param max_subscribers: Maximum concurrent subscribers, 0 for no limit.
+        """
+        self.render = render
+        self.max_queue = max_queue
+        self.keepalive_seconds = keepalive_seconds
+        self.max_subscribers = max_subscribers
+        self.pending = {}  # IP -> latest MinerRecord, or None once removed
+        self.pending_lock = threading.Lock()
+        self.subscribers = set()
+        self.subscribers_lock = threading.Lock()
+        self.messages_sent = 0
+        self.subscribers_rejected = 0  # subscribe() calls refused because the limit was reached
+        super().__init__(name=name, update_seconds=update_seconds)
+
+    def on_miner_event(self, event, record):
+        """
+        Records a miner change. Registered with UdpThread.add_listener().
+
+        :param event: Miner event name.
+        :param record: MinerRecord of the miner.
+        """
+        with self.pending_lock:
+            self.pending[record.ip] = None if event == "removed" else record
+
+    def subscribe(self):
+        """
+        Registers a new subscriber.
+
+        :return: Queue that receives the encoded messages, or None when
+                 max_subscribers streams are already open.
+        """
+        subscriber = queue.Queue(self.max_queue)
+        with self.subscribers_lock:
+            if self.max_subscribers and len(self.subscribers) >= self.max_subscribers:
+                self.subscribers_rejected += 1
+                return None
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        """Unregisters a subscriber returned by subscribe()."""
+        with self.subscribers_lock:
+            self.subscribers.discard(subscriber)
+
+    def run(self):
+        """Runs the coalescing loop."""
+        while not self.should_stop():
+            if self.needs_update():
+                try:
+                    self.broadcast()
+                except Exception as e:
+                    logging.error(f"[{self.get_thread_name()}] Failed to broadcast changes: {e}", exc_info=True)
+            else:
+                self._stop_event.wait(0.05)
+
+    def broadcast(self):
+        """Renders the pending changes once and queues them for every subscriber."""
+        with self.pending_lock:
+            changes, self.pending = self.pending, {}
+        with self.subscribers_lock:
+            subscribers = list(self.subscribers)
+        if not changes or not subscribers:
+            return  # New subscribers load the full page first, so nothing is lost
+
+        message = f"event: delta\ndata: {self.render(changes)}\n\n".encode()
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                # The client is not keeping up: drop its backlog and tell it to reload
+                while True:
+                    try:
+                        subscriber.get_nowait()
+                    except queue.Empty:
+                        break
+                subscriber.put_nowait(b"event: reset\ndata: {}\n\n")
+        self.messages_sent += len(subscribers)
+
+    def stream(self, subscriber):
+        """
+        Yields the messages of a subscriber as a text/event-stream body.
+
+        The subscriber is removed when the client disconnects (the WSGI server
+        closes the generator) or the broadcaster stops.
+
+        :param subscriber: Queue returned by subscribe().
+        """
+        try:
+            yield b"retry: 3000\n\n"
+            while not self.should_stop():
+                try:
+                    yield subscriber.get(timeout=self.keepalive_seconds)
+                except queue.Empty:
+                    yield b": keepalive\n\n"
+        finally:
+            self.unsubscribe(subscriber)
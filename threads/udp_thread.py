@@ -1,14 +1,72 @@
+import os
 import socket
 import json
 import time
 import logging
+import secrets
 import select
 import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from types import MappingProxyType
+from typing import NamedTuple
 from threads.managed_thread import ManagedThread
+from utils.datagram_log import DatagramLogWriter
+from utils.fleet_aggregates import FleetAggregates
+from utils.latency_histogram import HistogramSet
+from utils.miner_history import HistoryStore
+from utils.miner_record import MinerRecord, ONLINE, STALE, OFFLINE
+from utils.packet_parser import PacketReceiver, TruncatedPacketError, decode_packet
+from utils.profiling import ThreadProfiler
+from utils.timed_lock import TimedLock
+from utils.timing_wheel import TimingWheel
 
 # Configure logging for better debugging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 
+# Kernel socket table used to read per-socket drop counters (Linux only)
+PROC_NET_UDP = "/proc/net/udp"
+
+
+def read_udp_drops(inodes):
+    """
+    Reads the kernel drop counters for the given UDP socket inodes.
+
+    :param inodes: Iterable of socket inode numbers.
+    :return: Dictionary mapping inode to dropped datagram count, empty if unsupported.
+    """
+    wanted = set(inodes)
+    drops = {}
+    try:
+        with open(PROC_NET_UDP) as f:
+            next(f)  # Skip header line
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 13 and int(fields[9]) in wanted:
+                    drops[int(fields[9])] = int(fields[12])
+    except (OSError, ValueError, StopIteration):
+        pass
+    return drops
+
+
+class MinerSnapshot(NamedTuple):
+    """Immutable view of the miner map published by the ingest thread."""
+    version: int  # Increases with every change to the miner map
+    miners: MappingProxyType  # Read-only IP -> MinerRecord mapping
+    aggregates: dict  # FleetAggregates.as_dict() at the same version
+
+
+class MinerChanges(NamedTuple):
+    """Miners changed after a given change cursor."""
+    seq: str  # High-water cursor: pass it as `since` on the next call
+    full: bool  # True when `miners` is the whole map because the changes since `since` are unknown
+    miners: list  # Changed (or all) MinerRecords
+    removed: list  # IPs of the miners removed since `since`
+
+
+EMPTY_SNAPSHOT = MinerSnapshot(0, MappingProxyType({}),
+                               dict(FleetAggregates().as_dict(), stale_count=0, offline_count=0))
+
 
 class UdpThread(ManagedThread):
     """
@@ -20,6 +78,7 @@ class UdpThread(ManagedThread):
     _lock = threading.Lock()  # Lock to ensure thread safety in instance creation
     status_sock = None  # Socket for status updates (port 12345)
     config_sock = None  # Socket for config updates (port 12346)
+    binds_sockets = True  # Subclasses that receive through other means skip socket setup
 
     def __new__(cls, *args, **kwargs):
         """Ensure only one instance is created."""
@@ -33,29 +92,84 @@ class UdpThread(ManagedThread):
         return cls._instance
 
 
-    def __init__(self, name="UdpThread", ip="0.0.0.0", port=12345, update_seconds=0.5):
-        """Initializes the UDP listener thread."""
+    def __init__(self, name="UdpThread", ip="0.0.0.0", port=12345, update_seconds=0.5,
+                 drain_all=True, recv_batch_size=256, rcvbuf_size=4 * 1024 * 1024,
+                 stale_after=60, offline_after=300, remove_after=3600,
+                 history_samples=720, history_max_bytes=32 * 1024 * 1024, history_compressed=False,
+                 max_tombstones=10000):
+        """
+        Initializes the UDP listener thread.
+
+        :param name: Thread name.
+        :param ip: Address to bind the listening sockets to.
+        :param port: Status port; the config port is port + 1.
+        :param update_seconds: Polling interval used when drain_all is disabled.
+        :param drain_all: Drain every queued datagram on each wakeup instead of one per tick.
+        :param recv_batch_size: Maximum datagrams read per socket on each wakeup.
+        :param rcvbuf_size: Requested kernel receive buffer size (SO_RCVBUF) in bytes.
+        :param stale_after: Seconds without a packet before a miner is marked stale.
+        :param offline_after: Seconds without a packet before a miner is marked offline.
+        :param remove_after: Seconds without a packet before a miner is removed from the map.
+        :param history_samples: Samples kept per miner in the in-memory history.
+        :param history_max_bytes: Memory budget of the in-memory history.
+        :param history_compressed: Keep older history samples in compressed chunks.
+        :param max_tombstones: Removed miners remembered for changes_since().
+        """
         if self._initialized:
             return  # Prevent re-initialization if already initialized
-        
+
+        # Receive settings are read by run(), so set them before the thread starts
+        self.drain_all = drain_all
+        self.recv_batch_size = max(1, int(recv_batch_size))
+        self.rcvbuf_size = rcvbuf_size
+        self.packets_received = {port: 0, port + 1: 0}  # Datagrams read per listening port
+        self.parse_errors = 0  # Datagrams that were not valid JSON
+        self.truncated_packets = 0  # Datagrams dropped because the JSON object was incomplete
+        self.snapshot = EMPTY_SNAPSHOT  # Replaced (never mutated) on publish, read without locking
+        self.version = 0  # Change counter, incremented under self.lock
+        self.boot_id = secrets.token_hex(4)  # Epoch of the change counter, which restarts with the process
+        self._published_version = 0
+        self._batch_depth = 0  # Nesting level of batch_updates(), only touched by the ingest thread
+        self.receiver = PacketReceiver()  # Preallocated receive buffer reused for every datagram
+        self.latency = HistogramSet()  # process_data, publish_snapshot and miner map lock wait/hold times
+        self._process_latency = self.latency.get("process_data")
+        self._publish_latency = self.latency.get("publish_snapshot")
+        self.profiler = ThreadProfiler()  # cProfile of the ingest thread on request, see housekeeping()
+        self.capture = None  # DatagramLogWriter while every received datagram is being recorded
+
         super().__init__(name=name, update_seconds=update_seconds)
 
-        self.lock = threading.Lock()  # Lock for thread-safe updates
-        self.nmminer_map = {}  # Dictionary to store miner data
+        # Lock for thread-safe updates, counts the time spent waiting for it and holding it
+        self.lock = TimedLock(self.latency.get("lock_wait"), self.latency.get("lock_hold"))
+        self.nmminer_map = {}  # Dictionary of IP -> MinerRecord
+        self.aggregates = FleetAggregates()  # Running fleet totals, updated under self.lock
         self.status_sock = None
         self.config_sock = None
-        self.last_cleanup_time = 0  # Track last cleanup time
+        self.last_cleanup_time = 0  # Track last cleanup time (time.monotonic())
+        self.stale_after = stale_after
+        self.offline_after = offline_after
+        self.remove_after = remove_after
+        # One last-seen index per state, so expiry only touches the miners that expire
+        self._expiry = {ONLINE: TimingWheel(), STALE: TimingWheel(), OFFLINE: TimingWheel()}
+        self._listeners = []  # Callbacks for miner state events
+        self._sample_listeners = []  # Callbacks for metric samples
+        self._config_listeners = []  # Callbacks for packets carrying config fields
+        self.history = HistoryStore(history_samples, history_max_bytes, history_compressed)  # Per-miner ring buffers
+        self._change_log = OrderedDict()  # IP -> seq of its last change, oldest first; removed IPs stay as tombstones
+        self._tombstones = deque()  # (seq, IP) of removals, oldest first
+        self._tombstone_floor = 0  # Removals at or below this seq may have been forgotten
+        self.max_tombstones = max_tombstones
 
         # Only initialize sockets if not already done
-        if UdpThread.status_sock is None:
+        if self.binds_sockets and UdpThread.status_sock is None:
             # Socket initialization for both status and config
             UdpThread.status_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            UdpThread.status_sock.settimeout(0.1)
-            
             UdpThread.config_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            UdpThread.config_sock.settimeout(0.1)
 
             try:
+                for sock in (UdpThread.status_sock, UdpThread.config_sock):
+                    self._configure_socket(sock)
+
                 UdpThread.status_sock.bind((ip, port))  # Port 12345 for status
                 logging.info(f"{self.get_thread_name()} Listening for status on {ip}:{port}")
                 
@@ -85,48 +199,347 @@ class UdpThread(ManagedThread):
         self.config_sock = UdpThread.config_sock
         self._initialized = True  # Mark as initialized
 
+    def _configure_socket(self, sock):
+        """
+        Applies receive buffer sizing and blocking mode to a listening socket.
+
+        :param sock: UDP socket to configure before binding.
+        """
+        if self.drain_all:
+            sock.setblocking(False)  # select() does the waiting, reads must never block
+        else:
+            sock.settimeout(0.1)
+
+        if self.rcvbuf_size:
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf_size)
+            except OSError as e:
+                logging.warning(f"{self.get_thread_name()} Unable to set SO_RCVBUF to {self.rcvbuf_size}: {e}")
+            actual = sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+            if actual < self.rcvbuf_size:
+                logging.warning(f"{self.get_thread_name()} Receive buffer limited to {actual} bytes "
+                                f"(requested {self.rcvbuf_size}), raise net.core.rmem_max to allow more")
+
+    def get_kernel_drops(self):
+        """
+        Returns the number of datagrams the kernel dropped on each listening port.
+
+        The counters come from the socket table and are only available on Linux;
+        an empty dictionary is returned elsewhere or when the sockets are closed.
+
+        :return: Dictionary mapping port to dropped datagram count.
+        """
+        inodes = {}
+        for sock in (self.status_sock, self.config_sock):
+            if sock is not None and sock.fileno() != -1:
+                inodes[os.fstat(sock.fileno()).st_ino] = sock.getsockname()[1]
+        drops = read_udp_drops(inodes)
+        return {inodes[inode]: count for inode, count in drops.items()}
+
+    def get_receive_stats(self):
+        """
+        Returns ingest counters for monitoring.
+
+        :return: Dictionary with datagrams received and kernel drops per port, parse
+                 failures, truncated packets and the time spent waiting for the miner map lock.
+        """
+        return {
+            "packets_received": dict(self.packets_received),
+            "kernel_drops": self.get_kernel_drops(),
+            "parse_errors": self.parse_errors,
+            "truncated_packets": self.truncated_packets,
+            "lock_acquisitions": self.lock.acquisitions,
+            "lock_contended": self.lock.contended,
+            "lock_wait_seconds": self.lock.wait_seconds,
+        }
+
+    def start_capture(self, path, max_bytes=0):
+        """
+        Starts recording every received datagram to a datagram log.
+
+        :param path: Log file, appended to when it exists.
+        :param max_bytes: Stop recording after this many bytes (0: no limit).
+        :return: The DatagramLogWriter.
+        """
+        previous, self.capture = self.capture, DatagramLogWriter(path, max_bytes)
+        if previous is not None:
+            previous.close()
+        logging.info(f"{self.get_thread_name()} Capturing datagrams to {path}")
+        return self.capture
+
+    def stop_capture(self):
+        """
+        Stops recording datagrams.
+
+        :return: Capture counters (see DatagramLogWriter.stats), or None when not capturing.
+        """
+        capture, self.capture = self.capture, None
+        if capture is None:
+            return None
+        capture.close()
+        logging.info(f"{self.get_thread_name()} Captured {capture.datagrams} datagrams to {capture.path}")
+        return capture.stats()
+
+    def get_capture_stats(self):
+        """
+        Returns the state of the datagram capture.
+
+        :return: Dictionary with `capturing` and, while capturing, the capture counters.
+        """
+        capture = self.capture
+        if capture is None:
+            return {"capturing": False}
+        return {"capturing": True, **capture.stats()}
+
     def get_miner_map(self):
-        """Retrieves the current miner data map."""
+        """
+        Retrieves the current miner data map (IP -> MinerRecord).
+
+        The map is a read-only view of the latest published snapshot; it is
+        never copied and reading it takes no lock.
+        """
+        return self.snapshot.miners
+
+    def get_snapshot(self):
+        """Returns the latest published MinerSnapshot."""
+        return self.snapshot
+
+    def get_miner(self, ip):
+        """
+        Looks up a single miner without copying the map.
+
+        :param ip: Miner IP address.
+        :return: MinerRecord or None.
+        """
+        return self.snapshot.miners.get(ip)
+
+    def get_aggregates(self):
+        """
+        Returns the fleet aggregates of the latest published snapshot.
+
+        :return: Dictionary of aggregate name -> value (see FleetAggregates.as_dict).
+        """
+        return self.snapshot.aggregates
+
+    def check_aggregates(self):
+        """
+        Compares the running fleet aggregates with a full recompute over the miner map.
+
+        :return: Names of inconsistent aggregates, empty when consistent.
+        """
         with self.lock:
-            # Only cleanup periodically (every 60 seconds) instead of every request
-            current_time = time.time()
-            if current_time - self.last_cleanup_time > 60:
-                self._cleanup_offline_devices()
-                self.last_cleanup_time = current_time
-            return self.nmminer_map.copy()
-    
-    def _cleanup_offline_devices(self, timeout_seconds=300):
-        """Remove devices that haven't been seen for a while (default 5 minutes)."""
-        current_time = time.time()
-        to_remove = []
-        
-        for ip, miner_data in self.nmminer_map.items():
-            update_time_str = miner_data.get('UpdateTime')
-            if update_time_str:
+            return self.aggregates.check(record for record in self.nmminer_map.values() if record.is_online)
+
+    def change_cursor(self, version):
+        """Returns the `<boot_id>:<seq>` cursor of a change sequence number of this run."""
+        return f"{self.boot_id}:{version}"
+
+    def changes_since(self, since):
+        """
+        Returns the miners changed or removed after a change cursor.
+
+        Changes are indexed by sequence number, so the cost depends on the
+        number of changes rather than the size of the fleet. Cursors carry the
+        boot id of the run that issued them, because sequence numbers restart
+        at 0 with the process.
+
+        :param since: `<boot_id>:<seq>` cursor returned by a previous call or
+                      by change_cursor(), or None.
+        :return: MinerChanges; `full` is set when `since` is too old, malformed
+                 or from another run and every miner is returned instead.
+        """
+        boot_id, _, seq = (since or "").partition(":")
+        with self.lock:
+            high_water = self.version
+            cursor = self.change_cursor(high_water)
+            if boot_id != self.boot_id or not seq.isdigit():
+                return MinerChanges(cursor, True, list(self.nmminer_map.values()), [])
+            since = int(seq)
+            if since < self._tombstone_floor or since > high_water:
+                return MinerChanges(cursor, True, list(self.nmminer_map.values()), [])
+            miners = []
+            removed = []
+            for ip in reversed(self._change_log):
+                if self._change_log[ip] <= since:
+                    break
+                record = self.nmminer_map.get(ip)
+                if record is not None:
+                    miners.append(record)
+                else:
+                    removed.append(ip)
+        return MinerChanges(cursor, False, miners, removed)
+
+    def _record_change(self, ip, record):
+        """Assigns the next change sequence number to a miner. Call with self.lock held."""
+        self.version += 1
+        self._change_log[ip] = self.version
+        self._change_log.move_to_end(ip)
+        if record is not None:
+            record.seq = self.version
+            return
+        self._tombstones.append((self.version, ip))
+        while len(self._tombstones) > self.max_tombstones:
+            seq, removed_ip = self._tombstones.popleft()
+            if self._change_log.get(removed_ip) == seq:  # Not seen again since it was removed
+                del self._change_log[removed_ip]
+            self._tombstone_floor = seq
+
+    @contextmanager
+    def batch_updates(self):
+        """
+        Groups several packet merges into a single snapshot publication.
+
+        Only the ingest thread may use this; merges from other threads are
+        published immediately.
+        """
+        self._batch_depth += 1
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self.publish_snapshot()
+
+    def publish_snapshot(self):
+        """Publishes a new snapshot if the miner map changed since the last one."""
+        if self.version == self._published_version:
+            return
+        start = time.perf_counter_ns()
+        with self.lock:
+            aggregates = self.aggregates.as_dict()
+            aggregates['stale_count'] = len(self._expiry[STALE])
+            aggregates['offline_count'] = len(self._expiry[OFFLINE])
+            self.snapshot = MinerSnapshot(self.version, MappingProxyType(dict(self.nmminer_map)), aggregates)
+            self._published_version = self.version
+        self._publish_latency.record(time.perf_counter_ns() - start)
+
+    def add_listener(self, callback):
+        """
+        Registers a callback for miner events.
+
+        The callback is called as callback(event, record) from the ingest thread,
+        outside the lock, where event is "online" (new or returning miner),
+        "updated" (every merged packet), "stale", "offline" or "removed".
+
+        :param callback: Callable taking (event, record).
+        """
+        self._listeners.append(callback)
+
+    def add_sample_listener(self, callback):
+        """
+        Registers a callback for metric samples.
+
+        The callback is called as callback(record, timestamp) from the ingest
+        thread for every status packet, with the updated MinerRecord and the
+        sample time in epoch seconds. It must not block.
+
+        :param callback: Callable taking (record, timestamp).
+        """
+        self._sample_listeners.append(callback)
+
+    def add_config_listener(self, callback):
+        """
+        Registers a callback for config packets.
+
+        The callback is called as callback(ip, fields) from the ingest thread for
+        every packet that carries config fields, with the packet as received (not
+        merged, so values the merge ignores are visible). It must not block.
+
+        :param callback: Callable taking (ip, fields).
+        """
+        self._config_listeners.append(callback)
+
+    def remove_listener(self, callback):
+        """Unregisters a callback added with add_listener()."""
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _emit(self, events):
+        """
+        Delivers collected events to the listeners.
+
+        :param events: List of (event, record) tuples.
+        """
+        for event, record in events:
+            for callback in list(self._listeners):
                 try:
-                    device_time = time.mktime(time.strptime(update_time_str, "%Y-%m-%d %H:%M:%S"))
-                    if current_time - device_time > timeout_seconds:
-                        to_remove.append(ip)
-                except ValueError:
-                    # Invalid time format, remove old entry
-                    to_remove.append(ip)
-        
-        if to_remove:
-            for ip in to_remove:
-                del self.nmminer_map[ip]
-                logging.info(f"{self.get_thread_name()} Removed offline device {ip} (last seen > {timeout_seconds}s ago)")
-            logging.info(f"{self.get_thread_name()} Cleanup removed {len(to_remove)} offline devices")
+                    callback(event, record)
+                except Exception as e:
+                    logging.exception(f"{self.get_thread_name()} Error in miner event listener: {e}")
+
+    def housekeeping(self):
+        """
+        Periodic maintenance run from the ingest thread: moves silent miners through
+        their states, flushes the datagram capture and starts or stops a requested
+        cProfile run.
+        """
+        self.profiler.poll()
+        # Expiry is O(expired), but there is no need to run it more than once a second
+        current_time = time.monotonic()
+        if current_time - self.last_cleanup_time >= 1:
+            self.last_cleanup_time = current_time
+            self.expire_devices(current_time)
+            capture = self.capture
+            if capture is not None:
+                capture.flush()  # Bounds what a crash can lose to about a second of traffic
+
+    def expire_devices(self, now=None):
+        """
+        Moves miners that stopped reporting from online to stale to offline, then removes them.
+
+        :param now: Current time.monotonic() (default: now).
+        :return: List of (event, record) tuples that were emitted.
+        """
+        now = time.monotonic() if now is None else now
+        events = []
+        with self.lock:
+            for ip in self._expiry[ONLINE].pop_until(now - self.stale_after):
+                record = self.nmminer_map[ip].with_state(STALE)
+                self.nmminer_map[ip] = record
+                self._record_change(ip, record)
+                self._expiry[STALE].add(ip, record.last_seen)
+                events.append(("stale", record))
+
+            for ip in self._expiry[STALE].pop_until(now - self.offline_after):
+                previous = self.nmminer_map[ip]
+                record = previous.with_state(OFFLINE)
+                self.nmminer_map[ip] = record
+                self._record_change(ip, record)
+                self.aggregates.remove(previous)  # Aggregates only cover miners that are not offline
+                self._expiry[OFFLINE].add(ip, record.last_seen)
+                events.append(("offline", record))
+                logging.info(f"{self.get_thread_name()} Device {ip} is offline (last seen > {self.offline_after}s ago)")
+
+            for ip in self._expiry[OFFLINE].pop_until(now - self.remove_after):
+                record = self.nmminer_map.pop(ip)
+                self.history.remove(ip)
+                self._record_change(ip, None)
+                events.append(("removed", record))
+                logging.info(f"{self.get_thread_name()} Removed offline device {ip} (last seen > {self.remove_after}s ago)")
+
+        if events:
+            self.publish_snapshot()
+            self._emit(events)
+        return events
 
     def run(self):
         """Main loop of the thread. Listens for UDP messages and processes data."""
+        # The thread is started by ManagedThread before __init__ has finished
+        while not self._initialized:
+            if self._stop_event.wait(0.01):
+                return
+
         logging.info(f"{self.get_thread_name()} Starting UDP listener...")
 
         while not self.should_stop():
             try:
-                if self.needs_update():
+                if self.drain_all:
+                    self.receive_data()  # Blocks in select() until data arrives or 0.1s passes
+                elif self.needs_update():
                     self.receive_data()
                 else:
                     time.sleep(0.1)  # Prevent excessive CPU usage
+                self.housekeeping()
             except Exception as e:
                 logging.exception(f"{self.get_thread_name()} Unexpected error in run loop: {e}")
 
@@ -140,81 +553,168 @@ class UdpThread(ManagedThread):
         # Use select to check both sockets
         ready = select.select([self.status_sock, self.config_sock], [], [], 0.1)
         if ready[0]:
-            for sock in ready[0]:
-                try:
-                    data, addr = sock.recvfrom(4096)  # Receive up to 4096 bytes
-                    if sock == self.status_sock:
-                        logging.debug(f"{self.get_thread_name()} Status data received from {addr[0]}")
-                    else:
-                        logging.debug(f"{self.get_thread_name()} Config data received from {addr[0]}")
-                    self.process_data(data, addr)
-                except socket.timeout:
-                    continue
-                except Exception as e:
-                    logging.error(f"{self.get_thread_name()} Error receiving data: {e}")
+            with self.batch_updates():  # Publish one snapshot for everything read this wakeup
+                self._receive_ready(ready[0])
         else:
             logging.debug(f"{self.get_thread_name()} No data received this cycle.")
 
+    def _receive_ready(self, ready):
+        """
+        Reads from the sockets reported readable by select().
+
+        :param ready: List of readable sockets.
+        """
+        for sock in ready:
+            if self.drain_all:
+                self._drain_socket(sock)
+                continue
+            try:
+                data, addr = sock.recvfrom(4096)  # Receive up to 4096 bytes
+                self._count_packet(sock)
+                if self.capture is not None:
+                    self.capture.write(sock.getsockname()[1], data, addr)
+                if logging.root.isEnabledFor(logging.DEBUG):
+                    kind = "Status" if sock == self.status_sock else "Config"
+                    logging.debug(f"{self.get_thread_name()} {kind} data received from {addr[0]}")
+                self.process_data(data, addr)
+            except socket.timeout:
+                continue
+            except Exception as e:
+                logging.error(f"{self.get_thread_name()} Error receiving data: {e}")
+
+    def _drain_socket(self, sock):
+        """
+        Reads every queued datagram from a non-blocking socket, up to recv_batch_size.
+
+        :param sock: Socket reported readable by select().
+        :return: Number of datagrams processed.
+        """
+        count = 0
+        capture = self.capture
+        port = sock.getsockname()[1] if capture is not None else None
+        while count < self.recv_batch_size:
+            try:
+                data, addr = self.receiver.receive(sock)  # Receive up to 4096 bytes without allocating
+            except (BlockingIOError, InterruptedError):
+                break  # Queue is empty
+            except Exception as e:
+                logging.error(f"{self.get_thread_name()} Error receiving data: {e}")
+                break
+            count += 1
+            if capture is not None:
+                capture.write(port, data, addr)  # Copies the payload before the buffer is reused
+            self.process_data(data, addr)
+
+        if count:
+            self._count_packet(sock, count)
+            logging.debug(f"{self.get_thread_name()} Drained {count} datagrams from port {sock.getsockname()[1]}")
+        return count
+
+    def _count_packet(self, sock, count=1):
+        """Adds received datagrams to the per-port counter."""
+        port = sock.getsockname()[1]
+        self.packets_received[port] = self.packets_received.get(port, 0) + count
+
     def process_data(self, data, addr):
         """
         Parses incoming JSON data and updates the miner map.
 
-        :param data: Raw UDP data received from the socket.
+        :param data: Raw UDP data received from the socket (bytes or memoryview).
         :param addr: Address tuple (ip, port) of the sender.
         """
+        start = time.perf_counter_ns()
         try:
-            # Decode data and strip any trailing null bytes or whitespace
-            decoded_data = data.decode('utf-8').rstrip('\x00').strip()
-            
-            # Check if the JSON appears to be truncated (doesn't end with '}')
-            if not decoded_data.endswith('}'):
-                logging.warning(f"{self.get_thread_name()} Received truncated JSON from {addr[0]}: length={len(decoded_data)}, ends with='{decoded_data[-10:]}'")
-                return
-            
-            json_data = json.loads(decoded_data)
-            ip = json_data.get("ip") or addr[0]  # Use sender IP if not in data
+            json_data = decode_packet(data)
+            self.merge_packet(json_data, addr[0])
 
-            json_data["ip"] = ip  # Ensure IP is always set
-            json_data["UpdateTime"] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+        except TruncatedPacketError as e:
+            self.truncated_packets += 1
+            logging.warning(f"{self.get_thread_name()} Received truncated JSON from {addr[0]}: {e}")
+        except json.JSONDecodeError as e:
+            self.parse_errors += 1
+            decoded_data = bytes(data).decode('utf-8', errors='replace').rstrip('\x00').strip()
+            logging.error(f"{self.get_thread_name()} Failed to decode JSON from {addr[0]}: length={len(decoded_data)}, data='{decoded_data[:100]}...{decoded_data[-50:]}', Error: {e}")
+        except Exception as e:
+            logging.exception(f"{self.get_thread_name()} Unexpected error in JSON processing: {e}")
+        finally:
+            self._process_latency.record(time.perf_counter_ns() - start)
 
-            with self.lock:
-                # Determine packet type based on content
-                has_config_fields = bool(json_data.get('Version') or json_data.get('BoardType') or json_data.get('WiFiSSID'))
-                has_status_fields = bool(json_data.get('HashRate') or json_data.get('Temp') or json_data.get('RSSI'))
-                
-                if ip in self.nmminer_map:
-                    # Device exists, merge data intelligently
-                    existing_data = self.nmminer_map[ip].copy()
-                    
-                    # Always merge new data, but preserve important existing fields if not in new packet
-                    for key, value in json_data.items():
-                        if value and value != '' and value != 0:  # Only update with meaningful values
-                            existing_data[key] = value
-                    
-                    # Always update timestamp
-                    existing_data["UpdateTime"] = json_data["UpdateTime"]
-                    
-                    self.nmminer_map[ip] = existing_data
-                    
-                    packet_type = "config" if has_config_fields and not has_status_fields else "status" if has_status_fields and not has_config_fields else "mixed"
-                    logging.info(f"{self.get_thread_name()} Merged {packet_type} packet for {ip}: V={existing_data.get('Version', 'N/A')}, BT={existing_data.get('BoardType', 'N/A')}, HR={existing_data.get('HashRate', 'N/A')}")
+    def merge_packet(self, json_data, sender_ip):
+        """
+        Merges a decoded packet into the miner map.
+
+        :param json_data: Decoded packet fields.
+        :param sender_ip: Source address of the datagram, used when the packet carries no ip.
+        """
+        ip = json_data.get("ip") or sender_ip  # Use sender IP if not in data
+
+        json_data["ip"] = ip  # Ensure IP is always set
+        now = time.monotonic()
+        # Per-packet log lines are only built at DEBUG; formatting them would serialize ingest at INFO
+        debug = logging.root.isEnabledFor(logging.DEBUG)
+
+        with self.lock:
+            # Determine packet type based on content
+            has_config_fields = bool(json_data.get('Version') or json_data.get('BoardType') or json_data.get('WiFiSSID'))
+            has_status_fields = bool(json_data.get('HashRate') or json_data.get('Temp') or json_data.get('RSSI'))
+
+            existing = self.nmminer_map.get(ip)
+            if existing is not None:
+                # Device exists, merge data intelligently (always updates the timestamp)
+                record = existing.merge(json_data, now)
+                self.nmminer_map[ip] = record
+                if existing.is_online:
+                    self.aggregates.replace(existing, record)
                 else:
-                    # New device
-                    self.nmminer_map[ip] = json_data
-                    packet_type = "config" if has_config_fields else "status" if has_status_fields else "unknown"
-                    logging.info(f"{self.get_thread_name()} New device {ip} ({packet_type} packet): V={json_data.get('Version', 'N/A')}, BT={json_data.get('BoardType', 'N/A')}")
+                    self.aggregates.add(record)
+                    self._expiry[OFFLINE].discard(ip)
+                if existing.state == STALE:
+                    self._expiry[STALE].discard(ip)
 
+                if debug:
+                    packet_type = "config" if has_config_fields and not has_status_fields else "status" if has_status_fields and not has_config_fields else "mixed"
+                    logging.debug(f"{self.get_thread_name()} Merged {packet_type} packet for {ip}: V={record.get('Version', 'N/A')}, BT={record.get('BoardType', 'N/A')}, HR={record.get('HashRate', 'N/A')}")
+            else:
+                # New device
+                record = MinerRecord(ip, json_data, now)
+                self.nmminer_map[ip] = record
+                self.aggregates.add(record)
+                packet_type = "config" if has_config_fields else "status" if has_status_fields else "unknown"
+                logging.info(f"{self.get_thread_name()} New device {ip} ({packet_type} packet): V={json_data.get('Version', 'N/A')}, BT={json_data.get('BoardType', 'N/A')}")
+            self._expiry[ONLINE].add(ip, now)
+            self._record_change(ip, record)
+
+        if debug:
             logging.debug(f"{self.get_thread_name()} Updated miner data for IP: {ip}")
 
-        except json.JSONDecodeError as e:
-            decoded_data = data.decode('utf-8', errors='replace').rstrip('\x00').strip()
-            logging.error(f"{self.get_thread_name()} Failed to decode JSON from {addr[0]}: length={len(decoded_data)}, data='{decoded_data[:100]}...{decoded_data[-50:]}', Error: {e}")
-        except Exception as e:
-            logging.exception(f"{self.get_thread_name()} Unexpected error in JSON processing: {e}")
+        if has_status_fields:
+            timestamp = time.time()
+            self.history.append(record, timestamp)
+            for callback in self._sample_listeners:
+                try:
+                    callback(record, timestamp)
+                except Exception as e:
+                    logging.exception(f"{self.get_thread_name()} Error in sample listener: {e}")
+
+        if has_config_fields:
+            for callback in self._config_listeners:
+                try:
+                    callback(ip, json_data)
+                except Exception as e:
+                    logging.exception(f"{self.get_thread_name()} Error in config listener: {e}")
+
+        if not self._batch_depth or threading.current_thread() is not self.thread:
+            self.publish_snapshot()
+
+        events = [("updated", record)]
+        if existing is None or existing.state != ONLINE:
+            events.insert(0, ("online", record))
+        self._emit(events)
 
     def stop(self):
         """Stops the thread and closes the sockets."""
         super().stop()  # Gracefully stop the thread
+        self.stop_capture()
         if UdpThread.status_sock:
             UdpThread.status_sock.close()  # Close status socket to free the port
             UdpThread.status_sock = None
@@ -0,0 +1,157 @@
+"""
+Compact binary log of received UDP datagrams, for capture and replay.
+
+A log starts with an 8-byte magic and holds one record per datagram: a
+fixed 18-byte little-endian header (receive time as epoch float64, source
+IPv4 address, source port, destination port, payload length) followed by
+the payload bytes exactly as received.
+"""
+
+import heapq
+import os
+import socket
+import struct
+import threading
+import time
+from typing import NamedTuple
+
+MAGIC = b"NMCAP\x00\x01\x00"
+RECORD = struct.Struct("<d4sHHH")
+
+
+class Datagram(NamedTuple):
+    """One captured datagram."""
+    timestamp: float  # Epoch seconds when it was received
+    ip: str  # Source address
+    source_port: int
+    port: int  # Port it was received on
+    payload: bytes
+
+
+class DatagramLogWriter:
+    """
+    Appends datagrams to a log file through a large write buffer.
+
+    write() only copies the record into the buffer; the file is written when
+    the buffer fills or flush() is called. Writing stops once max_bytes have
+    been written, so a forgotten capture cannot fill the disk.
+    """
+
+    def __init__(self, path, max_bytes=0, buffer_size=1024 * 1024):
+        """
+        Args:
+            path (str): Log file; created, or appended to when it exists.
+            max_bytes (int): Stop capturing after this many bytes (0: no limit).
+            buffer_size (int): Write buffer size in bytes.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "ab", buffering=buffer_size)
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        self._lock = threading.Lock()
+        self.datagrams = 0
+        self.bytes = 0
+        self.full = False  # max_bytes reached, further datagrams are ignored
+
+    def write(self, port, data, addr, timestamp=None):
+        """
+        Record one datagram.
+
+        Args:
+            port (int): Port the datagram was received on.
+            data (bytes | memoryview): Payload; copied before returning.
+            addr (tuple): Source (ip, port).
+            timestamp (float): Receive time (default: now).
+
+        Returns:
+            bool: False once the log is full or closed.
+        """
+        size = RECORD.size + len(data)
+        with self._lock:
+            if self.full or self._file is None:
+                return False
+            if self.max_bytes and self.bytes + size > self.max_bytes:
+                self.full = True
+                return False
+            try:
+                address = socket.inet_aton(addr[0])
+            except OSError:
+                address = bytes(4)
+            self._file.write(RECORD.pack(time.time() if timestamp is None else timestamp, address,
+                                         addr[1], port, len(data)))
+            self._file.write(data)
+            self.datagrams += 1
+            self.bytes += size
+        return True
+
+    def flush(self):
+        """Write the buffered records to the file."""
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        """Flush and close the file."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def stats(self):
+        """
+        Return the capture counters.
+
+        Returns:
+            dict: path, datagrams, bytes, max_bytes and whether the log is full.
+        """
+        return {"path": self.path, "datagrams": self.datagrams, "bytes": self.bytes,
+                "max_bytes": self.max_bytes, "full": self.full}
+
+
+def read_datagram_log(path):
+    """
+    Read the datagrams of a log file in file order.
+
+    A record cut short at the end of the file (e.g. by a crash during
+    capture) ends the iteration.
+
+    Args:
+        path (str): Log file.
+
+    Yields:
+        Datagram: The captured datagrams.
+
+    Raises:
+        ValueError: If the file is not a datagram log.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a datagram log")
+        unpack, header_size = RECORD.unpack, RECORD.size
+        read = f.read
+        while True:
+            header = read(header_size)
+            if len(header) < header_size:
+                return
+            timestamp, address, source_port, port, length = unpack(header)
+            payload = read(length)
+            if len(payload) < length:
+                return
+            yield Datagram(timestamp, socket.inet_ntoa(address), source_port, port, payload)
+
+
+def merge_datagram_logs(paths):
+    """
+    Read several logs (e.g. one per ingest worker) as one stream ordered by time.
+
+    Args:
+        paths (Iterable[str]): Log files.
+
+    Returns:
+        Iterator[Datagram]: Datagrams of all logs by receive time.
+    """
+    return heapq.merge(*(read_datagram_log(path) for path in paths), key=lambda datagram: datagram.timestamp)
@@ -0,0 +1,102 @@
+"""
+Largest-Triangle-Three-Buckets downsampling of time series for charts.
+
+LTTB keeps the first and last points and, for every bucket in between, the
+point forming the largest triangle with the point kept in the previous bucket
+and the average of the next bucket, which preserves peaks and dips that plain
+decimation or averaging would flatten. NumPy is used when it is installed.
+"""
+
+try:
+    import numpy
+except ImportError:  # Optional dependency
+    numpy = None
+
+LTTB_BACKEND = "numpy" if numpy is not None else "python"
+
+
+def _bucket_bounds(length, points):
+    """Yield (start, end) index ranges of the points - 2 middle buckets."""
+    # Integer arithmetic, so every middle point falls in exactly one bucket
+    for bucket in range(points - 2):
+        yield bucket * (length - 2) // (points - 2) + 1, (bucket + 1) * (length - 2) // (points - 2) + 1
+
+
+def _lttb_python(xs, ys, points):
+    length = len(xs)
+    bounds = list(_bucket_bounds(length, points))
+    indices = [0]
+    a = 0
+    for bucket, (start, end) in enumerate(bounds):
+        # Average of the next bucket (the last point for the final bucket)
+        next_start, next_end = bounds[bucket + 1] if bucket + 1 < len(bounds) else (length - 1, length)
+        count = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / count
+        avg_y = sum(ys[next_start:next_end]) / count
+
+        ax, ay = xs[a], ys[a]
+        dx, dy = avg_x - ax, avg_y - ay
+        best = start
+        best_area = -1.0
+        for index in range(start, end):
+            # Twice the triangle area; the constant factor does not change the maximum
+            area = abs(dx * (ys[index] - ay) - (xs[index] - ax) * dy)
+            if area > best_area:
+                best_area = area
+                best = index
+        indices.append(best)
+        a = best
+    indices.append(length - 1)
+    return indices
+
+
+def _lttb_numpy(xs, ys, points):
+    x = numpy.asarray(xs, dtype=float)
+    x = x - x[0]  # Keeps the prefix sums of epoch timestamps precise; areas do not depend on the origin
+    y = numpy.asarray(ys, dtype=float)
+    length = len(x)
+    bounds = list(_bucket_bounds(length, points))
+    indices = numpy.empty(points, dtype=numpy.int64)
+    indices[0] = 0
+    indices[-1] = length - 1
+
+    # Averages of every bucket at once from prefix sums; the bucket after the last one is the last point
+    starts = numpy.array([start for start, _ in bounds] + [length - 1])
+    ends = numpy.array([end for _, end in bounds] + [length])
+    counts = ends - starts
+    x_sums = numpy.concatenate(([0.0], numpy.cumsum(x)))
+    y_sums = numpy.concatenate(([0.0], numpy.cumsum(y)))
+    avg_x = ((x_sums[ends] - x_sums[starts]) / counts)[1:]
+    avg_y = ((y_sums[ends] - y_sums[starts]) / counts)[1:]
+
+    # Only the choice of the previous point is sequential; each bucket is vectorized
+    a = 0
+    for bucket, (start, end) in enumerate(bounds):
+        ax, ay = x[a], y[a]
+        areas = numpy.abs((avg_x[bucket] - ax) * (y[start:end] - ay) - (x[start:end] - ax) * (avg_y[bucket] - ay))
+        a = start + int(areas.argmax())
+        indices[bucket + 1] = a
+    return indices.tolist()
+
+
+def lttb(timestamps, values, points):
+    """
+    Downsample a series to at most `points` points.
+
+    Args:
+        timestamps (Sequence[float]): Sample times, ascending.
+        values (Sequence[float]): Sample values.
+        points (int): Maximum number of points to return (at least 3 to downsample).
+
+    Returns:
+        tuple: (timestamps, values) lists; the input as lists when it is already
+            short enough.
+    """
+    length = len(timestamps)
+    if points >= length or points < 3:
+        return list(timestamps), list(values)
+    if numpy is not None:
+        indices = _lttb_numpy(timestamps, values, points)
+    else:
+        indices = _lttb_python(timestamps, values, points)
+    return [timestamps[index] for index in indices], [values[index] for index in indices]
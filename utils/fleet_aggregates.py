@@ -0,0 +1,165 @@
+"""
+Incrementally maintained fleet-wide aggregates over miner records.
+"""
+
+import math
+from collections import Counter
+
+
+class FleetAggregates:
+    """
+    Running totals over all tracked miners.
+
+    The totals are updated when a record is added, replaced or removed, so every
+    aggregate is an O(1) read. Callers must serialize updates (UdpThread does
+    them under its lock).
+    """
+
+    def __init__(self):
+        self.online_count = 0
+        self.total_hashrate = 0.0
+        self.hashrate_by_board = {}
+        self.count_by_board = {}
+        self.shares_accepted = 0
+        self.shares_rejected = 0
+        self.temp_sum = 0.0
+        self.temp_count = 0
+        self._temps = Counter()  # Temperature -> number of miners, for the max
+        self._max_temp = None
+
+    @staticmethod
+    def _board(record):
+        return record.get('BoardType') or 'Unknown'
+
+    def add(self, record):
+        """
+        Add a miner record to the totals.
+
+        Args:
+            record (MinerRecord): Record to add.
+        """
+        board = self._board(record)
+        self.online_count += 1
+        self.total_hashrate += record.hashrate
+        self.hashrate_by_board[board] = self.hashrate_by_board.get(board, 0.0) + record.hashrate
+        self.count_by_board[board] = self.count_by_board.get(board, 0) + 1
+        self.shares_accepted += record.shares_accepted
+        self.shares_rejected += record.shares_rejected
+        if record.temp:
+            self.temp_sum += record.temp
+            self.temp_count += 1
+            self._temps[record.temp] += 1
+            if self._max_temp is None or record.temp > self._max_temp:
+                self._max_temp = record.temp
+
+    def remove(self, record):
+        """
+        Remove a miner record from the totals.
+
+        Args:
+            record (MinerRecord): Record previously passed to add().
+        """
+        board = self._board(record)
+        self.online_count -= 1
+        self.total_hashrate -= record.hashrate
+        self.hashrate_by_board[board] -= record.hashrate
+        self.count_by_board[board] -= 1
+        if not self.count_by_board[board]:
+            del self.count_by_board[board]
+            del self.hashrate_by_board[board]
+        self.shares_accepted -= record.shares_accepted
+        self.shares_rejected -= record.shares_rejected
+        if record.temp:
+            self.temp_sum -= record.temp
+            self.temp_count -= 1
+            self._temps[record.temp] -= 1
+            if not self._temps[record.temp]:
+                del self._temps[record.temp]
+                if record.temp == self._max_temp:
+                    # Distinct temperatures are few (0.1 degree steps), so this stays cheap
+                    self._max_temp = max(self._temps) if self._temps else None
+        if not self.online_count:
+            # Drop accumulated floating point error once the fleet is empty
+            self.total_hashrate = 0.0
+            self.temp_sum = 0.0
+
+    def replace(self, old, new):
+        """
+        Replace a miner's previous record with its updated one.
+
+        Args:
+            old (MinerRecord): Record currently counted, or None for a new miner.
+            new (MinerRecord): Updated record.
+        """
+        if old is not None:
+            self.remove(old)
+        self.add(new)
+
+    @property
+    def mean_temp(self):
+        """Average temperature of the miners that report one."""
+        return self.temp_sum / self.temp_count if self.temp_count else 0.0
+
+    @property
+    def max_temp(self):
+        """Highest reported temperature."""
+        return self._max_temp if self._max_temp is not None else 0.0
+
+    def as_dict(self):
+        """
+        Return all aggregates as a dictionary.
+
+        Returns:
+            dict: Aggregate name -> value.
+        """
+        return {
+            'online_count': self.online_count,
+            'total_hashrate': self.total_hashrate,
+            'hashrate_by_board': dict(self.hashrate_by_board),
+            'count_by_board': dict(self.count_by_board),
+            'mean_temp': self.mean_temp,
+            'max_temp': self.max_temp,
+            'shares_accepted': self.shares_accepted,
+            'shares_rejected': self.shares_rejected,
+        }
+
+    @classmethod
+    def recompute(cls, records):
+        """
+        Build aggregates from scratch.
+
+        Args:
+            records (Iterable[MinerRecord]): Records to aggregate.
+
+        Returns:
+            FleetAggregates: Freshly computed aggregates.
+        """
+        aggregates = cls()
+        for record in records:
+            aggregates.add(record)
+        return aggregates
+
+    def check(self, records, rel_tol=1e-9):
+        """
+        Compare the running totals against a full recompute.
+
+        Args:
+            records (Iterable[MinerRecord]): Records currently tracked.
+            rel_tol (float): Relative tolerance for floating point totals.
+
+        Returns:
+            list: Names of the aggregates that differ, empty when consistent.
+        """
+        expected = self.recompute(records).as_dict()
+        actual = self.as_dict()
+        mismatches = []
+        for name, value in expected.items():
+            if isinstance(value, dict):
+                other = actual[name]
+                same = value.keys() == other.keys() and all(
+                    math.isclose(value[key], other[key], rel_tol=rel_tol, abs_tol=1e-6) for key in value)
+            else:
+                same = math.isclose(value, actual[name], rel_tol=rel_tol, abs_tol=1e-6)
+            if not same:
+                mismatches.append(name)
+        return mismatches
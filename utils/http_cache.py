@@ -0,0 +1,183 @@
+"""
+Strong ETags, conditional GET and cached compression of HTTP response bodies.
+
+gzip is always available; brotli is used when the `brotli` package is
+installed.
+"""
+
+import gzip
+import hashlib
+import secrets
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:  # Optional dependency
+    brotli = None
+
+# Supported content codings, in order of preference at equal quality
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+# Distinguishes tags of this process from those of a previous run, whose data
+# versions started from the same counters
+BOOT_ID = secrets.token_hex(8)
+
+
+def make_etag(*parts):
+    """
+    Build a strong entity tag from the values a response is generated from.
+
+    The tag also covers BOOT_ID, so a version number reused after a restart
+    does not validate a client's copy from the previous run.
+
+    Args:
+        *parts: Values identifying the response (path, query, data version, ...).
+
+    Returns:
+        str: Unquoted entity tag.
+    """
+    return hashlib.sha1(repr((BOOT_ID,) + parts).encode()).hexdigest()
+
+
+def body_etag(data):
+    """
+    Build a strong entity tag from a response body.
+
+    Args:
+        data (bytes): Uncompressed body.
+
+    Returns:
+        str: Unquoted entity tag.
+    """
+    return hashlib.sha1(data).hexdigest()
+
+
+def encoded_etag(etag, encoding):
+    """Entity tag of the `encoding` representation; strong tags must differ per representation."""
+    return f'{etag}-{encoding}' if encoding else etag
+
+
+def matching_etag(if_none_match, etag):
+    """
+    Find the representation of a tag matched by a request's If-None-Match header.
+
+    Args:
+        if_none_match (werkzeug.datastructures.ETags): Parsed If-None-Match header.
+        etag (str): Unquoted tag of the uncompressed representation.
+
+    Returns:
+        str: The matched tag, to send with a 304 Not Modified, or None.
+    """
+    if not if_none_match:
+        return None
+    for candidate in (etag,) + tuple(encoded_etag(etag, encoding) for encoding in ENCODINGS):
+        if if_none_match.contains(candidate):
+            return candidate
+    return None
+
+
+def negotiate_encoding(accept_encodings):
+    """
+    Pick the content coding for a response.
+
+    Args:
+        accept_encodings (werkzeug.datastructures.Accept): Parsed Accept-Encoding header.
+
+    Returns:
+        str: 'br', 'gzip' or None to send the body uncompressed.
+    """
+    best, best_quality = None, 0
+    for encoding in ENCODINGS:
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(data, encoding, level=6):
+    """
+    Compress a body.
+
+    Args:
+        data (bytes): Uncompressed body.
+        encoding (str): 'br' or 'gzip'.
+        level (int): gzip level; brotli uses quality `level - 1`.
+
+    Returns:
+        bytes: Compressed body.
+    """
+    if encoding == 'br':
+        return brotli.compress(data, quality=max(0, level - 1))
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+class CompressedBodyCache:
+    """
+    Caches compressed bodies by entity tag and encoding.
+
+    Pollers requesting the same unchanged resource share one compression
+    instead of paying for it on every request.
+    """
+
+    def __init__(self, max_entries=256, level=6):
+        """
+        Args:
+            max_entries (int): Number of compressed bodies kept.
+            level (int): Compression level passed to compress().
+        """
+        self.max_entries = max_entries
+        self.level = level
+        self._entries = OrderedDict()  # (etag, encoding) -> bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_in = 0  # Uncompressed bytes of the bodies sent compressed
+        self.bytes_out = 0
+
+    def get(self, etag, encoding, data):
+        """
+        Return the compressed body of a response, compressing it once per tag.
+
+        Args:
+            etag (str): Strong tag of the uncompressed body.
+            encoding (str): 'br' or 'gzip'.
+            data (bytes): Uncompressed body.
+
+        Returns:
+            bytes: Compressed body.
+        """
+        key = (etag, encoding)
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        if body is None:
+            body = compress(data, encoding, self.level)
+            with self._lock:
+                self.misses += 1
+                self._entries[key] = body
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        with self._lock:
+            self.bytes_in += len(data)
+            self.bytes_out += len(body)
+        return body
+
+    def stats(self):
+        """
+        Return the cache counters.
+
+        Returns:
+            dict: hits, misses, entries, bytes in and out and the available encodings.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+                'encodings': list(ENCODINGS),
+            }
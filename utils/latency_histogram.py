@@ -0,0 +1,166 @@
+"""
+HDR-style latency histograms.
+
+Values are recorded in nanoseconds into log-linear buckets: every power of
+two is split into 64 equal sub-buckets, so any recorded value is reported
+within 1/64 (about 1.6 %) of its true value, from nanoseconds to minutes,
+in at most a few thousand counters. Recording is a few integer operations.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+SUB_BUCKET_BITS = 7  # 2^7 linear buckets below 128 ns, then 64 per power of two
+_HALF = 1 << (SUB_BUCKET_BITS - 1)
+_FULL = 1 << SUB_BUCKET_BITS
+
+# Percentiles reported by summary()
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def bucket_index(value):
+    """Index of the bucket holding a non-negative integer value."""
+    if value < _FULL:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    return (shift << (SUB_BUCKET_BITS - 1)) + (value >> shift)
+
+
+def bucket_value(index):
+    """Smallest value of a bucket (inverse of bucket_index)."""
+    if index < _FULL:
+        return index
+    shift = (index >> (SUB_BUCKET_BITS - 1)) - 1
+    return (index - (shift << (SUB_BUCKET_BITS - 1))) << shift
+
+
+class LatencyHistogram:
+    """Thread-safe histogram of durations in nanoseconds."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget every recorded value."""
+        with self._lock:
+            self._counts = [0] * _FULL
+            self.count = 0
+            self.total = 0
+            self.min = None
+            self.max = 0
+
+    def record(self, nanoseconds):
+        """
+        Record one duration.
+
+        Args:
+            nanoseconds (int): Duration, e.g. a time.perf_counter_ns() difference.
+        """
+        value = max(0, int(nanoseconds))
+        index = bucket_index(value)
+        with self._lock:
+            counts = self._counts
+            if index >= len(counts):
+                counts.extend([0] * (index + _HALF - len(counts)))
+            counts[index] += 1
+            self.count += 1
+            self.total += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if value > self.max:
+                self.max = value
+
+    @contextmanager
+    def time(self):
+        """Context manager recording the duration of its block."""
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(time.perf_counter_ns() - start)
+
+    def percentiles(self, percentiles=PERCENTILES):
+        """
+        Return values at the given percentiles.
+
+        Args:
+            percentiles (Iterable[float]): Percentiles between 0 and 100.
+
+        Returns:
+            dict: Percentile -> value in nanoseconds (the upper bound of its bucket,
+                capped at the largest recorded value), empty when nothing was recorded.
+        """
+        with self._lock:
+            counts = list(self._counts)
+            count, maximum = self.count, self.max
+        if not count:
+            return {}
+        result = {}
+        targets = sorted(percentiles)
+        seen = 0
+        position = 0
+        for index, bucket_count in enumerate(counts):
+            seen += bucket_count
+            while position < len(targets) and seen >= targets[position] / 100 * count:
+                result[targets[position]] = min(bucket_value(index + 1) - 1, maximum)
+                position += 1
+            if position == len(targets):
+                break
+        for percentile in targets[position:]:
+            result[percentile] = maximum
+        return result
+
+    def summary(self):
+        """
+        Return the count, mean, min, max and PERCENTILES in microseconds.
+
+        Returns:
+            dict: Summary of the recorded durations.
+        """
+        with self._lock:
+            count, total, minimum, maximum = self.count, self.total, self.min, self.max
+        data = {
+            'count': count,
+            'mean_us': total / count / 1000 if count else 0.0,
+            'min_us': (minimum or 0) / 1000,
+            'max_us': maximum / 1000,
+        }
+        for percentile, value in self.percentiles().items():
+            data[f'p{percentile:g}_us'] = value / 1000
+        return data
+
+
+class HistogramSet:
+    """Named LatencyHistograms, created on first use."""
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        """
+        Return the histogram of a name, creating it if needed.
+
+        Args:
+            name (str): Histogram name.
+
+        Returns:
+            LatencyHistogram: The histogram.
+        """
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, LatencyHistogram())
+        return histogram
+
+    def items(self):
+        """Return (name, histogram) pairs sorted by name."""
+        with self._lock:
+            return sorted(self._histograms.items())
+
+    def reset(self):
+        """Reset every histogram."""
+        for _, histogram in self.items():
+            histogram.reset()
@@ -0,0 +1,262 @@
+"""
+Multi-resolution min/max/mean/last rollups of metric samples.
+"""
+
+import math
+import threading
+
+# Bucket widths in seconds, finest first; each one is a multiple of the previous one
+RESOLUTIONS = (60, 300, 3600, 86400)
+
+# Seconds of rollups kept per resolution
+RETENTION = {60: 2 * 86400, 300: 14 * 86400, 3600: 180 * 86400, 86400: 5 * 365 * 86400}
+
+# Fleet-wide metrics, as FleetAggregates.as_dict() keys
+FLEET_METRICS = ('total_hashrate', 'online_count', 'mean_temp', 'max_temp', 'shares_accepted', 'shares_rejected')
+
+FLEET = None  # Series key of the fleet-wide rollups (miner series use the miner IP)
+
+
+class Bucket:
+    """Running count and per-metric min/max/sum/last over one time bucket."""
+    __slots__ = ('start', 'count', 'mins', 'maxs', 'sums', 'lasts')
+
+    def __init__(self, start, count, mins, maxs, sums, lasts):
+        self.start = start
+        self.count = count
+        self.mins = mins
+        self.maxs = maxs
+        self.sums = sums
+        self.lasts = lasts
+
+    @classmethod
+    def from_sample(cls, start, values):
+        """
+        Open a bucket with its first sample.
+
+        Args:
+            start (float): Bucket start time (epoch seconds).
+            values (tuple): Metric values of the sample.
+        """
+        return cls(start, 1, list(values), list(values), list(values), list(values))
+
+    def add(self, values):
+        """
+        Add a sample to the bucket.
+
+        Args:
+            values (tuple): Metric values, in the same order as the first sample.
+        """
+        self.count += 1
+        mins, maxs, sums = self.mins, self.maxs, self.sums
+        for i, value in enumerate(values):
+            if value < mins[i]:
+                mins[i] = value
+            if value > maxs[i]:
+                maxs[i] = value
+            sums[i] += value
+        self.lasts = list(values)
+
+    def merge(self, other):
+        """
+        Fold a later bucket of the same series into this one.
+
+        Args:
+            other (Bucket): Bucket covering a later (or the same) time range.
+        """
+        self.count += other.count
+        self.mins = [min(a, b) for a, b in zip(self.mins, other.mins)]
+        self.maxs = [max(a, b) for a, b in zip(self.maxs, other.maxs)]
+        self.sums = [a + b for a, b in zip(self.sums, other.sums)]
+        self.lasts = list(other.lasts)
+
+    def copy(self, start=None):
+        """Return an independent copy, optionally moved to another start time."""
+        return Bucket(self.start if start is None else start, self.count,
+                      list(self.mins), list(self.maxs), list(self.sums), list(self.lasts))
+
+    def mean(self, index):
+        """Mean of one metric over the bucket."""
+        return self.sums[index] / self.count
+
+    def as_row(self):
+        """
+        Return the bucket as a flat tuple: start, count, then min, max, sum, last for each metric.
+        """
+        row = [self.start, self.count]
+        for values in zip(self.mins, self.maxs, self.sums, self.lasts):
+            row.extend(values)
+        return tuple(row)
+
+
+class RollupAggregator:
+    """
+    Keeps the open buckets of every series at every resolution.
+
+    Samples only update the finest bucket. When a bucket closes it is folded
+    into the open bucket of the next resolution, so the cost per sample does
+    not depend on the number of resolutions. Closed buckets are returned to
+    the caller, which persists them.
+    """
+
+    def __init__(self, resolutions=RESOLUTIONS, grace=5.0):
+        """
+        Args:
+            resolutions (tuple): Bucket widths in seconds, finest first.
+            grace (float): Seconds a bucket stays open past its end for late samples.
+        """
+        self.resolutions = resolutions
+        self.grace = grace
+        self._open = {}  # Series key -> open Bucket (or None) per resolution
+        self._next_sweep = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, key, timestamp, values):
+        """
+        Add a sample to a series.
+
+        Args:
+            key: Series key (miner IP or FLEET).
+            timestamp (float): Sample time (epoch seconds).
+            values (tuple): Metric values.
+
+        Returns:
+            list: (key, resolution, Bucket) tuples of the buckets closed by this sample.
+        """
+        closed = []
+        with self._lock:
+            levels = self._open.get(key)
+            if levels is None:
+                levels = self._open[key] = [None] * len(self.resolutions)
+            else:
+                self._advance(key, levels, timestamp, closed)
+            bucket = levels[0]
+            if bucket is None:
+                levels[0] = Bucket.from_sample(timestamp - timestamp % self.resolutions[0], values)
+            else:
+                bucket.add(values)
+        return closed
+
+    def sweep(self, now):
+        """
+        Close the buckets of series that stopped receiving samples.
+
+        Only does work once per finest bucket period.
+
+        Args:
+            now (float): Current time (epoch seconds).
+
+        Returns:
+            list: (key, resolution, Bucket) tuples of the closed buckets.
+        """
+        closed = []
+        if now < self._next_sweep:
+            return closed
+        finest = self.resolutions[0]
+        self._next_sweep = now - now % finest + finest + self.grace
+        with self._lock:
+            for key, levels in list(self._open.items()):
+                self._advance(key, levels, now - self.grace, closed)
+                if not any(levels):
+                    del self._open[key]
+        return closed
+
+    def close_all(self):
+        """
+        Close every open bucket, e.g. on shutdown.
+
+        Returns:
+            list: (key, resolution, Bucket) tuples of the closed (partial) buckets.
+        """
+        closed = []
+        with self._lock:
+            for key, levels in self._open.items():
+                for index in range(len(levels)):
+                    if levels[index] is not None:
+                        self._close(key, levels, index, closed)
+            self._open.clear()
+        return closed
+
+    def open_bucket(self, key, resolution):
+        """
+        Return the current, still open bucket of a series at one resolution.
+
+        The open buckets of finer resolutions have not been folded in yet, so
+        they are merged into the returned copy.
+
+        Args:
+            key: Series key.
+            resolution (int): One of the aggregator resolutions.
+
+        Returns:
+            Bucket: Copy of the open bucket, or None.
+        """
+        index = self.resolutions.index(resolution)
+        with self._lock:
+            levels = self._open.get(key)
+            if levels is None:
+                return None
+            result = None
+            for level in range(index, -1, -1):  # Coarsest first, so merges stay in time order
+                bucket = levels[level]
+                if bucket is None:
+                    continue
+                start = bucket.start - bucket.start % resolution
+                if result is None:
+                    result = bucket.copy(start)
+                elif start == result.start:
+                    result.merge(bucket)
+            return result
+
+    def _advance(self, key, levels, timestamp, closed):
+        """Close the buckets of a series that end at or before timestamp, finest first."""
+        for index, resolution in enumerate(self.resolutions):
+            bucket = levels[index]
+            if bucket is not None and timestamp >= bucket.start + resolution:
+                self._close(key, levels, index, closed)
+
+    def _close(self, key, levels, index, closed):
+        """Close the bucket at one level and fold it into the next coarser level."""
+        bucket = levels[index]
+        levels[index] = None
+        closed.append((key, self.resolutions[index], bucket))
+        if index + 1 == len(levels):
+            return
+        resolution = self.resolutions[index + 1]
+        start = bucket.start - bucket.start % resolution
+        parent = levels[index + 1]
+        if parent is not None and parent.start != start:
+            self._close(key, levels, index + 1, closed)
+            parent = None
+        if parent is None:
+            levels[index + 1] = bucket.copy(start)
+        else:
+            parent.merge(bucket)
+
+
+def choose_resolution(since, until, points, now, resolutions=RESOLUTIONS, retention=RETENTION):
+    """
+    Pick the coarsest resolution that still gives at least `points` buckets over a range.
+
+    Resolutions whose retention does not reach back to `since` are skipped.
+    When no resolution gives enough buckets, the finest usable one is chosen.
+
+    Args:
+        since (float): Range start (epoch seconds).
+        until (float): Range end (epoch seconds).
+        points (int): Number of buckets wanted, e.g. the chart width.
+        now (float): Current time (epoch seconds).
+        resolutions (tuple): Available bucket widths, finest first.
+        retention (dict): Seconds kept per resolution.
+
+    Returns:
+        int: Chosen resolution in seconds.
+    """
+    span = max(0.0, until - since)
+    usable = [resolution for resolution in resolutions if since >= now - retention[resolution]]
+    if not usable:
+        return resolutions[-1]
+    for resolution in reversed(usable):
+        if math.ceil(span / resolution) >= points:
+            return resolution
+    return usable[0]
@@ -0,0 +1,282 @@
+"""
+Persistent per-miner metrics storage on SQLite in WAL mode.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+
+from utils.metric_rollups import FLEET, FLEET_METRICS, RETENTION
+from utils.miner_history import METRICS
+
+
+def _rollup_columns(metrics):
+    return ', '.join(f'{metric}_{part} REAL' for metric in metrics for part in ('min', 'max', 'sum', 'last'))
+
+
+def _rollup_upsert(table, key_columns, metrics):
+    """INSERT that merges a partial bucket into an existing row of the same bucket."""
+    updates = ['count = count + excluded.count']
+    for metric in metrics:
+        updates += [f'{metric}_min = min({metric}_min, excluded.{metric}_min)',
+                    f'{metric}_max = max({metric}_max, excluded.{metric}_max)',
+                    f'{metric}_sum = {metric}_sum + excluded.{metric}_sum',
+                    f'{metric}_last = excluded.{metric}_last']
+    placeholders = ', '.join('?' * (len(key_columns) + 2 + 4 * len(metrics)))
+    return (f"INSERT INTO {table} VALUES ({placeholders}) "
+            f"ON CONFLICT({', '.join(key_columns)}, ts) DO UPDATE SET {', '.join(updates)}")
+
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS miners (
+    id INTEGER PRIMARY KEY,
+    ip TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS samples (
+    miner_id INTEGER NOT NULL,
+    ts REAL NOT NULL,
+    {', '.join(f'{metric} REAL' for metric in METRICS)},
+    PRIMARY KEY (miner_id, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS miner_rollups (
+    miner_id INTEGER NOT NULL,
+    resolution INTEGER NOT NULL,
+    ts REAL NOT NULL,
+    count INTEGER NOT NULL,
+    {_rollup_columns(METRICS)},
+    PRIMARY KEY (miner_id, resolution, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS fleet_rollups (
+    resolution INTEGER NOT NULL,
+    ts REAL NOT NULL,
+    count INTEGER NOT NULL,
+    {_rollup_columns(FLEET_METRICS)},
+    PRIMARY KEY (resolution, ts)
+) WITHOUT ROWID;
+"""
+
+_MINER_ROLLUP_UPSERT = _rollup_upsert('miner_rollups', ('miner_id', 'resolution'), METRICS)
+_FLEET_ROLLUP_UPSERT = _rollup_upsert('fleet_rollups', ('resolution',), FLEET_METRICS)
+
+
+class MetricsStore:
+    """
+    Stores metric samples keyed by (miner, time), and their rollups.
+
+    The samples table is clustered on its (miner_id, ts) primary key, so a
+    range query for one miner reads a contiguous part of the B-tree; the
+    rollup tables are clustered the same way per resolution. Writes are
+    expected from a single writer thread; readers get their own connection
+    per thread and are not blocked by the writer thanks to WAL.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Database file path.
+        """
+        self.path = path
+        self._local = threading.local()
+        self._miner_ids = {}  # IP -> miners.id cache, used by the writer
+        self._enable_incremental_vacuum()
+        connection = self._connection()
+        connection.executescript(_SCHEMA)
+        connection.commit()
+
+    def _enable_incremental_vacuum(self):
+        """
+        Switch the database to incremental auto-vacuum, so compact() returns space to the file system.
+
+        The mode must be set before the file is initialized, which switching to
+        WAL does, so this runs on its own connection first. An existing database
+        in another mode is converted by a one-off VACUUM.
+        """
+        connection = sqlite3.connect(self.path, timeout=10)
+        try:
+            if connection.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:  # INCREMENTAL
+                return
+            connection.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            if connection.execute("SELECT count(*) FROM sqlite_master").fetchone()[0]:
+                logging.info(f"[MetricsStore] Converting {self.path} to incremental auto-vacuum, this may take a while")
+                connection.execute("VACUUM")
+        finally:
+            connection.close()
+
+    def _connection(self):
+        """Return the connection of the calling thread, opening it on first use."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")  # Durable at checkpoints, safe with WAL
+            self._local.connection = connection
+        return connection
+
+    def _miner_id(self, connection, ip):
+        miner_id = self._miner_ids.get(ip)
+        if miner_id is None:
+            connection.execute("INSERT OR IGNORE INTO miners (ip) VALUES (?)", (ip,))
+            miner_id = connection.execute("SELECT id FROM miners WHERE ip = ?", (ip,)).fetchone()[0]
+            self._miner_ids[ip] = miner_id
+        return miner_id
+
+    def write_samples(self, samples):
+        """
+        Write a batch of samples in one transaction.
+
+        Args:
+            samples (Iterable[tuple]): (ip, timestamp, metric values in METRICS order) tuples.
+
+        Returns:
+            int: Number of samples written.
+        """
+        connection = self._connection()
+        with connection:
+            rows = [(self._miner_id(connection, ip), timestamp, *values) for ip, timestamp, values in samples]
+            connection.executemany(
+                f"INSERT OR REPLACE INTO samples VALUES ({', '.join('?' * (2 + len(METRICS)))})", rows)
+        return len(rows)
+
+    def write_rollups(self, buckets):
+        """
+        Write closed rollup buckets in one transaction.
+
+        A bucket that already exists (e.g. a partial bucket written at
+        shutdown) is merged with the new one instead of being replaced.
+
+        Args:
+            buckets (Iterable[tuple]): (series key, resolution, Bucket) tuples, as
+                returned by RollupAggregator.
+
+        Returns:
+            int: Number of buckets written.
+        """
+        connection = self._connection()
+        miner_rows = []
+        fleet_rows = []
+        with connection:
+            for key, resolution, bucket in buckets:
+                if key is FLEET:
+                    fleet_rows.append((resolution, *bucket.as_row()))
+                else:
+                    miner_rows.append((self._miner_id(connection, key), resolution, *bucket.as_row()))
+            if miner_rows:
+                connection.executemany(_MINER_ROLLUP_UPSERT, miner_rows)
+            if fleet_rows:
+                connection.executemany(_FLEET_ROLLUP_UPSERT, fleet_rows)
+        return len(miner_rows) + len(fleet_rows)
+
+    def query_rollups(self, key, metric, resolution, since, until):
+        """
+        Return the rollup buckets of one metric of a series.
+
+        Args:
+            key: Miner IP address, or FLEET.
+            metric (str): One of METRICS (miners) or FLEET_METRICS (fleet).
+            resolution (int): Bucket width in seconds.
+            since (float): Earliest bucket start (epoch seconds).
+            until (float): Latest bucket start (epoch seconds).
+
+        Returns:
+            list: (start, count, min, max, sum, last) tuples in time order.
+
+        Raises:
+            ValueError: If the metric is unknown.
+        """
+        if metric not in (FLEET_METRICS if key is FLEET else METRICS):
+            raise ValueError(f'Unknown metric: `{metric}`')
+        connection = self._connection()
+        # The metric name is checked above, so it is safe to interpolate
+        columns = f"ts, count, {metric}_min, {metric}_max, {metric}_sum, {metric}_last"
+        if key is FLEET:
+            return connection.execute(
+                f"SELECT {columns} FROM fleet_rollups WHERE resolution = ? AND ts >= ? AND ts <= ? ORDER BY ts",
+                (resolution, since, until)).fetchall()
+        row = connection.execute("SELECT id FROM miners WHERE ip = ?", (key,)).fetchone()
+        if row is None:
+            return []
+        return connection.execute(
+            f"SELECT {columns} FROM miner_rollups "
+            f"WHERE miner_id = ? AND resolution = ? AND ts >= ? AND ts <= ? ORDER BY ts",
+            (row[0], resolution, since, until)).fetchall()
+
+    def query(self, ip, metric, since=None, until=None, limit=None):
+        """
+        Return the samples of one metric of one miner.
+
+        Args:
+            ip (str): Miner IP address.
+            metric (str): One of METRICS.
+            since (float): Earliest sample time (epoch seconds).
+            until (float): Latest sample time (epoch seconds).
+            limit (int): Maximum number of (newest) samples.
+
+        Returns:
+            tuple: (timestamps, values) lists, or None if the miner is unknown.
+
+        Raises:
+            ValueError: If the metric is unknown.
+        """
+        if metric not in METRICS:
+            raise ValueError(f'Unknown metric: `{metric}`')
+        connection = self._connection()
+        row = connection.execute("SELECT id FROM miners WHERE ip = ?", (ip,)).fetchone()
+        if row is None:
+            return None
+
+        # The metric name is checked against METRICS above, so it is safe to interpolate
+        sql = f"SELECT ts, {metric} FROM samples WHERE miner_id = ? AND ts >= ? AND ts <= ?"
+        params = [row[0], since if since is not None else 0.0, until if until is not None else float('inf')]
+        if limit is not None:
+            sql = f"SELECT * FROM ({sql} ORDER BY ts DESC LIMIT ?) ORDER BY ts"
+            params.append(limit)
+        else:
+            sql += " ORDER BY ts"
+        rows = connection.execute(sql, params).fetchall()
+        if not rows:
+            return [], []
+        timestamps, values = zip(*rows)
+        return list(timestamps), list(values)
+
+    def compact(self, retention_seconds):
+        """
+        Delete samples older than the retention period and return the space to the file system.
+
+        Rollups are kept for the period of their resolution (see RETENTION).
+
+        Args:
+            retention_seconds (float): Age after which samples are deleted.
+
+        Returns:
+            int: Number of samples and rollup buckets deleted.
+        """
+        now = time.time()
+        cutoff = now - retention_seconds
+        connection = self._connection()
+        deleted = 0
+        with connection:
+            miner_ids = [row[0] for row in connection.execute("SELECT id FROM miners")]
+            for miner_id in miner_ids:
+                # Per-miner deletes use the primary key range instead of scanning the table
+                deleted += connection.execute(
+                    "DELETE FROM samples WHERE miner_id = ? AND ts < ?", (miner_id, cutoff)).rowcount
+                for resolution, keep in RETENTION.items():
+                    deleted += connection.execute(
+                        "DELETE FROM miner_rollups WHERE miner_id = ? AND resolution = ? AND ts < ?",
+                        (miner_id, resolution, now - keep)).rowcount
+            for resolution, keep in RETENTION.items():
+                deleted += connection.execute(
+                    "DELETE FROM fleet_rollups WHERE resolution = ? AND ts < ?", (resolution, now - keep)).rowcount
+        if deleted:
+            # executescript() steps the pragma to completion; execute() would free a single page
+            connection.executescript("PRAGMA incremental_vacuum; PRAGMA wal_checkpoint(TRUNCATE);")
+            logging.info(f"[MetricsStore] Compaction removed {deleted} expired samples and rollup buckets")
+        return deleted
+
+    def close(self):
+        """Close the connection of the calling thread."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
@@ -0,0 +1,366 @@
+"""
+In-memory per-miner time series kept in fixed-capacity ring buffers.
+"""
+
+import threading
+from array import array
+from collections import OrderedDict, deque
+
+from utils.series_codec import ChunkEncoder, iter_chunks
+
+# Metrics recorded for every status packet, as MinerRecord attribute names
+METRICS = ('hashrate', 'temp', 'rssi', 'free_heap', 'shares_accepted', 'shares_rejected')
+
+
+class MetricRing:
+    """
+    Fixed-capacity ring buffer of samples for one miner.
+
+    Timestamps and each metric are stored in their own array('d'), so a miner
+    costs capacity * 8 bytes per column regardless of how long it has run.
+    """
+    __slots__ = ('capacity', 'timestamps', 'columns', 'start', 'size')
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.timestamps = array('d', bytes(8 * capacity))
+        self.columns = {metric: array('d', bytes(8 * capacity)) for metric in METRICS}
+        self.start = 0  # Physical index of the oldest sample
+        self.size = 0
+
+    def append(self, timestamp, record):
+        """
+        Add a sample, overwriting the oldest one when full.
+
+        Args:
+            timestamp (float): Sample time (epoch seconds).
+            record (MinerRecord): Record to take the metric values from.
+        """
+        if self.size < self.capacity:
+            index = (self.start + self.size) % self.capacity
+            self.size += 1
+        else:
+            index = self.start
+            self.start = (self.start + 1) % self.capacity
+        self.timestamps[index] = timestamp
+        for metric, column in self.columns.items():
+            column[index] = getattr(record, metric) or 0.0
+
+    def _timestamp_at(self, position):
+        return self.timestamps[(self.start + position) % self.capacity]
+
+    def _bisect(self, timestamp):
+        """Logical position of the first sample at or after timestamp."""
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self._timestamp_at(middle) < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _copy_range(self, column, first, last):
+        """Copy logical positions [first, last) out of a column, in time order."""
+        begin = (self.start + first) % self.capacity
+        count = last - first
+        if begin + count <= self.capacity:
+            return column[begin:begin + count].tolist()
+        return column[begin:].tolist() + column[:begin + count - self.capacity].tolist()
+
+    def slice(self, metric, since=None, until=None, limit=None):
+        """
+        Return the samples of one metric in a time range.
+
+        Only the requested range is copied out of the buffer.
+
+        Args:
+            metric (str): One of METRICS.
+            since (float): Earliest sample time to include (default: oldest).
+            until (float): Latest sample time to include (default: newest).
+            limit (int): Return at most this many of the newest matching samples.
+
+        Returns:
+            tuple: (timestamps, values) lists.
+        """
+        first = self._bisect(since) if since is not None else 0
+        last = self._bisect(until + 1e-9) if until is not None else self.size
+        if limit is not None and last - first > limit:
+            first = last - limit
+        if first >= last:
+            return [], []
+        return (self._copy_range(self.timestamps, first, last),
+                self._copy_range(self.columns[metric], first, last))
+
+    @property
+    def oldest(self):
+        """Time of the oldest sample, or None when empty."""
+        return self.timestamps[self.start] if self.size else None
+
+    @property
+    def nbytes(self):
+        """Memory used by the sample arrays."""
+        return self.capacity * self.timestamps.itemsize * (1 + len(self.columns))
+
+    @staticmethod
+    def estimate_bytes(capacity):
+        """Memory a ring of the given capacity uses."""
+        return capacity * 8 * (1 + len(METRICS))
+
+    def resize(self, capacity):
+        """
+        Change the capacity, keeping the newest samples that fit.
+
+        Args:
+            capacity (int): New number of samples.
+        """
+        keep = min(self.size, capacity)
+        first = self.size - keep
+        timestamps = array('d', bytes(8 * capacity))
+        timestamps[:keep] = array('d', self._copy_range(self.timestamps, first, self.size))
+        columns = {}
+        for metric, column in self.columns.items():
+            columns[metric] = array('d', bytes(8 * capacity))
+            columns[metric][:keep] = array('d', self._copy_range(column, first, self.size))
+        self.capacity = capacity
+        self.timestamps = timestamps
+        self.columns = columns
+        self.start = 0
+        self.size = keep
+
+
+class CompressedRing:
+    """
+    Bounded per-miner history kept mostly in compressed chunks.
+
+    The newest samples are kept raw in a small MetricRing; each time it fills
+    up it is encoded into a Chunk (see utils.series_codec). Whole chunks are
+    dropped from the old end once the capacity is exceeded, so a miner keeps
+    between capacity - chunk_size and capacity samples; chunk_size is at most
+    half the capacity, so at least half of it is kept.
+    """
+    __slots__ = ('capacity', 'chunk_size', 'chunks', 'recent', 'chunk_samples', 'chunk_bytes')
+
+    # Typical encoded size of one sample of all METRICS (see benchmarks/bench_series_codec.py)
+    BYTES_PER_SAMPLE = 12
+
+    def __init__(self, capacity, chunk_size=120):
+        self.capacity = capacity
+        self.chunk_size = max(1, min(chunk_size, capacity // 2))
+        self.chunks = deque()
+        self.recent = MetricRing(self.chunk_size)
+        self.chunk_samples = 0  # Samples in self.chunks
+        self.chunk_bytes = 0
+
+    @property
+    def size(self):
+        return self.chunk_samples + self.recent.size
+
+    def append(self, timestamp, record):
+        """
+        Add a sample, compressing the recent samples and dropping old chunks as needed.
+
+        Args:
+            timestamp (float): Sample time (epoch seconds).
+            record (MinerRecord): Record to take the metric values from.
+        """
+        recent = self.recent
+        if recent.size == recent.capacity:
+            encoder = ChunkEncoder(METRICS)
+            columns = [recent.columns[metric] for metric in METRICS]
+            for index in range(recent.size):
+                position = (recent.start + index) % recent.capacity
+                encoder.append(recent.timestamps[position], [column[position] for column in columns])
+            chunk = encoder.finish()
+            self.chunks.append(chunk)
+            self.chunk_samples += chunk.count
+            self.chunk_bytes += chunk.nbytes
+            recent.start = recent.size = 0
+            while self.chunks and self.chunk_samples + recent.capacity > self.capacity:
+                dropped = self.chunks.popleft()
+                self.chunk_samples -= dropped.count
+                self.chunk_bytes -= dropped.nbytes
+        recent.append(timestamp, record)
+
+    def slice(self, metric, since=None, until=None, limit=None):
+        """
+        Return the samples of one metric in a time range.
+
+        Only chunks that overlap the range are decoded. Timestamps from
+        compressed chunks are rounded to the millisecond.
+
+        Args:
+            metric (str): One of METRICS.
+            since (float): Earliest sample time to include (default: oldest).
+            until (float): Latest sample time to include (default: newest).
+            limit (int): Return at most this many of the newest matching samples.
+
+        Returns:
+            tuple: (timestamps, values) lists.
+        """
+        timestamps, values = [], []
+        recent_start = self.recent.oldest
+        if self.chunks and (since is None or recent_start is None or since < recent_start):
+            for timestamp, value in iter_chunks(self.chunks, metric, since, until):
+                timestamps.append(timestamp)
+                values.append(value)
+        recent_timestamps, recent_values = self.recent.slice(metric, since, until)
+        timestamps += recent_timestamps
+        values += recent_values
+        if limit is not None and len(timestamps) > limit:
+            return timestamps[-limit:], values[-limit:]
+        return timestamps, values
+
+    @property
+    def oldest(self):
+        """Time of the oldest sample, or None when empty."""
+        return self.chunks[0].start if self.chunks else self.recent.oldest
+
+    @property
+    def nbytes(self):
+        """Memory used by the compressed chunks and the raw recent samples."""
+        return self.chunk_bytes + self.recent.nbytes
+
+    @classmethod
+    def estimate_bytes(cls, capacity, chunk_size=120):
+        """Typical memory a full ring of the given capacity uses."""
+        return capacity * cls.BYTES_PER_SAMPLE + MetricRing.estimate_bytes(max(1, min(chunk_size, capacity // 2)))
+
+    def resize(self, capacity):
+        """
+        Change the capacity, dropping the oldest chunks that no longer fit.
+
+        Args:
+            capacity (int): New number of samples.
+        """
+        self.capacity = capacity
+        chunk_size = max(1, min(self.chunk_size, capacity // 2))
+        if chunk_size < self.chunk_size:
+            self.chunk_size = chunk_size
+            self.recent.resize(chunk_size)
+        while self.chunks and self.chunk_samples + self.recent.capacity > capacity:
+            dropped = self.chunks.popleft()
+            self.chunk_samples -= dropped.count
+            self.chunk_bytes -= dropped.nbytes
+
+
+class HistoryStore:
+    """
+    Ring buffers for every miner within a total memory budget.
+
+    When a new miner would exceed the budget, the capacity of every ring is
+    reduced so the whole fleet fits, keeping the newest samples. The capacity
+    is reduced with headroom for a quarter more miners, so the rings are not
+    resized for every new miner, and it does not grow back when miners leave.
+    Only when even MIN_CAPACITY samples per miner do not fit is the history
+    of the miner that reported least recently dropped.
+    """
+
+    # Samples per miner below which miners are evicted instead (1 minute at 5 s intervals)
+    MIN_CAPACITY = 12
+
+    def __init__(self, capacity=720, max_bytes=32 * 1024 * 1024, compressed=False):
+        """
+        Args:
+            capacity (int): Samples kept per miner (720 = 1 hour at 5 s intervals) while the
+                budget allows it.
+            max_bytes (int): Memory budget for all ring buffers.
+            compressed (bool): Keep older samples in compressed chunks (CompressedRing),
+                which fits far more samples in the same budget at some CPU cost.
+        """
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.ring_class = CompressedRing if compressed else MetricRing
+        self.ring_capacity = capacity  # Current samples per miner, reduced as the fleet grows
+        min_capacity = min(capacity, self.MIN_CAPACITY)
+        self.max_miners = max(1, max_bytes // self.ring_class.estimate_bytes(min_capacity))
+        self._rings = OrderedDict()  # IP -> MetricRing, least recently updated first
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._rings)
+
+    def __contains__(self, ip):
+        return ip in self._rings
+
+    def append(self, record, timestamp):
+        """
+        Record a sample for a miner.
+
+        Args:
+            record (MinerRecord): Updated miner record.
+            timestamp (float): Sample time (epoch seconds).
+        """
+        with self._lock:
+            ring = self._rings.get(record.ip)
+            if ring is None:
+                miners = len(self._rings) + 1
+                if miners * self.ring_class.estimate_bytes(self.ring_capacity) > self.max_bytes:
+                    self._shrink(miners + miners // 4)
+                if len(self._rings) >= self.max_miners:
+                    self._rings.popitem(last=False)
+                ring = self._rings[record.ip] = self.ring_class(self.ring_capacity)
+            else:
+                self._rings.move_to_end(record.ip)
+            ring.append(timestamp, record)
+
+    def _shrink(self, miners):
+        """Reduces the capacity of every ring so that many miners fit the budget. Call with self._lock held."""
+        budget = self.max_bytes // miners
+        low, high = min(self.capacity, self.MIN_CAPACITY), self.ring_capacity
+        while low < high:  # Largest capacity whose estimate fits the per-miner budget
+            middle = (low + high + 1) // 2
+            if self.ring_class.estimate_bytes(middle) <= budget:
+                low = middle
+            else:
+                high = middle - 1
+        if low < self.ring_capacity:
+            self.ring_capacity = low
+            for ring in self._rings.values():
+                ring.resize(low)
+
+    def remove(self, ip):
+        """
+        Drop the history of a miner.
+
+        Args:
+            ip (str): Miner IP address.
+        """
+        with self._lock:
+            self._rings.pop(ip, None)
+
+    def query(self, ip, metric, since=None, until=None, limit=None):
+        """
+        Return the samples of one metric of one miner.
+
+        Args:
+            ip (str): Miner IP address.
+            metric (str): One of METRICS.
+            since (float): Earliest sample time (epoch seconds).
+            until (float): Latest sample time (epoch seconds).
+            limit (int): Maximum number of (newest) samples.
+
+        Returns:
+            tuple: (timestamps, values) lists, or None if the miner has no history.
+
+        Raises:
+            ValueError: If the metric is unknown.
+        """
+        if metric not in METRICS:
+            raise ValueError(f'Unknown metric: `{metric}`')
+        with self._lock:
+            ring = self._rings.get(ip)
+            if ring is None:
+                return None
+            return ring.slice(metric, since, until, limit)
+
+    def oldest_timestamp(self, ip):
+        """Time of the oldest sample kept for a miner, or None."""
+        with self._lock:
+            ring = self._rings.get(ip)
+            return ring.oldest if ring is not None else None
+
+    @property
+    def nbytes(self):
+        """Memory currently used by the ring buffers."""
+        return sum(ring.nbytes for ring in self._rings.values())
@@ -0,0 +1,279 @@
+"""
+Filtering, sorting, keyset pagination and field projection over miner snapshots.
+"""
+
+import base64
+import functools
+import ipaddress
+import json
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+
+# Sortable fields -> numeric key of a MinerRecord
+SORT_FIELDS = {
+    'ip': lambda record: ip_sort_key(record.ip),
+    'hashrate': lambda record: record.hashrate,
+    'temp': lambda record: record.temp,
+    'rssi': lambda record: record.rssi,
+    'free_heap': lambda record: record.free_heap,
+    'shares_accepted': lambda record: record.shares_accepted,
+    'shares_rejected': lambda record: record.shares_rejected,
+    'uptime': lambda record: record.uptime or 0,
+    'last_seen': lambda record: record.last_seen,
+    'seq': lambda record: record.seq,
+}
+
+# Parsed MinerRecord attributes available to fields=, next to the raw packet fields
+RECORD_FIELDS = ('ip', 'state', 'seq', 'hashrate', 'temp', 'rssi', 'free_heap',
+                 'shares_accepted', 'shares_rejected', 'uptime')
+
+
+@functools.lru_cache(maxsize=65536)
+def ip_sort_key(ip):
+    """
+    Numeric sort key of an IP address, so 10.0.0.9 sorts before 10.0.0.10.
+
+    Args:
+        ip (str): IP address.
+
+    Returns:
+        int: The address as an integer, or -1 when it cannot be parsed.
+    """
+    try:
+        return int(ipaddress.ip_address(ip))
+    except ValueError:
+        return -1
+
+
+def _split(value):
+    return {item.strip() for item in value.split(',') if item.strip()}
+
+
+def build_filter(args):
+    """
+    Build a record predicate from query parameters.
+
+    Supported parameters: board, version and state (comma-separated values),
+    pool (substring of PoolInUse), min_temp, max_temp, min_hashrate and
+    max_hashrate (H/s).
+
+    Args:
+        args (Mapping): Query parameters.
+
+    Returns:
+        Callable: Predicate taking a MinerRecord, or None when nothing is filtered.
+
+    Raises:
+        ValueError: If a threshold is not a number.
+    """
+    tests = []
+    if args.get('board'):
+        boards = _split(args['board'])
+        tests.append(lambda record: (record.get('BoardType') or 'Unknown') in boards)
+    if args.get('version'):
+        versions = _split(args['version'])
+        tests.append(lambda record: record.get('Version') in versions)
+    if args.get('state'):
+        states = _split(args['state'])
+        tests.append(lambda record: record.state in states)
+    if args.get('pool'):
+        pool = args['pool'].lower()
+        tests.append(lambda record: pool in str(record.get('PoolInUse', '')).lower())
+    for name, attribute, above in (('min_temp', 'temp', True), ('max_temp', 'temp', False),
+                                   ('min_hashrate', 'hashrate', True), ('max_hashrate', 'hashrate', False)):
+        if args.get(name) not in (None, ''):
+            try:
+                threshold = float(args[name])
+            except ValueError:
+                raise ValueError(f'{name} must be a number')
+            if above:
+                tests.append(lambda record, a=attribute, t=threshold: getattr(record, a) >= t)
+            else:
+                tests.append(lambda record, a=attribute, t=threshold: getattr(record, a) <= t)
+    if not tests:
+        return None
+    return lambda record: all(test(record) for test in tests)
+
+
+def build_selector(selector):
+    """
+    Build a record predicate from a JSON selector, used to pick the targets of fleet operations.
+
+    The selector may hold ips (list of addresses), cidr (network or list of
+    networks) and any build_filter() parameter; board, version and state also
+    accept lists. All given criteria must match.
+
+    Args:
+        selector (dict): Selector object.
+
+    Returns:
+        Callable: Predicate taking a MinerRecord.
+
+    Raises:
+        ValueError: If the selector is empty or malformed.
+    """
+    if not isinstance(selector, dict) or not selector:
+        raise ValueError('selector must be a non-empty object')
+    args = {}
+    tests = []
+    for key, value in selector.items():
+        if key == 'ips':
+            if not isinstance(value, list):
+                raise ValueError('ips must be a list')
+            try:
+                ips = {str(ipaddress.ip_address(ip)) for ip in value}
+            except ValueError as e:
+                raise ValueError(f'Invalid address in ips: {e}')
+            tests.append(lambda record: record.ip in ips)
+        elif key == 'cidr':
+            try:
+                networks = [ipaddress.ip_network(network, strict=False)
+                            for network in (value if isinstance(value, list) else [value])]
+            except (TypeError, ValueError) as e:
+                raise ValueError(f'Invalid cidr: {e}')
+            tests.append(lambda record: ip_sort_key(record.ip) >= 0 and
+                         any(ipaddress.ip_address(record.ip) in network for network in networks))
+        elif key in ('board', 'version', 'state', 'pool', 'min_temp', 'max_temp', 'min_hashrate', 'max_hashrate'):
+            args[key] = ','.join(map(str, value)) if isinstance(value, list) else str(value)
+        else:
+            raise ValueError(f'Unknown selector key `{key}`')
+    predicate = build_filter(args)
+    if predicate is not None:
+        tests.append(predicate)
+    if not tests:
+        raise ValueError('selector has no criteria')
+    return lambda record: all(test(record) for test in tests)
+
+
+def project(record, fields):
+    """
+    Return the requested fields of a record.
+
+    Args:
+        record (MinerRecord): Miner record.
+        fields (Iterable[str]): RECORD_FIELDS names or raw packet field names.
+
+    Returns:
+        dict: Field name -> value; unknown packet fields are omitted.
+    """
+    data = {}
+    for name in fields:
+        if name in RECORD_FIELDS:
+            data[name] = getattr(record, name)
+        else:
+            value = record.get(name)
+            if value is not None:
+                data[name] = value
+    return data
+
+
+def encode_cursor(key):
+    """Encode a (sort key, ip key) tuple as an opaque URL-safe cursor."""
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor made by encode_cursor().
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        value, ip_key = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'Invalid cursor: {e}')
+    if not isinstance(value, (int, float)) or not isinstance(ip_key, int):
+        raise ValueError('Invalid cursor')
+    return value, ip_key
+
+
+class SortedIndex:
+    """
+    Caches the miners of a snapshot sorted by a field.
+
+    Sort keys are built once per snapshot version and field, so paging
+    through a listing costs a binary search plus the page, not a sort per
+    request. Keys are (value, ip key) tuples, negated for descending order,
+    which makes them unique and usable as keyset cursors.
+    """
+
+    def __init__(self, max_entries=16):
+        """
+        Args:
+            max_entries (int): Sorted views kept (one per version, field and direction).
+        """
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def sorted(self, snapshot, field, descending=False):
+        """
+        Return the keys and records of a snapshot in sort order.
+
+        Args:
+            snapshot (MinerSnapshot): Published snapshot.
+            field (str): One of SORT_FIELDS.
+            descending (bool): Sort from highest to lowest.
+
+        Returns:
+            tuple: (keys, records) lists in the same order.
+
+        Raises:
+            ValueError: If the field is not sortable.
+        """
+        if field not in SORT_FIELDS:
+            raise ValueError(f'Cannot sort by `{field}`')
+        cache_key = (snapshot.version, field, descending)
+        with self._lock:
+            entry = self._cache.get(cache_key)
+            if entry is not None:
+                self._cache.move_to_end(cache_key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        value = SORT_FIELDS[field]
+        sign = -1 if descending else 1
+        items = sorted(((sign * value(record), sign * ip_sort_key(record.ip)), record)
+                       for record in snapshot.miners.values())
+        entry = [key for key, _ in items], [record for _, record in items]
+
+        with self._lock:
+            self._cache[cache_key] = entry
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return entry
+
+    def page(self, snapshot, field, descending=False, cursor=None, limit=100, predicate=None):
+        """
+        Return one page of a sorted, filtered listing.
+
+        Args:
+            snapshot (MinerSnapshot): Published snapshot.
+            field (str): One of SORT_FIELDS.
+            descending (bool): Sort from highest to lowest.
+            cursor (str): Cursor of the previous page, or None for the first page.
+            limit (int): Maximum number of records.
+            predicate (Callable): Filter from build_filter(), or None.
+
+        Returns:
+            tuple: (records, next cursor or None).
+
+        Raises:
+            ValueError: If the field or the cursor is invalid.
+        """
+        keys, records = self.sorted(snapshot, field, descending)
+        position = bisect_right(keys, decode_cursor(cursor)) if cursor else 0
+        page = []
+        while position < len(records) and len(page) < limit:
+            record = records[position]
+            if predicate is None or predicate(record):
+                page.append(record)
+            position += 1
+        if len(page) < limit or position >= len(records):
+            return page, None
+        return page, encode_cursor(keys[position - 1])
@@ -0,0 +1,271 @@
+"""
+Compact per-miner record with numeric fields parsed once per packet.
+"""
+
+import time
+from sys import intern
+
+from utils.hashrate_formatter import HashrateFormatter
+from utils.time_format_utils import uptime_to_seconds
+
+_hasher = HashrateFormatter()
+
+# Miner states, in the order a silent miner moves through them
+ONLINE = 'online'
+STALE = 'stale'
+OFFLINE = 'offline'
+
+
+def parse_hashrate(value):
+    """
+    Parse a hashrate value into hashes per second.
+
+    Args:
+        value (str | int | float): Hashrate as reported by the firmware (e.g. '1.05MH/s').
+
+    Returns:
+        float: Hashes per second, or 0.0 if the value cannot be parsed.
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not value or value == '0':
+        return 0.0
+    try:
+        return _hasher.convert_hashrate(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def parse_share(value):
+    """
+    Parse a share string into its parts.
+
+    Args:
+        value (str): Share string as 'rejected/accepted' or 'rejected/accepted (percentage%)'.
+
+    Returns:
+        tuple: (rejected, accepted, percentage) where percentage is the text in
+            parentheses or None, or None if the value cannot be parsed.
+    """
+    if not isinstance(value, str) or '/' not in value:
+        return None
+    try:
+        percentage = None
+        if '(' in value and ')' in value:
+            value, percentage = value.split('(', 1)
+            percentage = percentage.replace(')', '').strip()
+        rejected, accepted = value.strip().split('/')
+        return int(rejected), int(accepted), percentage
+    except (ValueError, IndexError):
+        return None
+
+
+def _to_float(value, default=0.0):
+    """Convert a firmware value to float, falling back to default."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _to_number(value, default=0):
+    """Keep numeric firmware values as sent, converting strings to float."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return _to_float(value, default)
+
+
+# Status fields kept only in parsed form; get() and to_dict() rebuild them
+PARSED_KEYS = frozenset(('HashRate', 'Temp', 'RSSI', 'FreeHeap', 'Uptime', 'Share'))
+
+
+class MinerRecord:
+    """
+    State of one miner.
+
+    `fields` holds the merged packet fields as received (used by the config page
+    and API) except PARSED_KEYS: the status fields that change with every packet
+    are parsed once when it arrives and kept as numbers, plus the HashRate and
+    Uptime text which views show as sent. get() and to_dict() return them like
+    the other fields.
+    """
+    __slots__ = (
+        'ip', 'fields', 'hashrate', 'hashrate_text', 'shares_rejected', 'shares_accepted', 'share_percent',
+        'share_text', 'uptime', 'uptime_text', 'temp', 'rssi', 'free_heap', 'last_seen', 'state', 'seq',
+    )
+
+    def __init__(self, ip, fields, last_seen=None, previous=None):
+        """
+        Create a record from packet fields.
+
+        Args:
+            ip (str): Miner IP address.
+            fields (dict): Packet fields; the dict is not modified.
+            last_seen (float): time.monotonic() of the last packet (default: now).
+            previous (MinerRecord): Record the packet is merged into (see merge()), or None.
+        """
+        self.ip = ip
+        if previous is None:
+            # Keys and string values are interned: most (pools, versions, board types) repeat across the fleet
+            self.fields = {intern(key): intern(value) if type(value) is str else value
+                           for key, value in fields.items() if key not in PARSED_KEYS}
+        else:
+            merged = self.fields = previous.fields.copy()  # Existing keys keep their interned objects
+            for key, value in fields.items():
+                # Only meaningful values replace stored ones, and only changed ones need interning
+                if value and key not in PARSED_KEYS and merged.get(key) != value:
+                    merged[intern(key)] = intern(value) if type(value) is str else value
+        self.last_seen = time.monotonic() if last_seen is None else last_seen
+        self.state = ONLINE
+        self.seq = 0  # Change sequence number, assigned by the owner of the miner map
+        self._parse(fields, previous)
+
+    def _parse(self, fields, previous):
+        """Set the parsed status attributes, keeping those of `previous` the packet does not update."""
+        get = fields.get
+        value = get('HashRate')
+        if previous is None or value:
+            self.hashrate = parse_hashrate(value)
+            self.hashrate_text = value
+        else:
+            self.hashrate = previous.hashrate
+            self.hashrate_text = previous.hashrate_text
+
+        value = get('Temp')
+        self.temp = _to_float(value) if previous is None or value else previous.temp
+        value = get('RSSI')
+        self.rssi = _to_number(value) if previous is None or value else previous.rssi
+        value = get('FreeHeap')
+        self.free_heap = _to_float(value) if previous is None or value else previous.free_heap
+
+        value = get('Uptime')
+        if previous is None or value:
+            self.uptime = uptime_to_seconds('0' if value is None else value)
+            self.uptime_text = value
+        else:
+            self.uptime = previous.uptime
+            self.uptime_text = previous.uptime_text
+
+        share = get('Share')
+        if previous is not None and not share:
+            self.shares_rejected, self.shares_accepted = previous.shares_rejected, previous.shares_accepted
+            self.share_percent, self.share_text = previous.share_percent, previous.share_text
+            return
+        share = '0/0' if share is None else share
+        parsed = parse_share(share)
+        if parsed:
+            self.shares_rejected, self.shares_accepted, self.share_percent = parsed
+            self.share_text = None
+        else:
+            self.shares_rejected = self.shares_accepted = 0
+            self.share_percent = None
+            self.share_text = str(share)  # Unparseable, shown as received
+
+    def merge(self, json_data, last_seen=None):
+        """
+        Create the next record for this miner from a new packet.
+
+        Fields in the packet replace existing ones only when they carry a
+        meaningful (truthy: non-empty, non-zero) value. The current record is not modified.
+
+        Args:
+            json_data (dict): Decoded packet.
+            last_seen (float): time.monotonic() of the packet (default: now).
+
+        Returns:
+            MinerRecord: The merged record.
+        """
+        return MinerRecord(self.ip, json_data, last_seen, self)
+
+    def with_state(self, state):
+        """
+        Create a copy of this record in another state.
+
+        Args:
+            state (str): ONLINE, STALE or OFFLINE.
+
+        Returns:
+            MinerRecord: The copy; the current record is not modified.
+        """
+        record = MinerRecord.__new__(MinerRecord)
+        for name in MinerRecord.__slots__:
+            setattr(record, name, getattr(self, name))
+        record.state = state
+        return record
+
+    @property
+    def is_online(self):
+        """True unless the miner has gone offline."""
+        return self.state != OFFLINE
+
+    def age(self, now=None):
+        """
+        Seconds since the last packet.
+
+        Args:
+            now (float): Current time.monotonic() (default: now).
+        """
+        return max(0.0, (time.monotonic() if now is None else now) - self.last_seen)
+
+    @property
+    def updated_at(self):
+        """Wall-clock time of the last packet."""
+        return time.time() - self.age()
+
+    @property
+    def has_status(self):
+        """True once a status packet (with HashRate or Uptime) has been merged."""
+        return self.hashrate_text is not None or self.uptime_text is not None
+
+    def status_fields(self):
+        """
+        Return the PARSED_KEYS fields, rebuilt from the parsed values.
+
+        Returns:
+            dict: HashRate and Uptime as sent, Share as formatted by share_display()
+                and the numeric Temp, RSSI and FreeHeap; empty before the first
+                status packet.
+        """
+        if not self.has_status:
+            return {}
+        return {key: value for key, value in ((key, getter(self)) for key, getter in _STATUS_GETTERS.items())
+                if value is not None}
+
+    def to_dict(self):
+        """
+        Return the raw packet fields plus the formatted last update time.
+
+        Returns:
+            dict: Packet fields with 'UpdateTime' as 'YYYY-MM-DD HH:MM:SS'.
+        """
+        data = dict(self.fields)
+        data.update(self.status_fields())
+        data['UpdateTime'] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.updated_at))
+        return data
+
+    def get(self, key, default=None):
+        """Dictionary-style access to the packet fields, including PARSED_KEYS."""
+        getter = _STATUS_GETTERS.get(key)
+        if getter is None:
+            return self.fields.get(key, default)
+        value = getter(self) if self.has_status else None
+        return default if value is None else value
+
+    def share_display(self):
+        """Format the share counters the way the firmware reports them."""
+        if self.share_text is not None:
+            return self.share_text
+        if self.share_percent is not None:
+            return f'{self.shares_rejected}/{self.shares_accepted} ({self.share_percent})'
+        return f'{self.shares_rejected}/{self.shares_accepted}'
+
+
+# How get() and status_fields() rebuild each of PARSED_KEYS
+_STATUS_GETTERS = {
+    'HashRate': lambda record: record.hashrate_text,
+    'Share': MinerRecord.share_display,
+    'Temp': lambda record: record.temp,
+    'RSSI': lambda record: record.rssi,
+    'FreeHeap': lambda record: record.free_heap,
+    'Uptime': lambda record: record.uptime_text,
+}
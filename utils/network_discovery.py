@@ -9,7 +9,9 @@ import threading
 import time
 import logging
 from dataclasses import dataclass, asdict
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
+
+from utils.timing_wheel import TimingWheel
 
 
 @dataclass
@@ -34,9 +36,18 @@ class NetworkDevice:
     version: str = ""
     board_type: str = ""
     pool_in_use: str = ""
-    update_time: str = ""
+    last_seen: float = 0.0  # time.monotonic() of the last status update
+    state: str = "online"  # online -> stale -> offline as updates stop arriving
     config: Optional[Dict] = None
 
+    @property
+    def update_time(self) -> str:
+        """Wall-clock time of the last status update, formatted on demand."""
+        if not self.last_seen:
+            return ""
+        seen = time.time() - (time.monotonic() - self.last_seen)
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(seen))
+
 
 class NetworkDeviceManager:
     """Manages network device discovery and configuration."""
@@ -45,13 +56,31 @@ class NetworkDeviceManager:
     CONFIG_PORT = 12346  # Port for device configuration updates  
     COMMAND_PORT = 12347  # Port for sending commands to devices
     
-    def __init__(self):
+    def __init__(self, stale_after: int = 60, offline_after: int = 120):
         self.devices: Dict[str, NetworkDevice] = {}
         self.device_configs: Dict[str, Dict] = {}
+        self.stale_after = stale_after
+        self.offline_after = offline_after
         self._listening = False
         self._status_thread = None
         self._config_thread = None
+        self._lock = threading.Lock()  # Guards the expiry indexes
+        # Last-seen index per state, so cleanup only touches expiring devices
+        self._expiry = {state: TimingWheel() for state in ("online", "stale", "offline")}
+        self._listeners: List[Callable[[str, NetworkDevice], None]] = []
         self.logger = logging.getLogger(__name__)
+
+    def add_listener(self, callback: Callable[[str, NetworkDevice], None]):
+        """Register a callback(event, device) for "online", "stale", "offline" and "removed" events."""
+        self._listeners.append(callback)
+
+    def _emit(self, event: str, device: NetworkDevice):
+        """Deliver a device event to the listeners."""
+        for callback in list(self._listeners):
+            try:
+                callback(event, device)
+            except Exception as e:
+                self.logger.error(f"Error in device event listener: {e}")
         
     def start_listening(self):
         """Start listening for device updates."""
@@ -128,7 +157,8 @@ class NetworkDeviceManager:
             ip = addr[0]
             
             # Update existing device or create new one
-            if ip in self.devices:
+            is_new = ip not in self.devices
+            if not is_new:
                 device = self.devices[ip]
             else:
                 device = NetworkDevice(ip=ip)
@@ -150,8 +180,15 @@ class NetworkDeviceManager:
             device.version = status.get('Version', device.version)
             device.board_type = status.get('BoardType', device.board_type)
             device.pool_in_use = status.get('PoolInUse', device.pool_in_use)
-            device.update_time = time.strftime("%Y-%m-%d %H:%M:%S")
+            device.last_seen = time.monotonic()
+            previous_state = device.state
+            device.state = "online"
             device.is_online = True
+            with self._lock:
+                self._expiry[previous_state].discard(ip)
+                self._expiry["online"].add(ip, device.last_seen)
+            if is_new or previous_state != "online":
+                self._emit("online", device)
             
             if not device.device_id and device.board_type:
                 device.device_id = device.board_type
@@ -271,21 +308,33 @@ class NetworkDeviceManager:
         return miner_map
         
     def cleanup_offline_devices(self, timeout_seconds: int = 300):
-        """Remove devices that haven't been seen for a while."""
-        current_time = time.time()
-        to_remove = []
-        
-        for ip, device in self.devices.items():
-            if device.update_time:
-                try:
-                    device_time = time.mktime(time.strptime(device.update_time, "%Y-%m-%d %H:%M:%S"))
-                    if current_time - device_time > timeout_seconds:
-                        to_remove.append(ip)
-                except ValueError:
-                    pass  # Invalid time format, keep device
-                    
-        for ip in to_remove:
-            del self.devices[ip]
-            if ip in self.device_configs:
-                del self.device_configs[ip]
-            self.logger.info(f"Removed offline device {ip}")
\ No newline at end of file
+        """
+        Move silent devices from online to stale to offline, and remove devices
+        that haven't been seen for timeout_seconds.
+        """
+        now = time.monotonic()
+        events = []
+        with self._lock:
+            for ip in self._expiry["online"].pop_until(now - self.stale_after):
+                device = self.devices[ip]
+                device.state = "stale"
+                self._expiry["stale"].add(ip, device.last_seen)
+                events.append(("stale", device))
+
+            for ip in self._expiry["stale"].pop_until(now - self.offline_after):
+                device = self.devices[ip]
+                device.state = "offline"
+                device.is_online = False
+                self._expiry["offline"].add(ip, device.last_seen)
+                events.append(("offline", device))
+
+            # Devices may be removed from any state when the timeout is shorter than the others
+            for state in ("online", "stale", "offline"):
+                for ip in self._expiry[state].pop_until(now - timeout_seconds):
+                    device = self.devices.pop(ip)
+                    self.device_configs.pop(ip, None)
+                    events.append(("removed", device))
+                    self.logger.info(f"Removed offline device {ip}")
+
+        for event, device in events:
+            self._emit(event, device)
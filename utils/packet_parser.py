@@ -0,0 +1,86 @@
+"""
+Fast-path parser for NMMiner UDP packets.
+
+Datagrams are received into a preallocated buffer and decoded straight from a
+memoryview, so the payload is not copied to a str and stripped several times
+before reaching the JSON decoder. orjson is used when it is installed.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:  # Optional dependency
+    orjson = None
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+MAX_PACKET_SIZE = 4096
+
+# Trailing bytes stripped from a payload: NUL padding and ASCII whitespace
+_STRIP_BYTES = b"\x00 \t\r\n"
+_CLOSING_BRACE = ord("}")
+
+
+class TruncatedPacketError(ValueError):
+    """Raised when a datagram does not contain a complete JSON object."""
+
+
+def _loads(view):
+    """Decode JSON from a bytes-like object with the fastest available backend."""
+    if orjson is not None:
+        return orjson.loads(view)
+    return json.loads(bytes(view))
+
+
+def decode_packet(data):
+    """
+    Decode a raw NMMiner datagram into a dictionary without intermediate str copies.
+
+    Args:
+        data (bytes | bytearray | memoryview): Raw UDP payload.
+
+    Returns:
+        dict: Decoded JSON object.
+
+    Raises:
+        TruncatedPacketError: If the payload does not end with a closing brace.
+        json.JSONDecodeError: If the payload is not valid JSON.
+    """
+    view = data if isinstance(data, memoryview) else memoryview(data)
+    if not view or view[-1] != _CLOSING_BRACE:
+        # Slow path: padded or truncated payload, strip it the same way as the str path did
+        view = memoryview(view.tobytes().rstrip(_STRIP_BYTES))
+
+        # Check if the JSON appears to be truncated (doesn't end with '}')
+        if not view or view[-1] != _CLOSING_BRACE:
+            tail = view[-10:].tobytes().decode("utf-8", errors="replace")
+            raise TruncatedPacketError(f"length={len(view)}, ends with='{tail}'")
+
+    return _loads(view)
+
+
+class PacketReceiver:
+    """
+    Receives datagrams into a single preallocated buffer.
+
+    The memoryview returned by receive() is only valid until the next call,
+    so callers must decode it before receiving again.
+    """
+
+    def __init__(self, size=MAX_PACKET_SIZE):
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+
+    def receive(self, sock):
+        """
+        Receive one datagram from a socket.
+
+        Args:
+            sock (socket.socket): Socket to read from.
+
+        Returns:
+            tuple: (memoryview of the payload, sender address).
+        """
+        nbytes, addr = sock.recvfrom_into(self.buffer)
+        return self.view[:nbytes], addr
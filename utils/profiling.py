@@ -0,0 +1,177 @@
+"""
+On-demand profiling of a running server.
+
+sample_stacks() samples the stacks of every thread (ingest, web server,
+background threads) at a fixed interval, which costs nothing while it is
+not running and little while it is. ThreadProfiler runs cProfile inside one
+thread for exact call counts, by handing the start and stop to that thread.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+# Innermost Python frames of threads that are waiting rather than working. Threads
+# blocked in a C call (e.g. select.select() in UdpThread.receive_data) cannot be told
+# apart from busy ones, so the self samples of such callers include the wait.
+IDLE_FRAMES = {'threading.py:wait', 'threading.py:_wait_for_tstate_lock', 'selectors.py:select',
+               'wasyncore.py:poll', 'queue.py:get'}
+
+
+def _frame_name(code):
+    return f'{os.path.basename(code.co_filename)}:{code.co_name}'
+
+
+def sample_stacks(seconds, interval=0.005, include_idle=False):
+    """
+    Sample the Python stacks of all other threads.
+
+    Args:
+        seconds (float): Sampling duration.
+        interval (float): Seconds between samples.
+        include_idle (bool): Keep samples of threads whose innermost frame is in IDLE_FRAMES.
+
+    Returns:
+        dict: 'samples' (number of sampling rounds), 'stacks' (Counter of
+            collapsed "thread;outer;...;inner" stacks), 'self' and 'total'
+            (Counter of function -> samples where it was innermost / anywhere
+            on the stack).
+    """
+    me = threading.get_ident()
+    names = {}
+    stacks = Counter()
+    deadline = time.monotonic() + seconds
+    rounds = 0
+    while time.monotonic() < deadline:
+        frames = sys._current_frames()
+        if len(names) != len(frames):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in frames.items():
+            if ident == me:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            if not include_idle and stack[0] in IDLE_FRAMES:
+                continue
+            stack.append(names.get(ident, str(ident)))
+            stacks[';'.join(reversed(stack))] += 1
+        rounds += 1
+        time.sleep(interval)
+
+    own, total = Counter(), Counter()
+    for stack, count in stacks.items():
+        functions = stack.split(';')[1:]
+        own[functions[-1]] += count
+        for function in set(functions):
+            total[function] += count
+    return {'samples': rounds, 'stacks': stacks, 'self': own, 'total': total}
+
+
+def format_samples(result, limit=30):
+    """
+    Format the result of sample_stacks() as a text report.
+
+    Args:
+        result (dict): Result of sample_stacks().
+        limit (int): Functions listed per table.
+
+    Returns:
+        str: Report with the top functions by self and total samples.
+    """
+    observed = sum(result['self'].values())
+    lines = [f'{result["samples"]} sampling rounds, {observed} busy thread samples', '']
+    for title, counter in (('self', result['self']), ('total', result['total'])):
+        lines.append(f'{title:>8} {"%":>6}  function')
+        for function, count in counter.most_common(limit):
+            lines.append(f'{count:>8} {count / max(1, observed) * 100:>5.1f}%  {function}')
+        lines.append('')
+    return '\n'.join(lines)
+
+
+class ThreadProfiler:
+    """
+    Runs cProfile inside a worker thread on request.
+
+    cProfile only sees the thread that enabled it, so a request thread calls
+    profile(), and the profiled thread calls poll() from its loop, which
+    enables the profiler on the first call after the request and disables it
+    on the first call after the duration has passed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seconds = None  # Requested duration, until the profiled thread picks it up
+        self._profile = None
+        self._deadline = 0.0
+        self._started = 0.0
+        self._done = threading.Event()
+        self._result = None
+
+    def poll(self):
+        """Start or stop a requested profile. Call regularly from the profiled thread."""
+        if self._seconds is None and self._profile is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if self._profile is None:
+                self._profile = cProfile.Profile()
+                self._started = now
+                self._deadline = now + self._seconds
+                self._seconds = None
+                self._profile.enable()
+            elif now >= self._deadline:
+                self._profile.disable()
+                self._result = (self._profile, now - self._started)
+                self._profile = None
+                self._done.set()
+
+    def profile(self, seconds, timeout=None):
+        """
+        Profile the worker thread for a duration.
+
+        Args:
+            seconds (float): Profiling duration.
+            timeout (float): Maximum seconds to wait for the result (default: seconds + 10).
+
+        Returns:
+            tuple: (pstats.Stats, seconds actually profiled), or None when the
+                thread did not poll in time or another profile is running.
+        """
+        with self._lock:
+            if self._seconds is not None or self._profile is not None:
+                return None
+            self._done.clear()
+            self._result = None
+            self._seconds = seconds
+        if not self._done.wait(seconds + 10 if timeout is None else timeout):
+            with self._lock:
+                if self._seconds is not None:
+                    self._seconds = None  # Never picked up
+            return None
+        profile, duration = self._result
+        return pstats.Stats(profile), duration
+
+
+def format_stats(stats, sort='cumulative', limit=30):
+    """
+    Format pstats.Stats as text.
+
+    Args:
+        stats (pstats.Stats): Profile statistics.
+        sort (str): pstats sort key, e.g. 'cumulative', 'tottime' or 'calls'.
+        limit (int): Functions listed.
+
+    Returns:
+        str: The pstats report.
+    """
+    output = io.StringIO()
+    stats.stream = output
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return output.getvalue()
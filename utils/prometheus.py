@@ -0,0 +1,135 @@
+"""
+Prometheus text exposition of miner and controller metrics.
+
+Per-miner lines are rendered once per miner change (MinerRecord.seq) and
+reused across scrapes, so a scrape of a large, mostly unchanged fleet only
+joins cached strings.
+"""
+
+import math
+import threading
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# (name, type, help, value of a MinerRecord or None to omit the sample)
+MINER_METRICS = (
+    ('nmminer_hashrate_hashes_per_second', 'gauge', 'Reported hashrate in H/s.',
+     lambda record: record.hashrate),
+    ('nmminer_temperature_celsius', 'gauge', 'Board temperature.',
+     lambda record: record.temp),
+    ('nmminer_wifi_rssi_dbm', 'gauge', 'WiFi signal strength.',
+     lambda record: record.rssi),
+    ('nmminer_free_heap_kilobytes', 'gauge', 'Free heap reported by the firmware.',
+     lambda record: record.free_heap),
+    ('nmminer_shares_accepted_total', 'counter', 'Accepted shares since the miner started.',
+     lambda record: record.shares_accepted),
+    ('nmminer_shares_rejected_total', 'counter', 'Rejected shares since the miner started.',
+     lambda record: record.shares_rejected),
+    ('nmminer_uptime_seconds', 'gauge', 'Miner uptime.',
+     lambda record: record.uptime),
+    ('nmminer_online', 'gauge', '1 while the miner reports, 0 once it is offline.',
+     lambda record: 1 if record.is_online else 0),
+)
+
+
+def escape_label(value):
+    """Escape a label value for the text exposition format."""
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def format_value(value):
+    """Format a sample value; integers stay integers, non-finite floats use Prometheus spelling."""
+    if isinstance(value, float):
+        if math.isnan(value):
+            return 'NaN'
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    return str(int(value))
+
+
+def format_labels(labels):
+    """Format a label dictionary as `{name="value",...}`, or '' when there are none."""
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in labels.items()) + '}'
+
+
+def format_family(name, metric_type, help_text, samples):
+    """
+    Format one metric family.
+
+    Args:
+        name (str): Metric name.
+        metric_type (str): 'gauge', 'counter' or 'summary'.
+        help_text (str): HELP line text.
+        samples (Iterable[tuple]): (labels dict, value) pairs, or (suffix, labels dict,
+            value) triples for the _sum/_count samples of a summary.
+
+    Returns:
+        str: Exposition lines, newline terminated.
+    """
+    lines = [f'# HELP {name} {help_text}\n', f'# TYPE {name} {metric_type}\n']
+    for sample in samples:
+        suffix, labels, value = sample if len(sample) == 3 else ('', *sample)
+        lines.append(f'{name}{suffix}{format_labels(labels)} {format_value(value)}\n')
+    return ''.join(lines)
+
+
+class MinerExposition:
+    """
+    Renders the per-miner metric families of a snapshot, reusing the lines of
+    miners that did not change since the previous scrape.
+    """
+
+    def __init__(self):
+        self._fragments = {}  # IP -> (seq, one line or None per MINER_METRICS entry)
+        self._version = None
+        self._text = ''
+        self._lock = threading.Lock()
+        self.rendered = 0  # Miners whose lines were rendered
+        self.reused = 0  # Miners whose cached lines were reused
+
+    @staticmethod
+    def _render_miner(record):
+        labels = format_labels({'ip': record.ip, 'board': record.get('BoardType') or 'Unknown'})
+        lines = []
+        for name, _, _, value in MINER_METRICS:
+            sample = value(record)
+            lines.append(None if sample is None else f'{name}{labels} {format_value(sample)}\n')
+        return tuple(lines)
+
+    def render(self, snapshot):
+        """
+        Return the exposition text of every miner in a snapshot.
+
+        Args:
+            snapshot (MinerSnapshot): Published snapshot.
+
+        Returns:
+            str: Metric families, grouped by metric as the format requires.
+        """
+        with self._lock:
+            if snapshot.version == self._version:
+                return self._text
+
+            previous = self._fragments
+            fragments = {}
+            for ip, record in snapshot.miners.items():
+                entry = previous.get(ip)
+                if entry is None or entry[0] != record.seq:
+                    entry = (record.seq, self._render_miner(record))
+                    self.rendered += 1
+                else:
+                    self.reused += 1
+                fragments[ip] = entry
+
+            parts = []
+            for index, (name, metric_type, help_text, _) in enumerate(MINER_METRICS):
+                parts.append(f'# HELP {name} {help_text}\n# TYPE {name} {metric_type}\n')
+                parts.extend(lines[index] for _, lines in fragments.values() if lines[index] is not None)
+
+            self._fragments = fragments
+            self._version = snapshot.version
+            self._text = ''.join(parts)
+            return self._text
@@ -0,0 +1,115 @@
+"""
+Short-lived cache of rendered responses with single-flight re-rendering.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Flight:
+    """A render in progress that other requests for the same key wait on."""
+    __slots__ = ('done', 'value', 'failed')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.failed = False
+
+
+class RenderCache:
+    """
+    Caches rendered values by key for at most max_age seconds.
+
+    The key identifies the data a render depends on (e.g. the miner snapshot
+    version and the BTC values), so a new data generation is a miss at once;
+    max_age bounds how long time-dependent output such as "last seen"
+    columns may be reused. When an entry is missing or stale, the first
+    request renders it and concurrent requests for the same key wait for that
+    render instead of repeating it.
+    """
+
+    def __init__(self, max_age=1.0, max_entries=8):
+        """
+        Args:
+            max_age (float): Seconds a rendered value is reused; 0 disables caching.
+            max_entries (int): Number of keys kept.
+        """
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # Key -> (value, monotonic render time)
+        self._flights = {}  # Key -> _Flight
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0  # Requests that waited for another request's render
+
+    def get(self, key, render):
+        """
+        Return the cached value of a key, rendering it when needed.
+
+        Args:
+            key (Hashable): Identity of the data the value is rendered from.
+            render (Callable): Renders the value; called without arguments.
+
+        Returns:
+            The cached or freshly rendered value.
+        """
+        if self.max_age <= 0:
+            with self._lock:
+                self.misses += 1
+            return render()
+
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and time.monotonic() - entry[1] < self.max_age:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+                    self.misses += 1
+                else:
+                    self.shared += 1
+
+            if not leader:
+                flight.done.wait()
+                if not flight.failed:
+                    return flight.value
+                continue  # The render failed: try again, possibly as the new leader
+
+            try:
+                flight.value = render()
+            except BaseException:
+                flight.failed = True
+                raise
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                    if not flight.failed:
+                        self._entries[key] = (flight.value, time.monotonic())
+                        self._entries.move_to_end(key)
+                        while len(self._entries) > self.max_entries:
+                            self._entries.popitem(last=False)
+                flight.done.set()
+            return flight.value
+
+    def stats(self):
+        """
+        Return the cache counters.
+
+        Returns:
+            dict: hits, misses, shared renders, entries and hit ratio.
+        """
+        with self._lock:
+            requests = self.hits + self.misses + self.shared
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'shared': self.shared,
+                'entries': len(self._entries),
+                'hit_ratio': (self.hits + self.shared) / requests if requests else 0.0,
+            }
@@ -0,0 +1,326 @@
+"""
+Gorilla-style compressed chunks of time series samples.
+
+Timestamps are stored as delta-of-deltas of milliseconds and values as the XOR
+with the previous value of the same metric, both in variable-length bit codes.
+Regular 5 s reporting intervals then cost a few bits per timestamp, and slowly
+changing metrics a few bits per value instead of 8 bytes.
+"""
+
+import struct
+
+_DOUBLE = struct.Struct('>d')
+_UINT64 = struct.Struct('>Q')
+_MASK64 = (1 << 64) - 1
+
+
+class BitWriter:
+    """Appends variable-width unsigned integers to a byte buffer, most significant bit first."""
+    __slots__ = ('buffer', '_acc', '_bits', 'length')
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self._acc = 0  # Bits not yet written to the buffer
+        self._bits = 0
+        self.length = 0  # Total bits written
+
+    def write(self, value, bits):
+        """
+        Append the low `bits` bits of a non-negative integer.
+
+        Args:
+            value (int): Value to write.
+            bits (int): Number of bits.
+        """
+        self._acc = (self._acc << bits) | value
+        self._bits += bits
+        self.length += bits
+        if self._bits >= 64:
+            spare = self._bits & 7
+            self.buffer += (self._acc >> spare).to_bytes((self._bits - spare) >> 3, 'big')
+            self._acc &= (1 << spare) - 1
+            self._bits = spare
+
+    def getvalue(self):
+        """Return the written bits as bytes, padded with zero bits to a whole byte."""
+        if not self._bits:
+            return bytes(self.buffer)
+        pad = -self._bits & 7
+        return bytes(self.buffer) + (self._acc << pad).to_bytes((self._bits + pad) >> 3, 'big')
+
+
+class TimestampEncoder:
+    """Streams timestamps as delta-of-deltas of whole milliseconds."""
+    __slots__ = ('writer', '_previous', '_delta', 'count')
+
+    def __init__(self):
+        self.writer = BitWriter()
+        self._previous = None
+        self._delta = 0
+        self.count = 0
+
+    def append(self, timestamp):
+        """
+        Encode the next timestamp.
+
+        Args:
+            timestamp (float): Epoch seconds, rounded to the millisecond; must not decrease.
+        """
+        millis = round(timestamp * 1000)
+        writer = self.writer
+        if self._previous is None:
+            writer.write(millis & _MASK64, 64)
+        else:
+            delta = millis - self._previous
+            dod = delta - self._delta
+            self._delta = delta
+            if dod == 0:
+                writer.write(0, 1)
+            elif -64 <= dod <= 63:
+                writer.write(0b10 << 7 | (dod & 0x7f), 9)
+            elif -256 <= dod <= 255:
+                writer.write(0b110 << 9 | (dod & 0x1ff), 12)
+            elif -2048 <= dod <= 2047:
+                writer.write(0b1110 << 12 | (dod & 0xfff), 16)
+            else:
+                writer.write(0b1111, 4)
+                writer.write(dod & _MASK64, 64)
+        self._previous = millis
+        self.count += 1
+
+
+def _signed(value, bits):
+    return value - (1 << bits) if value >= 1 << (bits - 1) else value
+
+
+def iter_timestamps(data, count):
+    """
+    Decode timestamps written by TimestampEncoder.
+
+    The stream is read as one integer with a bit cursor counting down from
+    the end, which is much cheaper in Python than reading byte by byte.
+
+    Args:
+        data (bytes): Encoded stream.
+        count (int): Number of timestamps in the stream.
+
+    Yields:
+        float: Epoch seconds.
+    """
+    if not count:
+        return
+    stream = int.from_bytes(data, 'big')
+    cursor = len(data) * 8 - 64  # Bit offset of the next code, from the least significant bit
+    millis = _signed(stream >> cursor, 64)
+    delta = 0
+    yield millis / 1000
+    for _ in range(count - 1):
+        cursor -= 1
+        if not (stream >> cursor) & 1:
+            dod = 0
+        else:
+            cursor -= 1
+            if not (stream >> cursor) & 1:
+                cursor -= 7
+                dod = _signed((stream >> cursor) & 0x7f, 7)
+            else:
+                cursor -= 1
+                if not (stream >> cursor) & 1:
+                    cursor -= 9
+                    dod = _signed((stream >> cursor) & 0x1ff, 9)
+                else:
+                    cursor -= 1
+                    if not (stream >> cursor) & 1:
+                        cursor -= 12
+                        dod = _signed((stream >> cursor) & 0xfff, 12)
+                    else:
+                        cursor -= 64
+                        dod = _signed((stream >> cursor) & _MASK64, 64)
+        delta += dod
+        millis += delta
+        yield millis / 1000
+
+
+class ValueEncoder:
+    """Streams float64 values as the XOR with the previous value."""
+    __slots__ = ('writer', '_previous', '_leading', '_trailing', 'count')
+
+    def __init__(self):
+        self.writer = BitWriter()
+        self._previous = None
+        self._leading = -1  # Leading zeros of the current meaningful bit block, -1 when none
+        self._trailing = 0
+        self.count = 0
+
+    def append(self, value):
+        """
+        Encode the next value.
+
+        Args:
+            value (float): Value to encode (stored bit-exact).
+        """
+        bits = _UINT64.unpack(_DOUBLE.pack(value))[0]
+        writer = self.writer
+        if self._previous is None:
+            writer.write(bits, 64)
+        else:
+            xor = bits ^ self._previous
+            if not xor:
+                writer.write(0, 1)
+            else:
+                leading = min(64 - xor.bit_length(), 31)
+                trailing = (xor & -xor).bit_length() - 1
+                if self._leading >= 0 and leading >= self._leading and trailing >= self._trailing:
+                    # The changed bits fit in the previous block: reuse its position
+                    size = 64 - self._leading - self._trailing
+                    writer.write(0b10, 2)
+                    writer.write(xor >> self._trailing, size)
+                else:
+                    size = 64 - leading - trailing
+                    writer.write(0b11 << 11 | leading << 6 | (size & 0x3f), 13)
+                    writer.write(xor >> trailing, size)
+                    self._leading = leading
+                    self._trailing = trailing
+        self._previous = bits
+        self.count += 1
+
+
+def iter_values(data, count):
+    """
+    Decode values written by ValueEncoder.
+
+    Args:
+        data (bytes): Encoded stream.
+        count (int): Number of values in the stream.
+
+    Yields:
+        float: The values.
+    """
+    if not count:
+        return
+    stream = int.from_bytes(data, 'big')
+    cursor = len(data) * 8 - 64
+    pack, unpack = _UINT64.pack, _DOUBLE.unpack
+    bits = stream >> cursor
+    yield unpack(pack(bits))[0]
+    size = 64
+    trailing = 0
+    for _ in range(count - 1):
+        cursor -= 1
+        if (stream >> cursor) & 1:
+            cursor -= 1
+            if (stream >> cursor) & 1:
+                cursor -= 11
+                header = (stream >> cursor) & 0x7ff
+                size = (header & 0x3f) or 64
+                trailing = 64 - (header >> 6) - size
+            cursor -= size
+            bits ^= ((stream >> cursor) & ((1 << size) - 1)) << trailing
+        yield unpack(pack(bits))[0]
+
+
+class Chunk:
+    """
+    Immutable compressed block of samples sharing one timestamp stream.
+
+    Only the timestamp stream and the stream of the requested metric are
+    decoded, and decoding stops at the end of the requested range.
+    """
+    __slots__ = ('start', 'end', 'count', 'timestamps', 'columns')
+
+    def __init__(self, start, end, count, timestamps, columns):
+        self.start = start  # First timestamp
+        self.end = end  # Last timestamp
+        self.count = count
+        self.timestamps = timestamps  # Encoded timestamp stream
+        self.columns = columns  # Metric -> encoded value stream
+
+    @property
+    def nbytes(self):
+        """Size of the encoded streams."""
+        return len(self.timestamps) + sum(len(column) for column in self.columns.values())
+
+    def iter_samples(self, metric, since=None, until=None):
+        """
+        Decode the samples of one metric in a time range.
+
+        Args:
+            metric (str): Metric name.
+            since (float): Earliest sample time to include.
+            until (float): Latest sample time to include.
+
+        Yields:
+            tuple: (timestamp, value) pairs in time order.
+        """
+        if (since is not None and since > self.end) or (until is not None and until < self.start):
+            return
+        values = iter_values(self.columns[metric], self.count)
+        for timestamp, value in zip(iter_timestamps(self.timestamps, self.count), values):
+            if until is not None and timestamp > until:
+                return
+            if since is None or timestamp >= since:
+                yield timestamp, value
+
+
+class ChunkEncoder:
+    """Builds a Chunk one sample at a time."""
+
+    def __init__(self, metrics):
+        """
+        Args:
+            metrics (tuple): Metric names, in the order of the appended values.
+        """
+        self.metrics = metrics
+        self._timestamps = TimestampEncoder()
+        self._values = [ValueEncoder() for _ in metrics]
+        self.start = None
+        self.end = None
+
+    def __len__(self):
+        return self._timestamps.count
+
+    def append(self, timestamp, values):
+        """
+        Add a sample.
+
+        Args:
+            timestamp (float): Sample time (epoch seconds), not before the previous one.
+            values (tuple): One float per metric.
+        """
+        if self.start is None:
+            self.start = round(timestamp * 1000) / 1000
+        self.end = round(timestamp * 1000) / 1000
+        self._timestamps.append(timestamp)
+        for encoder, value in zip(self._values, values):
+            encoder.append(value)
+
+    def finish(self):
+        """
+        Return the encoded chunk.
+
+        Returns:
+            Chunk: The samples appended so far.
+        """
+        return Chunk(self.start, self.end, len(self), self._timestamps.writer.getvalue(),
+                     {metric: encoder.writer.getvalue() for metric, encoder in zip(self.metrics, self._values)})
+
+
+def iter_chunks(chunks, metric, since=None, until=None):
+    """
+    Decode one metric over a time range from a time-ordered sequence of chunks.
+
+    Chunks entirely outside the range are skipped without decoding.
+
+    Args:
+        chunks (Iterable[Chunk]): Chunks in time order.
+        metric (str): Metric name.
+        since (float): Earliest sample time to include.
+        until (float): Latest sample time to include.
+
+    Yields:
+        tuple: (timestamp, value) pairs in time order.
+    """
+    for chunk in chunks:
+        if until is not None and chunk.start > until:
+            return
+        yield from chunk.iter_samples(metric, since, until)
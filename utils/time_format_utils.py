@@ -90,3 +90,28 @@ def split_time_string(time_string):
    
    # If no patterns match, return the original string as first part
    return time_string, ""
+
+
+def uptime_to_seconds(time_string):
+   """
+   Convert an uptime string (formatted as 'ddd hh:mm:ss', or plain seconds) into seconds.
+   Only the first time component is used when two are present.
+   Returns None if the string cannot be parsed.
+   """
+   first, _ = split_time_string(str(time_string))
+   match = re.fullmatch(r'(\d+)d (\d+):(\d+):(\d+)', first)
+   if not match:
+      return None
+   days, hours, minutes, seconds = map(int, match.groups())
+   return days * 86400 + hours * 3600 + minutes * 60 + seconds
+
+
+def format_duration(seconds, strip_secs=True):
+   """
+   Format a number of seconds in the compact uptime format (e.g. '1d 2h5m').
+   """
+   seconds = int(seconds)
+   days, remainder = divmod(seconds, 86400)
+   hours, remainder = divmod(remainder, 3600)
+   minutes, seconds = divmod(remainder, 60)
+   return compact_uptime(f"{days}d {hours}:{minutes:02}:{seconds:02}", strip_secs)
@@ -0,0 +1,81 @@
+"""
+Lock that accounts for the time spent waiting to acquire it.
+"""
+
+import threading
+import time
+
+
+class TimedLock:
+    """
+    Drop-in replacement for threading.Lock that counts acquisitions and the
+    total time callers waited for the lock.
+
+    An uncontended acquisition takes the non-blocking fast path and adds no
+    wait time, so the overhead on the ingest path is one failed try at most.
+    Optional LatencyHistograms also receive every wait and hold duration.
+    """
+    __slots__ = ('_lock', 'acquisitions', 'contended', 'wait_seconds', 'wait_histogram', 'hold_histogram',
+                 '_acquired_at')
+
+    def __init__(self, wait_histogram=None, hold_histogram=None):
+        """
+        Args:
+            wait_histogram (LatencyHistogram): Receives the wait of every acquisition.
+            hold_histogram (LatencyHistogram): Receives how long the lock was held.
+        """
+        self._lock = threading.Lock()
+        self.acquisitions = 0
+        self.contended = 0  # Acquisitions that had to wait
+        self.wait_seconds = 0.0
+        self.wait_histogram = wait_histogram
+        self.hold_histogram = hold_histogram
+        self._acquired_at = 0  # perf_counter_ns() of the current acquisition, written by the holder
+
+    def acquire(self, blocking=True, timeout=-1):
+        """
+        Acquire the lock, like threading.Lock.acquire().
+
+        Args:
+            blocking (bool): Wait for the lock when it is held.
+            timeout (float): Maximum seconds to wait, -1 for no limit.
+
+        Returns:
+            bool: True when the lock was acquired.
+        """
+        if self._lock.acquire(False):
+            # Counters are only updated while holding the lock
+            self.acquisitions += 1
+            if self.wait_histogram is not None:
+                self.wait_histogram.record(0)
+            if self.hold_histogram is not None:
+                self._acquired_at = time.perf_counter_ns()
+            return True
+        if not blocking:
+            return False
+        start = time.perf_counter_ns()
+        acquired = self._lock.acquire(True, timeout)
+        if acquired:
+            now = time.perf_counter_ns()
+            self.acquisitions += 1
+            self.contended += 1
+            self.wait_seconds += (now - start) / 1e9
+            if self.wait_histogram is not None:
+                self.wait_histogram.record(now - start)
+            self._acquired_at = now
+        return acquired
+
+    def release(self):
+        """Release the lock."""
+        if self.hold_histogram is not None:
+            self.hold_histogram.record(time.perf_counter_ns() - self._acquired_at)
+        self._lock.release()
+
+    def locked(self):
+        """Return True when the lock is held."""
+        return self._lock.locked()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc_info):
+        self.release()
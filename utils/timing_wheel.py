@@ -0,0 +1,97 @@
+"""
+Timing wheel index of keys by last-seen time.
+"""
+
+import math
+
+
+class TimingWheel:
+    """
+    Groups keys into fixed-width time slots so expiring old keys costs
+    O(expired) instead of a scan over every key.
+
+    Each key lives in exactly one slot. Re-adding a key moves it, and
+    pop_until() removes whole slots that are entirely older than a cutoff.
+    """
+
+    def __init__(self, resolution=1.0):
+        """
+        Args:
+            resolution (float): Slot width in seconds; expiry is accurate to one slot.
+        """
+        self.resolution = resolution
+        self._slots = {}  # Slot number -> set of keys
+        self._slot_of = {}  # Key -> slot number
+        self._oldest = None  # Lowest slot number that may be non-empty
+
+    def __len__(self):
+        return len(self._slot_of)
+
+    def __contains__(self, key):
+        return key in self._slot_of
+
+    def add(self, key, timestamp):
+        """
+        Insert or move a key to the slot of the given time.
+
+        Args:
+            key: Hashable key.
+            timestamp (float): Time the key was last seen.
+        """
+        slot = math.floor(timestamp / self.resolution)
+        current = self._slot_of.get(key)
+        if current == slot:
+            return
+        if current is not None:
+            self._remove_from_slot(key, current)
+        self._slot_of[key] = slot
+        self._slots.setdefault(slot, set()).add(key)
+        if self._oldest is None or slot < self._oldest:
+            self._oldest = slot
+
+    def discard(self, key):
+        """
+        Remove a key if present.
+
+        Args:
+            key: Key to remove.
+        """
+        slot = self._slot_of.pop(key, None)
+        if slot is not None:
+            self._remove_from_slot(key, slot)
+
+    def _remove_from_slot(self, key, slot):
+        keys = self._slots[slot]
+        keys.discard(key)
+        if not keys:
+            del self._slots[slot]
+
+    def pop_until(self, timestamp):
+        """
+        Remove and return every key whose slot ends at or before the given time.
+
+        Args:
+            timestamp (float): Cutoff time.
+
+        Returns:
+            list: Expired keys, oldest slot first.
+        """
+        if self._oldest is None:
+            return []
+        limit = math.floor(timestamp / self.resolution) - 1  # Last slot entirely before the cutoff
+        if limit < self._oldest:
+            return []
+
+        if limit - self._oldest > len(self._slots):
+            # Long gap since the last call: walk the occupied slots instead of every tick
+            slots = sorted(slot for slot in self._slots if slot <= limit)
+        else:
+            slots = [slot for slot in range(self._oldest, limit + 1) if slot in self._slots]
+
+        expired = []
+        for slot in slots:
+            for key in self._slots.pop(slot):
+                del self._slot_of[key]
+                expired.append(key)
+        self._oldest = limit + 1 if self._slots else None
+        return expired